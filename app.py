@@ -1,41 +1,179 @@
 # Main application file for Health and Fitness Tracker
+#
+# create_app() builds the app; the module-level app is what flask run,
+# serve.py and the bench scripts use. Only Flask, werkzeug and the standard
+# library are imported at startup: NumPy (/stats), the export writers and the
+# nutrition table are loaded by the first request that needs them.
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from routes import routes
+from auth import load_secret_key
+from db_pool import DEFAULT_CONFIG as DB_CONFIG
+from nutrition import set_matcher_path
+from compression import compress_response
+from static_assets import init_static
+from maintenance import init_maintenance
 import logging
 import os
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['WTF_CSRF_ENABLED'] = False  # Disable CSRF for testing
-app.config['JSON_SORT_KEYS'] = False
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
+def create_app(config=None):
+    app = Flask(__name__)
+    # Session signing key; None reads the SECRET_KEY environment variable or
+    # SECRET_KEY_FILE (default instance/secret_key, see auth.load_secret_key)
+    app.config['SECRET_KEY'] = None
+    app.config['SECRET_KEY_FILE'] = None
+    app.config['WTF_CSRF_ENABLED'] = False  # Disable CSRF for testing
+    app.config['JSON_SORT_KEYS'] = False
+    app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
 
-# Register the blueprint
-app.register_blueprint(routes)
+    # JSON encoder for API responses (see json_response.py): 'auto' uses
+    # orjson when it is installed, 'stdlib' the json module
+    app.config['JSON_BACKEND'] = 'auto'
 
-# Add favicon route
-@app.route('/favicon.ico')
-def favicon():
-    return send_from_directory(os.path.join(app.root_path, 'static'),
-                             'favicon.ico', mimetype='image/vnd.microsoft.icon')
+    # gzip/brotli for text and JSON responses of at least COMPRESS_MIN_SIZE
+    # bytes (see compression.py)
+    app.config['COMPRESS_ENABLED'] = True
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_BROTLI_QUALITY'] = 4
 
-# Add error handlers
-@app.errorhandler(404)
-def not_found_error(error):
-    logger.error(f"404 error: {error}")
-    return {'error': 'Not Found'}, 404
+    # Level for the root logger (python app.py runs with DEBUG)
+    app.config['LOG_LEVEL'] = 'INFO'
 
-@app.errorhandler(500)
-def internal_error(error):
-    logger.error(f"500 error: {error}")
-    return {'error': 'Internal Server Error'}, 500
+    # Database and connection pool settings (see db_pool.py)
+    app.config.from_mapping(DB_CONFIG)
+
+    # Requests without a login use the default user (see auth.py)
+    app.config['ALLOW_ANONYMOUS'] = True
+
+    # Seconds before a cached profile is re-checked against the database,
+    # and how many users' profiles are kept
+    app.config['USER_INFO_CACHE_TTL'] = 5.0
+    app.config['USER_INFO_CACHE_SIZE'] = 10000
+
+    # Nutrition table (CSV, or SQLite with a nutrition table), compiled on first use
+    app.config['NUTRITION_DB'] = os.path.join(app.root_path, 'data', 'nutrition.csv')
+
+    # Optional spaCy food parser (see food_parser.py): model, pool processes,
+    # batching, how many descriptions may wait and for how long before
+    # log_food falls back to the matcher, cached descriptions, and the first
+    # delay before a crashed pool is restarted
+    app.config['NLP_PARSER_ENABLED'] = False
+    app.config['NLP_MODEL'] = 'en_core_web_sm'
+    app.config['NLP_WORKERS'] = 1
+    app.config['NLP_BATCH_SIZE'] = 32
+    app.config['NLP_BATCH_WAIT'] = 0.005
+    app.config['NLP_MAX_PENDING'] = 64
+    app.config['NLP_TIMEOUT'] = 0.25
+    app.config['NLP_CACHE_SIZE'] = 10000
+    app.config['NLP_RESTART_DELAY'] = 1.0
+
+    # Group commit for log_food, log_workout and the edit/delete routes (see
+    # write_queue.py): seconds the writer waits for more writes, and the most
+    # it commits together
+    app.config['GROUP_COMMIT_ENABLED'] = True
+    app.config['GROUP_COMMIT_WINDOW'] = 0.002
+    app.config['GROUP_COMMIT_MAX_BATCH'] = 128
+
+    # Manifest written by build_static.py, and how long browsers may cache
+    # the fingerprinted files it lists
+    app.config['STATIC_MANIFEST'] = os.path.join(app.root_path, 'static', 'dist', 'manifest.json')
+    app.config['STATIC_MAX_AGE'] = 31536000
+
+    # Render the dashboard into GET / with its data embedded (see
+    # page_cache.py), and how many rendered pages each process keeps
+    app.config['DASHBOARD_PRERENDER'] = True
+    app.config['PAGE_CACHE_SIZE'] = 256
+
+    # Largest number of entries accepted by /log_batch in one request
+    app.config['BATCH_MAX_ITEMS'] = 50000
+
+    # Longest range /stats accepts, in days
+    app.config['STATS_MAX_DAYS'] = 3660
+
+    # Most points /get_weight_history returns before downsampling
+    app.config['WEIGHT_HISTORY_MAX_POINTS'] = 500
+
+    # Data version file shared by all worker processes (None: <DATABASE>-version;
+    # False keeps versions in process, for a single-process server only)
+    app.config['DATA_VERSION_FILE'] = None
+    app.config['DATA_VERSION_SLOTS'] = 4096
+
+    # Server-sent events (/events): messages a stream may fall behind by
+    # before it is told to resync, and the heartbeat interval in seconds
+    app.config['SSE_QUEUE_SIZE'] = 64
+    app.config['SSE_HEARTBEAT'] = 15.0
+
+    # Per-request SQL counts and timings (Server-Timing header, /admin/sql_stats)
+    # and the threshold for logging a slow statement with its query plan
+    app.config['SQL_STATS_ENABLED'] = True
+    app.config['SQL_SLOW_QUERY_MS'] = 100
+
+    # Prometheus metrics (/metrics): a directory shared by all worker processes
+    # (None keeps counts in process) and how often each worker writes its totals
+    app.config['METRICS_DIR'] = None
+    app.config['METRICS_FLUSH_INTERVAL'] = 5.0
+
+    # Background maintenance (see maintenance.py): off unless enabled; runs at
+    # most every MAINTENANCE_INTERVAL seconds, once no worker has had a request
+    # for MAINTENANCE_IDLE_SECONDS. Raw workouts and foods rows older than
+    # MAINTENANCE_ARCHIVE_DAYS move to the archive tables, and superseded
+    # user_info rows older than MAINTENANCE_USER_INFO_KEEP_DAYS are deleted
+    app.config['MAINTENANCE_ENABLED'] = False
+    app.config['MAINTENANCE_INTERVAL'] = 3600.0
+    app.config['MAINTENANCE_IDLE_SECONDS'] = 30.0
+    app.config['MAINTENANCE_ARCHIVE_DAYS'] = 365
+    app.config['MAINTENANCE_USER_INFO_KEEP_DAYS'] = 30
+    app.config['MAINTENANCE_BATCH_SIZE'] = 500
+    app.config['MAINTENANCE_VACUUM_PAGES'] = 1000
+    app.config['MAINTENANCE_CHECKPOINT_MODE'] = 'PASSIVE'
+    app.config['MAINTENANCE_LOCK'] = None
+
+    # Token for /admin/* endpoints and /metrics; None disables them outside debug mode, where localhost may use them
+    app.config['ADMIN_TOKEN'] = None
+
+    # Production server (python serve.py); command line options override these
+    app.config['SERVER_BIND'] = '127.0.0.1:8000'
+    app.config['SERVER_WORKERS'] = os.cpu_count() or 1
+    app.config['SERVER_WORKER_CONNECTIONS'] = 1000
+    app.config['SERVER_KEEPALIVE'] = 5
+    app.config['SERVER_GRACEFUL_TIMEOUT'] = 30
+
+    # Overrides, e.g. from tests or serve.py
+    if config:
+        app.config.from_mapping(config)
+
+    logging.basicConfig(level=app.config['LOG_LEVEL'])
+    app.config['SECRET_KEY'] = load_secret_key(app)
+    set_matcher_path(app.config['NUTRITION_DB'])
+
+    # Register the blueprint
+    app.register_blueprint(routes)
+    app.after_request(compress_response)
+
+    # Fingerprinted static files and /favicon.ico (see static_assets.py)
+    init_static(app)
+    init_maintenance(app)
+
+    # Add error handlers
+    @app.errorhandler(404)
+    def not_found_error(error):
+        logger.error(f"404 error: {error}")
+        return {'error': 'Not Found'}, 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        logger.error(f"500 error: {error}")
+        return {'error': 'Internal Server Error'}, 500
+
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.DEBUG)
     print("\n=== Starting Flask application ===")
     print("\nRegistered Routes:")
     print("-" * 80)
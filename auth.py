@@ -0,0 +1,102 @@
+# User accounts for Health and Fitness Tracker
+#
+# Every table is keyed by user_id and every route is scoped to the session's
+# user. Requests without a login use the default account (id 1), which keeps
+# the single-user setup working; set ALLOW_ANONYMOUS to False to require a
+# login instead.
+
+import hmac
+import os
+import secrets
+import sqlite3
+from flask import abort, current_app, request, session
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_USER_ID = 1
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+class AuthError(ValueError):
+    pass
+
+def load_secret_key(app):
+    # The session cookie is the only proof of identity, so its signing key
+    # comes from SECRET_KEY (config or environment) or the SECRET_KEY_FILE
+    # instance file. Without a login requirement a missing file is generated
+    # (0600) on first start; with ALLOW_ANONYMOUS off it has to exist.
+    key = app.config.get('SECRET_KEY') or os.environ.get('SECRET_KEY')
+    if key:
+        return key
+
+    path = app.config.get('SECRET_KEY_FILE') or os.path.join(app.instance_path, 'secret_key')
+    try:
+        with open(path) as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        key = None
+    if key:
+        return key
+
+    if not app.config.get('ALLOW_ANONYMOUS', True):
+        raise RuntimeError(
+            f'No SECRET_KEY: set the SECRET_KEY environment variable or write a random key to {path} '
+            '(python -c "import secrets; print(secrets.token_hex(32))")')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process created it first
+        with open(path) as f:
+            return f.read().strip()
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key + '\n')
+    return key
+
+def current_user_id():
+    user_id = session.get('user_id')
+    if user_id is None:
+        if not current_app.config.get('ALLOW_ANONYMOUS', True):
+            abort(401)
+        return DEFAULT_USER_ID
+    return user_id
+
+def create_user(db, username, password):
+    username = (username or '').strip()
+    if not username or not password:
+        raise AuthError('Username and password are required')
+    if len(password) < 8:
+        raise AuthError('Password must be at least 8 characters')
+
+    try:
+        cursor = db.execute(
+            'INSERT INTO users (username, password) VALUES (?, ?)',
+            (username, generate_password_hash(password)))
+        db.commit()
+    except sqlite3.IntegrityError:
+        db.rollback()
+        raise AuthError('Username is already taken')
+    return cursor.lastrowid
+
+def authenticate(db, username, password):
+    row = db.execute(
+        'SELECT id, password FROM users WHERE username = ?',
+        ((username or '').strip(),)).fetchone()
+    # Accounts without a password hash (the default user) cannot log in
+    if row is None or not row[1] or not check_password_hash(row[1], password or ''):
+        raise AuthError('Invalid username or password')
+    return row[0]
+
+def require_admin():
+    # Admin endpoints need "Authorization: Bearer <ADMIN_TOKEN>". Without a
+    # configured token they are closed, except to this machine in debug mode:
+    # behind a reverse proxy every request arrives from loopback, so
+    # remote_addr alone proves nothing
+    token = current_app.config.get('ADMIN_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            abort(403)
+    elif not current_app.debug or request.remote_addr not in LOOPBACK_ADDRESSES:
+        abort(403)
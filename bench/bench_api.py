@@ -0,0 +1,213 @@
+# HTTP API benchmark suite
+#
+# Seeds a throwaway fitness.db from schema.sql (days of history, entries per
+# day, user_info rows) and drives each scenario at a fixed concurrency, once
+# in process through the Flask test client and once against serve.py on a
+# local port. The JSON report has throughput, p50/p95/p99 latency and SQL
+# statements per request (from the Server-Timing header) per scenario and
+# mode, tagged with the git commit; --compare prints the change against an
+# earlier report.
+#
+#   python bench/bench_api.py --requests 400 --concurrency 8 -o before.json
+#   python bench/bench_api.py --requests 400 --concurrency 8 --compare before.json
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import urlencode
+
+from common import ROOT, latency_summary, running_server, seed_database, temp_database, timing_queries
+
+FOODS = ['2 eggs and toast', 'chicken salad', 'bowl of oatmeal', 'apple', 'rice and beans', 'pizza slice']
+WORKOUT_TYPES = ['Running', 'Walking', 'Cycling', 'Swimming', 'Yoga', 'Strength Training']
+
+class Fixtures:
+    # Row ids for the edit/delete scenarios; deleted ids are never reused
+    def __init__(self, path):
+        connection = sqlite3.connect(path)
+        foods = [row[0] for row in connection.execute('SELECT id FROM foods')]
+        workouts = [row[0] for row in connection.execute('SELECT id FROM workouts')]
+        connection.close()
+        random.shuffle(foods)
+        random.shuffle(workouts)
+        half = min(len(foods), len(workouts)) // 2
+        self.kept_foods = foods[half:]
+        self.kept_workouts = workouts[half:]
+        self.doomed_foods = deque(foods[:half])
+        self.doomed_workouts = deque(workouts[:half])
+
+# name -> (method, path, form data for one request)
+SCENARIOS = {
+    'home_data': ('GET', '/home_data', None),
+    'get_data': ('GET', '/get_data', None),
+    'log_food': ('POST', '/log_food', lambda f: {'food_description': random.choice(FOODS)}),
+    'log_workout': ('POST', '/log_workout', lambda f: {
+        'type': random.choice(WORKOUT_TYPES), 'duration': random.randint(10, 90)}),
+    'edit_food': ('POST', '/edit_food', lambda f: {
+        'id': random.choice(f.kept_foods), 'description': random.choice(FOODS)}),
+    'edit_workout': ('POST', '/edit_workout', lambda f: {
+        'id': random.choice(f.kept_workouts), 'type': random.choice(WORKOUT_TYPES),
+        'duration': random.randint(10, 90)}),
+    'delete_food': ('POST', '/delete_food', lambda f: {'id': f.doomed_foods.pop()}),
+    'delete_workout': ('POST', '/delete_workout', lambda f: {'id': f.doomed_workouts.pop()}),
+}
+
+def drive(make_sender, scenario, fixtures, requests, concurrency):
+    # Runs requests spread over concurrency threads; each thread gets its own
+    # sender, which returns (status, statement count or None)
+    method, path, payload = SCENARIOS[scenario]
+    latencies = []
+    counts = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(share):
+        send = make_sender()
+        local_latencies = []
+        local_counts = []
+        failed = 0
+        for _ in range(share):
+            form = payload(fixtures) if payload else None
+            start = time.perf_counter()
+            status, queries = send(method, path, form)
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            if queries is not None:
+                local_counts.append(queries)
+            failed += status != 200
+        with lock:
+            latencies.extend(local_latencies)
+            counts.extend(local_counts)
+            errors.append(failed)
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(share,)) for share in shares]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = latency_summary(latencies, elapsed)
+    result['errors'] = sum(errors)
+    if counts:
+        result['queries_per_request'] = round(sum(counts) / len(counts), 2)
+    return result
+
+def run_test_client(args, scenarios):
+    path = temp_database()
+    seed_database(path, args.days, args.entries, args.user_info_rows)
+    fixtures = Fixtures(path)
+
+    from app import app
+    app.config['DATABASE'] = path
+
+    def make_sender():
+        client = app.test_client()
+
+        def send(method, path, form):
+            response = client.open(path, method=method, data=form)
+            return response.status_code, timing_queries(response.headers.get('Server-Timing'))
+        return send
+
+    return {name: drive(make_sender, name, fixtures, args.requests, args.concurrency)
+            for name in scenarios}
+
+def run_server(args, scenarios):
+    path = temp_database()
+    seed_database(path, args.days, args.entries, args.user_info_rows)
+    fixtures = Fixtures(path)
+
+    with running_server(path, args.workers) as port:
+        def make_sender():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+            def send(method, path, form):
+                body = urlencode(form) if form else None
+                headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                return response.status, timing_queries(response.getheader('Server-Timing'))
+            return send
+
+        return {name: drive(make_sender, name, fixtures, args.requests, args.concurrency)
+                for name in scenarios}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline):
+    # One line per scenario: relative change of throughput and latencies
+    print(f"Compared with {baseline.get('commit')}:", file=sys.stderr)
+    for mode, results in report['results'].items():
+        for name, new in results.items():
+            old = baseline.get('results', {}).get(mode, {}).get(name)
+            if not old:
+                continue
+            changes = []
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+                if old.get(key) and key in new:
+                    changes.append(f'{key} {(new[key] - old[key]) / old[key] * 100:+.1f}%')
+            print(f"  {mode:<12} {name:<15} {', '.join(changes)}", file=sys.stderr)
+
+def run(args):
+    scenarios = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenario: {', '.join(unknown)}")
+    if args.requests > args.days * args.entries // 2:
+        sys.exit('Not enough seeded rows for the delete scenarios; raise --days or --entries')
+
+    runners = {'test_client': run_test_client, 'server': run_server}
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'config': {
+            'days': args.days,
+            'entries_per_day': args.entries,
+            'user_info_rows': args.user_info_rows,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'workers': args.workers
+        },
+        'results': {mode: runners[mode](args, scenarios) for mode in args.modes.split(',')}
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the HTTP API')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--entries', type=int, default=10, help='foods and workouts per day')
+    parser.add_argument('--user-info-rows', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=400, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--modes', default='test_client,server', help='test_client and/or server')
+    parser.add_argument('--workers', type=int, default=2, help='serve.py workers in server mode')
+    parser.add_argument('--scenarios', help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('-o', '--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    run(parser.parse_args())
@@ -0,0 +1,61 @@
+# Benchmark the dashboard read endpoints
+#
+# Seeds a throwaway fitness.db, then requests each endpoint through the Flask
+# test client and reports SQL statements per request and p50/p99 latency.
+#
+#   python bench/bench_dashboard.py --days 365 --entries 10 --requests 500
+
+import argparse
+import json
+import time
+
+from common import QueryCounter, percentile, seed_database, temp_database
+
+ENDPOINTS = ['/home_data', '/get_data', '/get_user_info']
+
+def run(args):
+    path = temp_database()
+    seed_database(path, args.days, args.entries, args.user_info_rows)
+
+    import routes
+    from app import app
+    app.config['DATABASE'] = path
+
+    # Count every statement the request's connection runs
+    queries = QueryCounter()
+    queries.install(routes)
+    client = app.test_client()
+
+    results = {}
+    for endpoint in ENDPOINTS:
+        client.get(endpoint)
+        latencies = []
+        counts = []
+        for _ in range(args.requests):
+            queries.reset()
+            start = time.perf_counter()
+            response = client.get(endpoint)
+            latencies.append((time.perf_counter() - start) * 1000)
+            counts.append(queries.count)
+            assert response.status_code == 200, response.data
+        results[endpoint] = {
+            'queries_per_request': max(counts),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p99_ms': round(percentile(latencies, 99), 3)
+        }
+
+    print(json.dumps({
+        'days': args.days,
+        'entries_per_day': args.entries,
+        'user_info_rows': args.user_info_rows,
+        'requests': args.requests,
+        'endpoints': results
+    }, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark dashboard read endpoints')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--entries', type=int, default=10, help='foods and workouts per day')
+    parser.add_argument('--user-info-rows', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=300)
+    run(parser.parse_args())
@@ -0,0 +1,77 @@
+# First meaningful paint benchmark for the dashboard
+#
+# Seeds a fixture and times what a browser has to wait for before the
+# dashboard shows real numbers, through the Flask test client:
+#   - client: GET / renders empty cards and scripts.js fetches /get_data,
+#     two dependent round trips (DASHBOARD_PRERENDER off)
+#   - prerender: GET / carries the rendered dashboard and its data, one round
+#     trip; PAGE_CACHE_SIZE=0 so every load builds and renders the page
+#   - prerender_cached: as above, with repeated loads of an unchanged
+#     dashboard served from the page cache
+# Time to first meaningful paint is the server time of the requests on the
+# critical path plus --rtt-ms per round trip (browser parsing and script
+# execution are left out; they favour the pre-rendered page further).
+#
+#   python bench/bench_first_paint.py --days 90 --entries 20 --rtt-ms 50
+
+import argparse
+import json
+import time
+
+from common import latency_summary, seed_database, temp_database
+
+VARIANTS = {
+    'client': ({'DASHBOARD_PRERENDER': False}, ['/', '/get_data']),
+    'prerender': ({'PAGE_CACHE_SIZE': 0}, ['/']),
+    'prerender_cached': ({}, ['/']),
+}
+
+def run(args):
+    from app import create_app
+
+    database = temp_database('codey-paint-')
+    seed_database(database, args.days, args.entries, 100)
+
+    results = {}
+    for name, (config, paths) in VARIANTS.items():
+        app = create_app(dict(config, DATABASE=database))
+        client = app.test_client()
+        for path in paths:
+            client.get(path)  # warm imports, templates and the page cache
+
+        server = {path: [] for path in paths}
+        paint = []
+        page_bytes = 0
+        for _ in range(args.requests):
+            total = 0
+            for path in paths:
+                start = time.perf_counter()
+                response = client.get(path)
+                elapsed = (time.perf_counter() - start) * 1000
+                server[path].append(elapsed)
+                total += elapsed + args.rtt_ms
+                if path == '/':
+                    page_bytes = len(response.get_data())
+            paint.append(total)
+
+        results[name] = {
+            'round_trips': len(paths),
+            'document_bytes': page_bytes,
+            'server_p50_ms': {path: latency_summary(latencies)['p50_ms'] for path, latencies in server.items()},
+            'first_paint_ms': latency_summary(paint)
+        }
+
+    print(json.dumps({
+        'days': args.days,
+        'entries_per_day': args.entries,
+        'rtt_ms': args.rtt_ms,
+        'results': results
+    }, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure time to first meaningful paint of the dashboard')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--entries', type=int, default=20, help='foods and workouts per day')
+    parser.add_argument('--requests', type=int, default=200, help='page loads timed per variant')
+    parser.add_argument('--rtt-ms', type=float, default=50.0, help='network round trip added per request')
+    run(parser.parse_args())
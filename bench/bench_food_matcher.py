@@ -0,0 +1,83 @@
+# Benchmark food calorie matching against large nutrition tables
+#
+# Generates synthetic tables of multi-word food names and compares the compiled
+# token-trie matcher with the original linear substring scan.
+#
+#   python bench/bench_food_matcher.py --sizes 10000 100000
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nutrition import FoodMatcher
+
+WORDS = ('grilled baked fried roasted steamed spicy sweet sour smoked fresh '
+         'chicken beef pork tofu salmon tuna rice noodle pasta bean lentil '
+         'potato tomato onion pepper mushroom spinach kale cheese egg bread '
+         'wrap bowl salad soup curry stew pie taco burger sandwich').split()
+
+def synthetic_foods(count, seed=1):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        size = rng.randint(1, 4)
+        name = ' '.join(rng.choice(WORDS) for _ in range(size))
+        names.add(name + f' {len(names)}' if size > 2 else name)
+    return [(name, rng.randint(20, 900)) for name in names]
+
+def legacy_calories(foods, description):
+    # The original calculate_food_calories: first substring hit wins
+    for food, calories in foods:
+        if food.lower() in description.lower():
+            return calories
+    return 200
+
+def time_calls(func, descriptions, repeat):
+    samples = []
+    for _ in range(repeat):
+        for description in descriptions:
+            start = time.perf_counter()
+            func(description)
+            samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'p50_us': round(samples[len(samples) // 2], 2),
+        'p99_us': round(samples[int(len(samples) * 0.99)], 2)
+    }
+
+def run(args):
+    rng = random.Random(2)
+    descriptions = [
+        f'{rng.randint(1, 3)} {rng.choice(WORDS)} {rng.choice(WORDS)} and a {rng.choice(WORDS)} {rng.choice(WORDS)}'
+        for _ in range(args.descriptions)
+    ]
+
+    results = []
+    for size in args.sizes:
+        foods = synthetic_foods(size)
+        start = time.perf_counter()
+        matcher = FoodMatcher(foods)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        results.append({
+            'foods': size,
+            'compile_ms': round(compile_ms, 1),
+            'trie': time_calls(matcher.calories, descriptions, args.repeat),
+            'linear_scan': time_calls(lambda d: legacy_calories(foods, d), descriptions[:args.legacy_descriptions], 1)
+        })
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark food calorie matching')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--descriptions', type=int, default=1000)
+    parser.add_argument('--legacy-descriptions', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    run(parser.parse_args())
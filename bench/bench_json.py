@@ -0,0 +1,90 @@
+# JSON serialization and compression benchmark for /home_data
+#
+# Seeds a heavy-history fixture (many entries per day, so today's workout and
+# food lists are long) and compares, for the /home_data payload:
+#   - encoders: the old pretty-printed stdlib output, compact stdlib, and
+#     compact orjson when it is installed
+#   - row shapes: a list of objects, or ?shape=columns
+#   - encodings: none, gzip, and brotli when it is installed
+# It reports response bytes, the CPU time to serialize (and to compress) one
+# payload, and end-to-end p50 through the Flask test client.
+#
+#   python bench/bench_json.py --days 365 --entries 200
+
+import argparse
+import gzip
+import json
+import time
+
+from common import latency_summary, seed_database, temp_database
+
+def cpu_ms(function, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        result = function()
+    return (time.process_time() - start) / repeat * 1000, result
+
+def run(args):
+    from app import create_app
+    from compression import brotli
+    from json_response import columnar, dumps, orjson
+
+    database = temp_database('codey-json-')
+    seed_database(database, args.days, args.entries, 100)
+
+    encoders = {'stdlib_pretty': {'JSON_BACKEND': 'stdlib', 'JSONIFY_PRETTYPRINT_REGULAR': True},
+                'stdlib': {'JSON_BACKEND': 'stdlib'}}
+    if orjson is not None:
+        encoders['orjson'] = {'JSON_BACKEND': 'auto'}
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+
+    results = {}
+    for name, config in encoders.items():
+        app = create_app(dict(config, DATABASE=database))
+        client = app.test_client()
+        payload = client.get('/home_data').get_json()
+        shapes = {
+            'rows': payload,
+            'columns': dict(payload, workouts=columnar(payload['workouts']), foods=columnar(payload['foods']))
+        }
+        for shape, data in shapes.items():
+            serialize_ms, body = cpu_ms(lambda: dumps(data, app), args.repeat)
+            entry = {'serialize_cpu_ms': round(serialize_ms, 3), 'bytes': {'identity': len(body)}}
+            gzip_ms, compressed = cpu_ms(lambda: gzip.compress(body, compresslevel=app.config['COMPRESS_LEVEL']),
+                                         args.repeat)
+            entry['bytes']['gzip'] = len(compressed)
+            entry['gzip_cpu_ms'] = round(gzip_ms, 3)
+            if brotli is not None:
+                br_ms, compressed = cpu_ms(
+                    lambda: brotli.compress(body, quality=app.config['COMPRESS_BROTLI_QUALITY']), args.repeat)
+                entry['bytes']['br'] = len(compressed)
+                entry['br_cpu_ms'] = round(br_ms, 3)
+
+            # Whole requests, encoding negotiated as a browser would
+            path = '/home_data' + ('?shape=columns' if shape == 'columns' else '')
+            entry['request_p50_ms'] = {}
+            for encoding in encodings:
+                headers = {} if encoding == 'identity' else {'Accept-Encoding': encoding}
+                latencies = []
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    client.get(path, headers=headers)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                entry['request_p50_ms'][encoding] = latency_summary(latencies)['p50_ms']
+            results[f'{name}/{shape}'] = entry
+
+    print(json.dumps({
+        'days': args.days,
+        'entries_per_day': args.entries,
+        'workouts_today': len(payload['workouts']),
+        'foods_today': len(payload['foods']),
+        'results': results
+    }, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure /home_data response size and serialization cost')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--entries', type=int, default=200, help='foods and workouts per day')
+    parser.add_argument('--repeat', type=int, default=200, help='serializations timed per variant')
+    parser.add_argument('--requests', type=int, default=100, help='requests timed per variant and encoding')
+    run(parser.parse_args())
@@ -0,0 +1,178 @@
+# Startup benchmark
+#
+# Measures what a new worker costs: `import app` under -X importtime (total
+# and the slowest modules it pulls in), the time from starting serve.py to
+# its first answered request, and the resident memory of the master and of
+# each worker when idle and after serving the common routes. Modules that
+# must stay off the boot path (NumPy, spaCy, SQLAlchemy, requests) fail the
+# run when they show up in the import trace, as does an import slower than
+# --max-import-ms.
+#
+#   python bench/bench_startup.py --runs 5 --workers 2
+#   python bench/bench_startup.py --max-import-ms 400 -o startup.json
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+from common import ROOT, seed_database, start_server, temp_database
+
+FORBIDDEN = ('numpy', 'spacy', 'requests', 'flask_sqlalchemy', 'sqlalchemy')
+
+# Requests that load the lazily imported parts before the second RSS reading
+WARM_PATHS = [
+    ('GET', '/home_data', None),
+    ('GET', '/get_data', None),
+    ('POST', '/log_food', 'food_description=2+eggs+and+toast'),
+    ('GET', '/stats', None),
+]
+
+def import_trace():
+    # [(module, self us, cumulative us)] for one `import app` in a new interpreter
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.rstrip(), int(own), int(cumulative)))
+    return modules
+
+def measure_imports(runs, top):
+    totals = []
+    for _ in range(runs):
+        modules = import_trace()
+        totals.append(next(cumulative for name, _, cumulative in modules if name.strip() == 'app'))
+
+    # Direct imports of app and the modules with the most time of their own
+    slowest = sorted(modules, key=lambda module: -module[1])[:top]
+    names = {name.strip().split('.')[0] for name, _, _ in modules}
+    return {
+        'runs': runs,
+        'import_app_ms': round(statistics.median(totals) / 1000, 1),
+        'import_app_min_ms': round(min(totals) / 1000, 1),
+        'modules': len(modules),
+        'slowest_modules_ms': {name.strip(): round(own / 1000, 2) for name, own, _ in slowest},
+        'forbidden_imported': sorted(names & set(FORBIDDEN))
+    }
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may hold spaces; the parent pid follows it
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+def first_response(port, timeout=30):
+    # Polls until the server answers; returns when it did
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/get_data')
+            connection.getresponse().read()
+            connection.close()
+            return time.perf_counter()
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError(f'server on port {port} did not start')
+
+def warm(port, workers):
+    # New connections are spread over the workers; send enough for each to see every path
+    for _ in range(workers * 4):
+        for method, path, body in WARM_PATHS:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+            connection.request(method, path, body, headers)
+            connection.getresponse().read()
+            connection.close()
+
+def memory(pid):
+    workers = child_pids(pid)
+    return {
+        'master_rss_mb': round((rss_kb(pid) or 0) / 1024, 1),
+        'worker_rss_mb': [round((rss_kb(worker) or 0) / 1024, 1) for worker in workers]
+    }
+
+def measure_server(workers):
+    database = temp_database('codey-startup-')
+    seed_database(database, 30, 5, 10)
+
+    start = time.perf_counter()
+    server, port = start_server(database, workers)
+    try:
+        ready = first_response(port)
+        # Give the remaining workers time to come up before reading their memory
+        time.sleep(0.5)
+        idle = memory(server.pid)
+        warm(port, workers)
+        warmed = memory(server.pid)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+
+    return {
+        'workers': workers,
+        'first_response_ms': round((ready - start) * 1000, 1),
+        'idle': idle,
+        'after_requests': warmed
+    }
+
+def run(args):
+    report = {
+        'python': sys.version.split()[0],
+        'imports': measure_imports(args.runs, args.top)
+    }
+    if os.path.isdir('/proc'):
+        report['server'] = measure_server(args.workers)
+    else:
+        report['server'] = None  # RSS readings need /proc
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    failures = []
+    if report['imports']['forbidden_imported']:
+        failures.append(f"imported at startup: {', '.join(report['imports']['forbidden_imported'])}")
+    if args.max_import_ms and report['imports']['import_app_ms'] > args.max_import_ms:
+        failures.append(f"import app took {report['imports']['import_app_ms']} ms (limit {args.max_import_ms})")
+    if failures:
+        sys.exit('; '.join(failures))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure import time and per-worker memory')
+    parser.add_argument('--runs', type=int, default=5, help='import app this many times, report the median')
+    parser.add_argument('--top', type=int, default=10, help='slowest modules to list')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-import-ms', type=float, help='fail when the median import is slower')
+    parser.add_argument('-o', '--output', help='write the JSON report here instead of stdout')
+    run(parser.parse_args())
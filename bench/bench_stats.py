@@ -0,0 +1,141 @@
+# Benchmark /stats aggregation against a per-day Python loop
+#
+# Seeds one heavy user's daily_totals, then times compute_stats (NumPy) and
+# the equivalent per-day loop in the style of the old calculate_stats
+# (a dict per day, strftime per day, list.insert(0, ...)) on the same rows,
+# and finally the whole /stats request through the Flask test client.
+#
+#   python bench/bench_stats.py --days 365 --granularity week --repeat 200
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from common import ROOT, percentile, temp_database
+
+def seed_totals(path, days):
+    connection = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        connection.executescript(f.read())
+
+    today = date.today()
+    rows = []
+    for offset in range(days):
+        # Leave some gaps so streaks and averages have something to do
+        if random.random() < 0.1:
+            continue
+        day = (today - timedelta(days=offset)).isoformat()
+        rows.append((1, day, random.randint(1200, 3200), random.randint(0, 800), 5, 1))
+    connection.executemany('INSERT INTO daily_totals VALUES (?, ?, ?, ?, ?, ?)', rows)
+    connection.commit()
+    connection.close()
+
+def loop_stats(db, user_id, start, end, granularity, daily_target):
+    # The per-day approach: one dict per day, walked back from the end date
+    totals = {}
+    for row in db.execute('''
+        SELECT day, calories_consumed, calories_burned, food_count
+        FROM daily_totals
+        WHERE user_id = ? AND day BETWEEN ? AND ?
+    ''', (user_id, start.isoformat(), end.isoformat())):
+        totals[row[0]] = {'consumed': row[1], 'burned': row[2], 'foods': row[3]}
+
+    labels = []
+    consumed = []
+    burned = []
+    logged = []
+    for i in range((end - start).days + 1):
+        day = end - timedelta(days=i)
+        row = totals.get(day.strftime('%Y-%m-%d'), {'consumed': 0, 'burned': 0, 'foods': 0})
+        if granularity == 'week':
+            label = (day - timedelta(days=day.weekday())).strftime('%Y-%m-%d')
+        elif granularity == 'month':
+            label = day.strftime('%Y-%m-01')
+        else:
+            label = day.strftime('%Y-%m-%d')
+        if not labels or labels[0] != label:
+            labels.insert(0, label)
+            consumed.insert(0, 0)
+            burned.insert(0, 0)
+            logged.insert(0, 0)
+        consumed[0] += row['consumed']
+        burned[0] += row['burned']
+        logged[0] += row['foods'] > 0
+
+    streak = longest = current = 0
+    for i in range((end - start).days + 1):
+        day = start + timedelta(days=i)
+        if totals.get(day.strftime('%Y-%m-%d'), {}).get('foods'):
+            streak += 1
+            longest = max(longest, streak)
+        else:
+            streak = 0
+    current = streak
+
+    net = [c - b for c, b in zip(consumed, burned)]
+    return {
+        'labels': labels, 'consumed': consumed, 'burned': burned, 'net': net,
+        'logged_days': logged, 'longest_logging': longest, 'current_logging': current,
+        'target_balance': sum(t['consumed'] - t['burned'] - daily_target
+                              for t in totals.values() if t['foods'])
+    }
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': round(percentile(samples, 50), 3), 'p99_ms': round(percentile(samples, 99), 3)}
+
+def run(args):
+    from stats import compute_stats, load_daily_arrays
+
+    path = temp_database('codey-stats-')
+    seed_totals(path, args.days)
+    db = sqlite3.connect(path)
+    end = date.today()
+    start = end - timedelta(days=args.days - 1)
+
+    def vectorized():
+        arrays = load_daily_arrays(db, 1, start, end)
+        return compute_stats(*arrays, args.granularity, 2000)
+
+    def looped():
+        return loop_stats(db, 1, start, end, args.granularity, 2000)
+
+    # Both paths must agree before their timings mean anything
+    fast, slow = vectorized(), looped()
+    assert fast['series']['labels'] == slow['labels']
+    assert fast['series']['consumed'] == slow['consumed']
+    assert fast['series']['net'] == slow['net']
+    assert fast['streaks']['longest_logging'] == slow['longest_logging']
+    assert fast['totals']['target_balance'] == slow['target_balance']
+
+    from app import app
+    app.config['DATABASE'] = path
+    client = app.test_client()
+    url = f'/stats?from={start}&to={end}&granularity={args.granularity}'
+
+    def request():
+        response = client.get(url)
+        assert response.status_code == 200, response.data
+
+    print(json.dumps({
+        'days': args.days,
+        'granularity': args.granularity,
+        'numpy': timed(vectorized, args.repeat),
+        'per_day_loop': timed(looped, args.repeat),
+        'stats_request': timed(request, args.repeat)
+    }, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark /stats aggregation')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--granularity', default='day', choices=['day', 'week', 'month'])
+    parser.add_argument('--repeat', type=int, default=200)
+    run(parser.parse_args())
@@ -0,0 +1,86 @@
+# Write throughput benchmark: group commit against per-request commits
+#
+# Drives log_food and log_workout (alternating) from 1, 16 and 64 concurrent
+# clients through the Flask test client, once with each request committing
+# its own transaction and once through the group-commit writer
+# (write_queue.py). Every run starts from a fresh seeded database. Reports
+# writes per second, p50/p95/p99 latency and, for group commit, how many
+# writes went into each transaction.
+#
+#   python bench/bench_writes.py --clients 1,16,64 --requests 2000
+#   python bench/bench_writes.py --windows 0,0.002,0.005
+
+import argparse
+import json
+import random
+import threading
+import time
+
+from common import latency_summary, seed_database, temp_database
+
+FOODS = ['2 eggs and toast', 'chicken salad', 'bowl of oatmeal', 'apple', 'rice and beans']
+WORKOUTS = ['Running', 'Walking', 'Cycling', 'Swimming', 'Yoga']
+
+def run_case(clients, requests, config):
+    from app import create_app
+    from write_queue import get_writer
+
+    database = temp_database('codey-writes-')
+    seed_database(database, 30, 5, 10)
+    app = create_app(dict(config, DATABASE=database, DB_POOL_SIZE=max(8, clients)))
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(share):
+        test_client = app.test_client()
+        local = []
+        failed = 0
+        for i in range(share):
+            if i % 2:
+                path, form = '/log_workout', {'type': random.choice(WORKOUTS), 'duration': random.randint(10, 90)}
+            else:
+                path, form = '/log_food', {'food_description': random.choice(FOODS)}
+            start = time.perf_counter()
+            response = test_client.post(path, data=form)
+            local.append((time.perf_counter() - start) * 1000)
+            failed += response.status_code != 200
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    shares = [requests // clients + (i < requests % clients) for i in range(clients)]
+    threads = [threading.Thread(target=client, args=(share,)) for share in shares]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = latency_summary(latencies, elapsed)
+    result['errors'] = sum(errors)
+    with app.app_context():
+        writer = get_writer(app)
+        if writer is not None:
+            result['transactions'] = writer.stats()
+    return result
+
+def run(args):
+    modes = {'per_request': {'GROUP_COMMIT_ENABLED': False}}
+    for window in args.windows.split(','):
+        modes[f'group_commit_{float(window) * 1000:g}ms'] = {
+            'GROUP_COMMIT_ENABLED': True, 'GROUP_COMMIT_WINDOW': float(window)}
+
+    results = {}
+    for clients in (int(value) for value in args.clients.split(',')):
+        results[clients] = {name: run_case(clients, args.requests, config) for name, config in modes.items()}
+    print(json.dumps({'requests': args.requests, 'clients': results}, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare group commit with per-request commits')
+    parser.add_argument('--clients', default='1,16,64', help='comma-separated client counts')
+    parser.add_argument('--requests', type=int, default=2000, help='writes per run')
+    parser.add_argument('--windows', default='0.002', help='comma-separated group-commit windows in seconds')
+    run(parser.parse_args())
@@ -0,0 +1,138 @@
+# Shared helpers for the bench/ scripts
+#
+# Seeding a throwaway fitness.db from schema.sql, latency percentiles,
+# counting the SQL statements a request runs, and starting serve.py on a
+# free local port.
+
+import os
+import random
+import re
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+def temp_database(prefix='codey-bench-'):
+    return os.path.join(tempfile.mkdtemp(prefix=prefix), 'fitness.db')
+
+def seed_database(path, days, entries, user_info_rows):
+    # days of history for the default user, entries foods and workouts per day
+    connection = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        connection.executescript(f.read())
+
+    now = datetime.now()
+    foods = []
+    workouts = []
+    for offset in range(days):
+        day = now - timedelta(days=offset)
+        for i in range(entries):
+            created_at = (day.replace(hour=6, minute=0, second=0) + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')
+            foods.append(('Seeded meal', random.randint(50, 800), created_at, created_at[:10]))
+            workouts.append(('Running', 30, random.randint(50, 500), created_at, created_at[:10]))
+    connection.executemany(
+        'INSERT INTO foods (description, calories, created_at, day) VALUES (?, ?, ?, ?)', foods)
+    connection.executemany(
+        'INSERT INTO workouts (type, duration, calories_burned, created_at, day) VALUES (?, ?, ?, ?, ?)', workouts)
+    connection.executemany(
+        "INSERT INTO user_info (daily_calories_target, current_weight, target_weight, created_at) "
+        "VALUES (2000, 80, 75, datetime('now', 'localtime', ?))",
+        [(f'-{n} minutes',) for n in range(user_info_rows)])
+
+    from daily_totals import rebuild_daily_totals
+    rebuild_daily_totals(connection)
+    connection.commit()
+    connection.close()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def latency_summary(latencies, elapsed=None):
+    # Throughput and percentiles for one batch of timings in milliseconds
+    if not latencies:
+        return {'requests': 0}
+    summary = {'requests': len(latencies)}
+    if elapsed:
+        summary['throughput_rps'] = round(len(latencies) / elapsed, 1)
+    for pct in (50, 95, 99):
+        summary[f'p{pct}_ms'] = round(percentile(latencies, pct), 3)
+    return summary
+
+class QueryCounter:
+    # Counts the statements each thread's request runs by tracing its connection
+    def __init__(self):
+        self._local = threading.local()
+
+    def install(self, routes):
+        original = routes.get_db
+
+        def counting_get_db():
+            db = original()
+            db.set_trace_callback(self._trace)
+            return db
+
+        routes.get_db = counting_get_db
+
+    def _trace(self, statement):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+def timing_queries(header):
+    # Statement count from the Server-Timing header (see sql_stats.py)
+    match = SERVER_TIMING_QUERIES.search(header or '')
+    return int(match.group(1)) if match else None
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+def start_server(database, workers=1, port=None):
+    # Starts serve.py in the background; returns (process, port)
+    port = port or free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--database', database],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return server, port
+
+@contextmanager
+def running_server(database, workers=1):
+    # Starts serve.py on a free port and yields the port
+    server, port = start_server(database, workers)
+    try:
+        wait_for_server(port)
+        yield port
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
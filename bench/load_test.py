@@ -0,0 +1,81 @@
+# Load test for the production server
+#
+# Seeds a throwaway fitness.db, starts serve.py with each worker count in
+# turn and drives GET /get_data from several client processes over
+# keep-alive connections. Reports requests per second and p50/p99 latency
+# per worker count; on an N-core machine throughput should grow with the
+# worker count up to about N.
+#
+#   python bench/load_test.py --workers 1,2,4 --clients 8 --duration 10
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import time
+
+from common import percentile, running_server, seed_database, temp_database
+
+def client(port, path, duration):
+    # One keep-alive connection; returns (latencies in ms, errors)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    connection.close()
+    return latencies, errors
+
+def run_level(database, workers, args):
+    with running_server(database, workers) as port:
+        # Warm every worker's pool and page cache before measuring
+        client(port, args.path, 1.0)
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.starmap(client, [(port, args.path, args.duration)] * args.clients)
+
+    latencies = [ms for samples, _ in results for ms in samples]
+    return {
+        'workers': workers,
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'requests_per_second': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if latencies else None
+    }
+
+def run(args):
+    database = temp_database('codey-load-')
+    seed_database(database, args.days, args.entries, 100)
+
+    levels = [run_level(database, int(workers), args) for workers in args.workers.split(',')]
+    print(json.dumps({
+        'cpus': os.cpu_count(),
+        'path': args.path,
+        'clients': args.clients,
+        'duration_s': args.duration,
+        'levels': levels
+    }, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test serve.py at several worker counts')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=8, help='client processes, one connection each')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per worker count')
+    parser.add_argument('--path', default='/get_data')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--entries', type=int, default=10)
+    run(parser.parse_args())
@@ -0,0 +1,111 @@
+# Synthetic multi-user load generator
+#
+# Fills a fitness.db with many users, each with their own food, workout,
+# weight and profile history, then (with --requests) times /home_data for
+# randomly chosen users through the Flask test client. Running it at 10 and
+# at 100,000 users shows whether per-user dashboard latency stays flat.
+#
+#   python bench/seed_users.py --users 100000 --days 30 --entries 3 --requests 500
+#   python bench/seed_users.py --users 1000 --database fitness.db  # keep the data
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from common import ROOT, percentile, temp_database
+
+FOODS = ['2 eggs and toast', 'chicken salad', 'bowl of oatmeal', 'apple', 'rice and beans', 'pizza slice']
+WORKOUTS = ['Running', 'Walking', 'Cycling', 'Swimming', 'Yoga', 'Strength Training']
+
+# Users are inserted and committed in chunks so memory stays bounded
+CHUNK_USERS = 1000
+
+def seed_users(path, users, days, entries):
+    connection = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        connection.executescript(f.read())
+
+    now = datetime.now()
+    stamps = []
+    for offset in range(days):
+        base = (now - timedelta(days=offset)).replace(hour=7, minute=0, second=0)
+        stamps.extend((base + timedelta(hours=3 * i)).strftime('%Y-%m-%d %H:%M:%S') for i in range(entries))
+
+    # The default user (id 1) already exists; synthetic users follow it
+    for first in range(2, users + 2, CHUNK_USERS):
+        ids = range(first, min(first + CHUNK_USERS, users + 2))
+        connection.executemany(
+            "INSERT INTO users (id, username, password) VALUES (?, ?, '')",
+            [(user_id, f'user{user_id}') for user_id in ids])
+        connection.executemany(
+            'INSERT INTO foods (user_id, description, calories, created_at, day) VALUES (?, ?, ?, ?, ?)',
+            [(user_id, random.choice(FOODS), random.randint(50, 900), stamp, stamp[:10])
+             for user_id in ids for stamp in stamps])
+        connection.executemany(
+            'INSERT INTO workouts (user_id, type, duration, calories_burned, created_at, day) '
+            'VALUES (?, ?, 30, ?, ?, ?)',
+            [(user_id, random.choice(WORKOUTS), random.randint(90, 300), stamp, stamp[:10])
+             for user_id in ids for stamp in stamps])
+        connection.executemany(
+            'INSERT INTO weight_history (user_id, weight, date) VALUES (?, ?, ?)',
+            [(user_id, round(random.uniform(60, 95), 1), stamp[:10])
+             for user_id in ids for stamp in stamps[::entries]])
+        connection.executemany(
+            "INSERT INTO user_info (user_id, daily_calories_target, current_weight, target_weight, created_at) "
+            "VALUES (?, ?, 80, 75, datetime('now', 'localtime'))",
+            [(user_id, random.randrange(1500, 3000, 100)) for user_id in ids])
+        connection.commit()
+
+    from daily_totals import rebuild_daily_totals
+    from weight_history import rebuild_weight_summary
+    rebuild_daily_totals(connection)
+    rebuild_weight_summary(connection)
+    connection.commit()
+    connection.close()
+
+def measure(path, users, requests):
+    from app import app
+    app.config['DATABASE'] = path
+    client = app.test_client()
+
+    latencies = []
+    for _ in range(requests):
+        with client.session_transaction() as session:
+            session['user_id'] = random.randint(1, users + 1)
+        start = time.perf_counter()
+        response = client.get('/home_data')
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.data
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3)
+    }
+
+def run(args):
+    path = args.database or temp_database('codey-users-')
+    start = time.perf_counter()
+    seed_users(path, args.users, args.days, args.entries)
+    report = {
+        'database': path,
+        'users': args.users,
+        'days': args.days,
+        'entries_per_day': args.entries,
+        'seed_seconds': round(time.perf_counter() - start, 2),
+        'size_mb': round(os.path.getsize(path) / 1e6, 1)
+    }
+    if args.requests:
+        report['home_data'] = measure(path, args.users, args.requests)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed many synthetic users and time per-user dashboards')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--entries', type=int, default=3, help='foods and workouts per user per day')
+    parser.add_argument('--requests', type=int, default=0, help='time this many /home_data requests')
+    parser.add_argument('--database', help='write here instead of a temporary file (overwrites it)')
+    run(parser.parse_args())
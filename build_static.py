@@ -0,0 +1,112 @@
+# Static asset build for Health and Fitness Tracker
+#
+#   python build_static.py          fingerprint static/ into static/dist/
+#   python build_static.py vendor   download Chart.js, jQuery and Bootstrap
+#                                   into static/vendor/ (commit them), then build
+#
+# Every file under static/ (static/dist/ excepted) is copied to static/dist/
+# as <name>.<first 12 hex digits of its SHA-256>.<ext>. Text assets also get
+# a gzip (.gz) and, with the brotli package installed, a brotli (.br)
+# variant, kept only when smaller. static/dist/manifest.json maps each
+# source path to its copy; see static_assets.py for how it is served. Run the
+# build again after changing anything under static/; stale copies are
+# removed.
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import urllib.request
+from static_assets import VENDOR
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(ROOT, 'static')
+DIST = os.path.join(STATIC, 'dist')
+
+COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.txt', '.html', '.ico', '.map')
+
+def source_files():
+    for directory, subdirectories, files in os.walk(STATIC):
+        subdirectories[:] = sorted(name for name in subdirectories if os.path.join(directory, name) != DIST)
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            yield os.path.relpath(path, STATIC).replace(os.sep, '/'), path
+
+def fingerprint(relative, data):
+    stem, ext = os.path.splitext(relative)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build():
+    manifest = {}
+    written = set()
+    precompressed = 0
+    for relative, path in source_files():
+        with open(path, 'rb') as f:
+            data = f.read()
+        target = fingerprint(relative, data)
+        manifest[relative] = f'dist/{target}'
+        output = os.path.join(DIST, target)
+        write(output, data)
+        written.add(output)
+
+        if not relative.endswith(COMPRESSIBLE):
+            continue
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, variant in variants:
+            if len(variant) < len(data):
+                write(output + suffix, variant)
+                written.add(output + suffix)
+                precompressed += 1
+
+    # Drop copies of earlier versions
+    for directory, _, files in os.walk(DIST):
+        for name in files:
+            path = os.path.join(directory, name)
+            if path not in written and name != 'manifest.json':
+                os.remove(path)
+
+    write(os.path.join(DIST, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    print(f'Fingerprinted {len(manifest)} files into {os.path.relpath(DIST, ROOT)}/ '
+          f'with {precompressed} precompressed variants')
+
+def vendor():
+    directory = os.path.join(STATIC, 'vendor')
+    os.makedirs(directory, exist_ok=True)
+    for name, (filename, url) in sorted(VENDOR.items()):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            continue
+        print(f'Downloading {name} from {url}')
+        with urllib.request.urlopen(url, timeout=30) as response, open(path + '.part', 'wb') as f:
+            shutil.copyfileobj(response, f)
+        os.replace(path + '.part', path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed static assets')
+    parser.add_argument('command', nargs='?', choices=['build', 'vendor'], default='build')
+    args = parser.parse_args(argv)
+
+    if args.command == 'vendor':
+        try:
+            vendor()
+        except OSError as e:
+            sys.exit(f'Download failed: {e}')
+    build()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Response compression for Health and Fitness Tracker
+#
+# compress_response() runs after every request and compresses text and JSON
+# bodies of at least COMPRESS_MIN_SIZE bytes with brotli (when the brotli
+# package is installed) or gzip, whichever the client's Accept-Encoding
+# prefers. Streamed responses (/events, /export) and files sent from disk
+# are left alone: compressing a stream would hold back its chunks. Routes
+# that cache their body (GET /, page_cache.py) use choose_encoding() and
+# compress() to keep the compressed copy too, and set Content-Encoding
+# themselves so it is not compressed again.
+
+import gzip
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                      'image/svg+xml')
+
+def compressible(response):
+    return (current_app.config.get('COMPRESS_ENABLED', True)
+            and 200 <= response.status_code < 300 and response.status_code not in (204, 206)
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype != 'text/event-stream'
+            and response.mimetype.startswith(COMPRESSIBLE_TYPES))
+
+def choose_encoding(data):
+    # The encoding this request should get data in, or None to send it as is
+    if not current_app.config.get('COMPRESS_ENABLED', True) or \
+            len(data) < current_app.config.get('COMPRESS_MIN_SIZE', 1024):
+        return None
+    return request.accept_encodings.best_match(ENCODINGS)
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=current_app.config.get('COMPRESS_BROTLI_QUALITY', 4))
+    return gzip.compress(data, compresslevel=current_app.config.get('COMPRESS_LEVEL', 6), mtime=0)
+
+def compress_response(response):
+    if not compressible(response):
+        return response
+    # Caches must not hand a compressed body to a client that cannot read it
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    encoding = choose_encoding(data)
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
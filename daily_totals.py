@@ -0,0 +1,98 @@
+# Per-day calorie rollup for Health and Fitness Tracker
+#
+# daily_totals holds one row per user and local day with the summed calories
+# and entry counts of foods and workouts. Writers adjust it in the same transaction as
+# the raw row, so dashboard readers only touch the days they display.
+
+from datetime import datetime, timedelta
+
+CREATE_DAILY_TOTALS = '''
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        user_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        calories_consumed INTEGER NOT NULL DEFAULT 0,
+        calories_burned INTEGER NOT NULL DEFAULT 0,
+        food_count INTEGER NOT NULL DEFAULT 0,
+        workout_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    ) WITHOUT ROWID
+'''
+
+# Raw tables whose old rows maintenance.py moves to an archive table; the
+# rollup keeps their totals, and rebuilds and exports read both
+ARCHIVE_TABLES = {
+    'workouts': 'workouts_archive',
+    'foods': 'foods_archive'
+}
+
+def local_now():
+    # Timestamps are stored as local time, matching datetime('now', 'localtime')
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def parse_local_timestamp(value):
+    # Accept 'YYYY-MM-DD HH:MM:SS' or ISO 8601; aware times are converted to local
+    parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def local_day(offset=0):
+    return (datetime.now().date() - timedelta(days=offset)).strftime('%Y-%m-%d')
+
+UPSERT_DAILY_TOTALS = '''
+    INSERT INTO daily_totals (user_id, day, calories_consumed, calories_burned, food_count, workout_count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, day) DO UPDATE SET
+        calories_consumed = calories_consumed + excluded.calories_consumed,
+        calories_burned = calories_burned + excluded.calories_burned,
+        food_count = food_count + excluded.food_count,
+        workout_count = workout_count + excluded.workout_count
+'''
+
+def adjust_daily_totals(db, user_id, day, consumed=0, burned=0, foods=0, workouts=0):
+    db.execute(UPSERT_DAILY_TOTALS, (user_id, day, consumed, burned, foods, workouts))
+
+def adjust_daily_totals_many(db, user_id, changes):
+    # changes maps day -> [consumed, burned, foods, workouts]
+    db.executemany(UPSERT_DAILY_TOTALS, [(user_id, day, *delta) for day, delta in changes.items()])
+
+def get_daily_totals(db, user_id, start_day, end_day):
+    cursor = db.execute('''
+        SELECT day, calories_consumed, calories_burned, food_count, workout_count
+        FROM daily_totals
+        WHERE user_id = ? AND day BETWEEN ? AND ?
+        ORDER BY day
+    ''', (user_id, start_day, end_day))
+
+    totals = {}
+    for row in cursor.fetchall():
+        totals[row[0]] = {
+            'consumed': row[1],
+            'burned': row[2],
+            'food_count': row[3],
+            'workout_count': row[4]
+        }
+    return totals
+
+def rebuild_daily_totals(db):
+    # Recompute every day from the raw tables and their archives
+    db.execute(CREATE_DAILY_TOTALS)
+    db.execute('DELETE FROM daily_totals')
+    archives = {row[0] for row in db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+        tuple(ARCHIVE_TABLES.values()))}
+    sources = []
+    for table, columns in (('foods', 'calories, 0, 1, 0'), ('workouts', '0, calories_burned, 0, 1')):
+        for source in (table, ARCHIVE_TABLES[table]):
+            if source == table or source in archives:
+                sources.append(f'SELECT user_id, day, {columns} FROM {source}')
+    db.execute(f'''
+        WITH raw (user_id, day, consumed, burned, food_count, workout_count) AS (
+            {' UNION ALL '.join(sources)}
+        )
+        INSERT INTO daily_totals (user_id, day, calories_consumed, calories_burned, food_count, workout_count)
+        SELECT user_id, day, SUM(consumed), SUM(burned), SUM(food_count), SUM(workout_count)
+        FROM raw
+        GROUP BY user_id, day
+    ''')
+    return db.execute('SELECT COUNT(*) FROM daily_totals').fetchone()[0]
@@ -0,0 +1,142 @@
+# Dashboard data for Health and Fitness Tracker
+#
+# A DashboardSnapshot gathers everything one user's dashboard shows with at
+# most one query per table: today's workouts, today's foods, the last 7 days
+# of daily_totals and the current profile (usually a profile cache hit). Each
+# query is a (user_id, day) index range, so its cost does not depend on how
+# many other users share the database. The
+# summary, weekly series and averages are derived in a single Python pass.
+
+from daily_totals import get_daily_totals, local_day
+from user_profile import get_current_profile
+
+DEFAULT_USER_INFO = {
+    'daily_calories_target': 2000,
+    'current_weight': None,
+    'target_weight': None
+}
+
+def get_todays_workouts(db, user_id):
+    cursor = db.cursor()
+    cursor.execute('''
+        SELECT id, type, duration, calories_burned, created_at
+        FROM workouts
+        WHERE user_id = ? AND day = ?
+        ORDER BY created_at DESC
+    ''', (user_id, local_day()))
+
+    workouts = []
+    for row in cursor.fetchall():
+        workouts.append({
+            'id': row[0],
+            'type': row[1],
+            'duration': row[2],
+            'calories_burned': row[3],
+            'created_at': row[4]
+        })
+    return workouts
+
+def get_todays_foods(db, user_id):
+    cursor = db.cursor()
+    cursor.execute('''
+        SELECT id, description, calories, created_at
+        FROM foods
+        WHERE user_id = ? AND day = ?
+        ORDER BY created_at DESC
+    ''', (user_id, local_day()))
+
+    foods = []
+    for row in cursor.fetchall():
+        foods.append({
+            'id': row[0],
+            'description': row[1],
+            'calories': row[2],
+            'created_at': row[3]
+        })
+    return foods
+
+def get_latest_user_info(db, user_id):
+    profile = get_current_profile(db, user_id)
+    if profile is None:
+        return dict(DEFAULT_USER_INFO)
+    return {field: profile[field] for field in DEFAULT_USER_INFO}
+
+class DashboardSnapshot:
+    def __init__(self, workouts, foods, totals, user_info, days=7):
+        self.workouts = workouts
+        self.foods = foods
+        self.user_info = user_info
+        self._compute(totals, days)
+
+    @classmethod
+    def build(cls, db, user_id, workouts=True, foods=True, days=7):
+        totals = get_daily_totals(db, user_id, local_day(days - 1), local_day())
+        return cls(
+            get_todays_workouts(db, user_id) if workouts else None,
+            get_todays_foods(db, user_id) if foods else None,
+            totals,
+            get_latest_user_info(db, user_id),
+            days
+        )
+
+    def _compute(self, totals, days):
+        daily_target = self.user_info['daily_calories_target']
+
+        # Oldest day first, matching the chart's x axis
+        self.weekly_data = {}
+        daily_calories = []
+        daily_burned = []
+        total_calories = 0
+        total_burned = 0
+        days_with_data = 0
+
+        for offset in range(days - 1, -1, -1):
+            day = local_day(offset)
+            row = totals.get(day)
+            consumed = row['consumed'] if row else 0
+            burned = row['burned'] if row else 0
+
+            self.weekly_data[day] = {'consumed': consumed, 'burned': burned}
+            daily_calories.append(consumed)
+            daily_burned.append(burned)
+            if consumed > 0:
+                total_calories += consumed
+                days_with_data += 1
+            total_burned += burned
+
+        # The last day in the window is today
+        self.daily_summary = {
+            'calories_consumed': round(consumed),
+            'calories_burned': round(burned),
+            'net_calories': round(consumed - burned),
+            'daily_target': daily_target
+        }
+
+        avg_calories = round(total_calories / max(days_with_data, 1))
+        self.stats = {
+            'daily_calories': daily_calories,
+            'daily_burned': daily_burned,
+            'weekly_average': avg_calories,
+            'avg_calories_consumed': avg_calories,
+            'avg_calories_burned': round(total_burned / days),
+            'daily_target': daily_target,
+            'current_weight': self.user_info['current_weight'],
+            'target_weight': self.user_info['target_weight']
+        }
+
+def build_delta(db, user_id, kind, op, row, day, version):
+    # A compact change message: the affected row and its day's new totals
+    totals = get_daily_totals(db, user_id, day, day).get(day, {})
+    return {
+        'type': kind,
+        'op': op,
+        'row': row,
+        'day': day,
+        'today': local_day(),
+        'totals': {
+            'consumed': totals.get('consumed', 0),
+            'burned': totals.get('burned', 0)
+        },
+        'daily_target': get_latest_user_info(db, user_id)['daily_calories_target'],
+        'version': version
+    }
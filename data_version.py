@@ -0,0 +1,138 @@
+# Data version counters and conditional GET support
+#
+# Every mutating route bumps its user's version number after it commits.
+# Read endpoints derive a weak ETag from it and answer a matching
+# If-None-Match with 304 before touching SQLite. Versions live in a fixed
+# table of DATA_VERSION_SLOTS slots indexed by user_id; users that share a
+# slot only cost each other an occasional full response. The table is a
+# memory-mapped file shared by every process serving the database
+# (DATA_VERSION_FILE, <DATABASE>-version by default, POSIX only), so a 304
+# stays correct under any multi-process server, not just serve.py; an
+# in-memory database or DATA_VERSION_FILE = False keeps it in process. Slots start
+# from the current time in milliseconds, so a restart never reissues an old
+# version. Endpoints whose body depends on the query string (/export,
+# /stats, /get_weight_history) add a digest of the normalised arguments, so
+# one variant's ETag never validates another.
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import wraps
+from flask import current_app, request
+from werkzeug.http import http_date
+from auth import current_user_id
+from daily_totals import local_day
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process table
+    fcntl = None
+
+_SLOT = struct.Struct('<Qd')  # version, last modified (unix time)
+
+class DataVersion:
+    def __init__(self, path=None, slots=4096):
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._fd = None
+        now = time.time()
+        initial = _SLOT.pack(int(now * 1000), now) * slots
+        if path and fcntl is not None:
+            self._table = self._open(path, initial)
+        else:
+            self._table = bytearray(initial)
+
+    def _open(self, path, initial):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != len(initial):
+                os.ftruncate(self._fd, 0)
+                os.write(self._fd, initial)
+            return mmap.mmap(self._fd, len(initial))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _offset(self, user_id):
+        return (user_id % self.slots) * _SLOT.size
+
+    def current(self, user_id):
+        # (version, last_modified); a read is one unlocked 16-byte copy
+        return _SLOT.unpack_from(self._table, self._offset(user_id))
+
+    def bump(self, user_id):
+        offset = self._offset(user_id)
+        with self._lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                version, _ = _SLOT.unpack_from(self._table, offset)
+                version += 1
+                _SLOT.pack_into(self._table, offset, version, time.time())
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return version
+
+    def close(self):
+        if self._fd is not None:
+            self._table.close()
+            os.close(self._fd)
+            self._fd = None
+
+def version_file(config):
+    path = config.get('DATA_VERSION_FILE')
+    if path is None and config.get('DATABASE') not in (None, '', ':memory:'):
+        path = f"{config['DATABASE']}-version"
+    return path or None
+
+def get_data_version(app):
+    # Created per process so forked workers each map the shared file
+    version = app.extensions.get('data_version')
+    if version is None or version[0] != os.getpid():
+        version = (os.getpid(), DataVersion(
+            version_file(app.config),
+            app.config.get('DATA_VERSION_SLOTS', 4096)))
+        app.extensions['data_version'] = version
+    return version[1]
+
+def bump_data_version(user_id):
+    return get_data_version(current_app).bump(user_id)
+
+def make_etag(user_id, version):
+    # Responses also depend on the local day, which rolls over without a write
+    return f'{user_id}-{version}-{local_day()}'
+
+def args_digest(args):
+    # Order-independent digest of the query arguments; '' when there are none
+    pairs = sorted((key, value) for key, values in args.lists() for value in values)
+    if not pairs:
+        return ''
+    return hashlib.sha1(repr(pairs).encode()).hexdigest()[:16]
+
+def conditional(view):
+    # Send ETag/Last-Modified and short-circuit a matching If-None-Match
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = current_user_id()
+        version, modified = get_data_version(current_app).current(user_id)
+        etag = make_etag(user_id, version)
+        digest = args_digest(request.args)
+        if digest:
+            etag = f'{etag}-{digest}'
+
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        response.headers['Last-Modified'] = http_date(modified)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
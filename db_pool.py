@@ -0,0 +1,165 @@
+# SQLite connection pool for Health and Fitness Tracker
+#
+# Connections are opened lazily up to the configured size and reused across
+# requests, so each request skips connection setup and keeps a warm page
+# cache. Every connection starts in WAL mode with the tuned PRAGMAs below so
+# readers never block the writer and concurrent writers wait on busy_timeout
+# instead of failing with "database is locked".
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_CONFIG = {
+    'DATABASE': 'fitness.db',
+    'DB_POOL_SIZE': 8,
+    'DB_POOL_TIMEOUT': 5.0,          # seconds to wait for a free connection
+    'DB_POOL_STATS': True,           # track checkout counts and wait times
+    'SQLITE_CACHE_SIZE_KB': 16384,   # page cache per connection
+    'SQLITE_MMAP_SIZE': 268435456,   # bytes of the file to memory-map
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+}
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    def __init__(self, database, size=8, timeout=5.0, track_stats=True,
+                 cache_size_kb=16384, mmap_size=268435456, busy_timeout_ms=5000):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.track_stats = track_stats
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.pid = os.getpid()
+
+        # LIFO so the most recently used (warmest) connection is reused first
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        settings = dict(DEFAULT_CONFIG)
+        settings.update({key: config[key] for key in DEFAULT_CONFIG if key in config})
+        return cls(
+            settings['DATABASE'],
+            size=settings['DB_POOL_SIZE'],
+            timeout=settings['DB_POOL_TIMEOUT'],
+            track_stats=settings['DB_POOL_STATS'],
+            cache_size_kb=settings['SQLITE_CACHE_SIZE_KB'],
+            mmap_size=settings['SQLITE_MMAP_SIZE'],
+            busy_timeout_ms=settings['SQLITE_BUSY_TIMEOUT_MS']
+        )
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute(f'PRAGMA cache_size = -{int(self.cache_size_kb)}')
+        connection.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        connection.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        connection.execute('PRAGMA temp_store = MEMORY')
+        return connection
+
+    def checkout(self):
+        start = time.perf_counter() if self.track_stats else 0
+        connection = None
+
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    connection = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(
+                        f'No database connection available after {self.timeout}s '
+                        f'(pool size {self.size})')
+
+        with self._lock:
+            self._in_use += 1
+            if self.track_stats:
+                waited = time.perf_counter() - start
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+        return connection
+
+    def checkin(self, connection):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            # Never hand the next request a half-finished transaction
+            if connection.in_transaction:
+                connection.rollback()
+            connection.set_trace_callback(None)
+        except sqlite3.Error:
+            connection.close()
+            with self._lock:
+                self._opened -= 1
+            return
+        self._idle.put(connection)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'opened': self._opened,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0,
+                'max_wait_ms': round(self._wait_max * 1000, 3)
+            }
+
+    def close(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self._lock:
+                self._opened -= 1
+
+_pool_lock = threading.Lock()
+
+def get_pool(app):
+    # One pool per app and process; a forked worker opens its own connections
+    pool = app.extensions.get('db_pool')
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            pool = app.extensions.get('db_pool')
+            if pool is None or pool.pid != os.getpid():
+                pool = ConnectionPool.from_config(app.config)
+                app.extensions['db_pool'] = pool
+    return pool
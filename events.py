@@ -0,0 +1,337 @@
+# Server-sent events for Health and Fitness Tracker
+#
+# Mutating routes publish small delta messages after they commit; /events
+# streams them to every open dashboard of the same user. The broker is an
+# in-process pub/sub keyed by user: messages are serialized once per publish,
+# and a subscriber that falls behind is dropped and told to resync instead of
+# slowing publishers down. Idle streams only wake up for a heartbeat, which
+# also compares the shared data version so writes made by other worker
+# processes trigger a resync.
+#
+# No stream holds a request thread. Under serve.py's werkzeug workers /events
+# takes the connection over (the HIJACK_KEY callable in the WSGI environ) and
+# hands the socket to the worker's EventHub, one selector thread that writes
+# to every open stream, so an idle dashboard costs a socket and a buffer.
+# Under gunicorn serve.py runs gevent workers, where the streaming response
+# (EventBroker.stream) waits on a greenlet; the development server and the
+# test client use the same generator on their own threads.
+
+import json
+import logging
+import os
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RESYNC = 'event: resync\ndata: {}\n\n'
+KEEPALIVE = ': keepalive\n\n'
+RETRY = 'retry: 5000\n\n'
+
+# WSGI environ key of a callable that detaches the request's socket (serve.py)
+HIJACK_KEY = 'fitness.hijack'
+
+# Written by the hub itself: a hijacked connection gets no response from the server
+RESPONSE_HEAD = ('HTTP/1.1 200 OK\r\n'
+                 'Content-Type: text/event-stream; charset=utf-8\r\n'
+                 'Cache-Control: no-cache\r\n'
+                 'X-Accel-Buffering: no\r\n'
+                 'Connection: close\r\n'
+                 '\r\n')
+
+def format_event(data, event='delta', event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+class Subscriber:
+    # Streamed by EventBroker.stream(); messages wait in a bounded queue
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+class Connection:
+    # A hijacked /events socket; everything but put() runs on the hub thread
+    def __init__(self, hub, broker, sock, user_id, current_version, seen, queue_size):
+        self.hub = hub
+        self.broker = broker
+        self.sock = sock
+        self.user_id = user_id
+        self.current_version = current_version
+        self.seen = seen
+        self.queue_size = queue_size
+        self.buffer = bytearray()
+        self.backlog = 0  # messages queued since the buffer was last empty
+        self.closing = False
+        self.closed = False
+        self.dropped = False
+
+    def put(self, message):
+        self.hub.call(self.hub.send, self, message)
+        return True
+
+class EventBroker:
+    def __init__(self, queue_size=64):
+        self.queue_size = queue_size
+        self._channels = {}  # user_id -> set of subscribers and connections
+        self._count = 0
+        self._lock = threading.Lock()
+        self.published = 0
+
+    @property
+    def subscriber_count(self):
+        return self._count
+
+    def _add(self, subscriber):
+        with self._lock:
+            self._channels.setdefault(subscriber.user_id, set()).add(subscriber)
+            self._count += 1
+        return subscriber
+
+    def subscribe(self, user_id):
+        return self._add(Subscriber(user_id, self.queue_size))
+
+    def attach(self, hub, sock, user_id, current_version, last_event_id=None):
+        # Hands a hijacked socket to the hub, which streams to it until the
+        # client goes away. The hub queues the response head before the
+        # connection can receive a publish.
+        seen = current_version()
+        head = RESPONSE_HEAD + RETRY
+        if last_event_id is not None and last_event_id < seen:
+            head += RESYNC
+        connection = Connection(hub, self, sock, user_id, current_version, seen, self.queue_size)
+        hub.call(hub.open, connection, head.encode())
+        return self._add(connection)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            channel = self._channels.get(subscriber.user_id)
+            if channel is None or subscriber not in channel:
+                return
+            channel.discard(subscriber)
+            self._count -= 1
+            if not channel:
+                del self._channels[subscriber.user_id]
+
+    def publish(self, user_id, data, version=None, event='delta'):
+        with self._lock:
+            subscribers = list(self._channels.get(user_id, ()))
+            self.published += 1
+        if not subscribers:
+            return
+
+        message = (version, format_event(data, event, version))
+        for subscriber in subscribers:
+            if not subscriber.put(message):
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+
+    def stream(self, subscriber, current_version, heartbeat=15.0, last_event_id=None):
+        # Generator for the /events response body when the socket can't be hijacked
+        try:
+            seen = current_version()
+            yield RETRY
+            if last_event_id is not None and last_event_id < seen:
+                yield RESYNC
+
+            while True:
+                try:
+                    version, message = subscriber.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    if subscriber.dropped:
+                        yield RESYNC
+                        return
+                    latest = current_version()
+                    if latest > seen:
+                        # Another process wrote without us seeing an event
+                        seen = latest
+                        yield RESYNC
+                    else:
+                        yield KEEPALIVE
+                    continue
+
+                if version is not None:
+                    seen = max(seen, version)
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+class EventHub:
+    # One thread per worker process multiplexes every hijacked stream with a
+    # selector. Other threads only queue calls for it (call()); sockets are
+    # non-blocking and a slow client's bytes wait in its buffer.
+    def __init__(self, heartbeat=15.0):
+        self.heartbeat = heartbeat
+        self.pid = os.getpid()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._waker = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._waker.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._calls = deque()
+        self._connections = set()
+        self._thread = threading.Thread(target=self._loop, name='events', daemon=True)
+        self._thread.start()
+
+    @property
+    def connection_count(self):
+        return len(self._connections)
+
+    def call(self, function, *args):
+        self._calls.append((function, args))
+        try:
+            self._waker.send(b'\0')
+        except (BlockingIOError, InterruptedError):
+            pass  # the hub already has a wakeup pending
+
+    def _loop(self):
+        next_heartbeat = time.monotonic() + self.heartbeat
+        while True:
+            try:
+                timeout = max(next_heartbeat - time.monotonic(), 0)
+                for key, mask in self._selector.select(timeout):
+                    if key.fileobj is self._wakeup:
+                        self._drain_wakeup()
+                    else:
+                        self._ready(key.data, mask)
+                while self._calls:
+                    function, args = self._calls.popleft()
+                    function(*args)
+                if time.monotonic() >= next_heartbeat:
+                    self._heartbeat()
+                    next_heartbeat = time.monotonic() + self.heartbeat
+            except Exception:
+                logger.exception('Event hub iteration failed')
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _ready(self, connection, mask):
+        if mask & selectors.EVENT_READ:
+            # Clients send nothing after the request; readable means closed
+            try:
+                if not connection.sock.recv(4096):
+                    self.close(connection)
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.close(connection)
+        if mask & selectors.EVENT_WRITE:
+            self._flush(connection)
+
+    def open(self, connection, head):
+        connection.sock.setblocking(False)
+        try:
+            self._selector.register(connection.sock, selectors.EVENT_READ, connection)
+        except (OSError, ValueError):
+            self.close(connection)
+            return
+        self._connections.add(connection)
+        self._write(connection, head)
+
+    def send(self, connection, message):
+        if connection.closed or connection.closing:
+            return
+        if connection.backlog >= connection.queue_size:
+            # Fell behind: finish with a resync and let the client reconnect
+            connection.dropped = connection.closing = True
+            connection.broker.unsubscribe(connection)
+            self._write(connection, RESYNC.encode())
+            return
+        version, text = message
+        if version is not None:
+            connection.seen = max(connection.seen, version)
+        connection.backlog += 1
+        self._write(connection, text.encode())
+
+    def _heartbeat(self):
+        for connection in list(self._connections):
+            if connection.closing:
+                continue
+            latest = connection.current_version()
+            if latest > connection.seen:
+                # Another process wrote without us seeing an event
+                connection.seen = latest
+                self._write(connection, RESYNC.encode())
+            else:
+                self._write(connection, KEEPALIVE.encode())
+
+    def _write(self, connection, data):
+        if connection.closed:
+            return
+        connection.buffer += data
+        self._flush(connection)
+
+    def _flush(self, connection):
+        if connection.closed:
+            return
+        if connection.buffer:
+            try:
+                sent = connection.sock.send(connection.buffer)
+                del connection.buffer[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.close(connection)
+                return
+        if connection.buffer:
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE
+        elif connection.closing:
+            self.close(connection)
+            return
+        else:
+            connection.backlog = 0
+            events = selectors.EVENT_READ
+        if self._selector.get_key(connection.sock).events != events:
+            self._selector.modify(connection.sock, events, connection)
+
+    def close(self, connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        try:
+            self._selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+        self._connections.discard(connection)
+        connection.broker.unsubscribe(connection)
+
+def get_broker(app):
+    broker = app.extensions.get('event_broker')
+    if broker is None:
+        broker = app.extensions.setdefault('event_broker', EventBroker(
+            app.config.get('SSE_QUEUE_SIZE', 64)))
+    return broker
+
+_hub_lock = threading.Lock()
+
+def get_event_hub(app):
+    # One hub per app and process, started by the first hijacked stream
+    hub = app.extensions.get('event_hub')
+    if hub is None or hub.pid != os.getpid():
+        with _hub_lock:
+            hub = app.extensions.get('event_hub')
+            if hub is None or hub.pid != os.getpid():
+                hub = EventHub(app.config.get('SSE_HEARTBEAT', 15.0))
+                app.extensions['event_hub'] = hub
+    return hub
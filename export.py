@@ -0,0 +1,151 @@
+# History export for Health and Fitness Tracker
+#
+# Rows are read with fetchmany() from a single read transaction and yielded
+# as CSV or NDJSON text chunks, so memory use stays flat however much history
+# is exported and the first bytes go out as soon as the first batch is read.
+# The /export route (scoped to the session's user) and the command line below
+# share this code.
+#
+#   python export.py --format csv --table foods --user 1 --from 2024-01-01 -o foods.csv
+
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+from datetime import date, timedelta
+from daily_totals import ARCHIVE_TABLES
+
+# table -> (columns, day filter column, whether that column holds a timestamp,
+#           row order for one user that follows the table's user index)
+EXPORT_TABLES = {
+    'workouts': (('id', 'user_id', 'type', 'duration', 'calories_burned', 'created_at', 'day'),
+                 'day', False, 'day, created_at, id'),
+    'foods': (('id', 'user_id', 'description', 'calories', 'created_at', 'day'),
+              'day', False, 'day, created_at, id'),
+    'weight_history': (('id', 'user_id', 'weight', 'date', 'notes', 'created_at'),
+                       'date', False, 'date, id'),
+    'user_info': (('id', 'user_id', 'daily_calories_target', 'current_weight', 'target_weight',
+                   'height', 'age', 'gender', 'created_at'), 'created_at', True, 'id'),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+BATCH_SIZE = 1000
+
+class ExportError(ValueError):
+    pass
+
+def parse_export_args(fmt, tables, start, end):
+    # Validate user input; returns (format, [tables], start, end)
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(FORMATS)}")
+
+    tables = [t.strip() for t in tables.split(',') if t.strip()] if tables else list(EXPORT_TABLES)
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown:
+        raise ExportError(f"Unknown table: {', '.join(unknown)}")
+    if fmt == 'csv' and len(tables) != 1:
+        raise ExportError('CSV export needs exactly one table')
+
+    for value in (start, end):
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise ExportError(f'Invalid date: {value} (expected YYYY-MM-DD)')
+    return fmt, tables, start or None, end or None
+
+def iter_rows(db, table, user_id=None, start=None, end=None, batch_size=BATCH_SIZE):
+    columns, column, is_timestamp, user_order = EXPORT_TABLES[table]
+    conditions = []
+    params = []
+    if user_id is not None:
+        conditions.append('user_id = ?')
+        params.append(user_id)
+    if start:
+        conditions.append(f'{column} >= ?')
+        params.append(start)
+    if end:
+        if is_timestamp:
+            # Timestamps on the end day sort after the bare date string
+            conditions.append(f'{column} < ?')
+            params.append((date.fromisoformat(end) + timedelta(days=1)).isoformat())
+        else:
+            conditions.append(f'{column} <= ?')
+            params.append(end)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    order = user_order if user_id is not None else 'id'
+    # Archived rows (see maintenance.py) are older, so they come first
+    sources = [ARCHIVE_TABLES[table], table] if table in ARCHIVE_TABLES else [table]
+    for source in sources:
+        cursor = db.execute(f"SELECT {', '.join(columns)} FROM {source} {where} ORDER BY {order}", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield columns, rows
+
+def iter_export(db, fmt, tables, user_id=None, start=None, end=None, batch_size=BATCH_SIZE):
+    # One read transaction so a multi-table export is a consistent snapshot
+    opened = not db.in_transaction
+    if opened:
+        db.execute('BEGIN')
+    try:
+        for table in tables:
+            header_written = False
+            for columns, rows in iter_rows(db, table, user_id, start, end, batch_size):
+                buffer = io.StringIO()
+                if fmt == 'csv':
+                    writer = csv.writer(buffer)
+                    if not header_written:
+                        writer.writerow(columns)
+                        header_written = True
+                    writer.writerows(tuple(row) for row in rows)
+                else:
+                    for row in rows:
+                        record = {'table': table}
+                        record.update(zip(columns, row))
+                        buffer.write(json.dumps(record))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+
+            if fmt == 'csv' and not header_written:
+                yield ','.join(EXPORT_TABLES[table][0]) + '\r\n'
+    finally:
+        if opened and db.in_transaction:
+            db.rollback()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export fitness.db history as CSV or NDJSON')
+    parser.add_argument('--database', default='fitness.db')
+    parser.add_argument('--format', default='ndjson', choices=sorted(FORMATS))
+    parser.add_argument('--table', help='comma-separated tables (default: all)')
+    parser.add_argument('--user', type=int, help='only this user id (default: all users)')
+    parser.add_argument('--from', dest='start', help='first day, YYYY-MM-DD')
+    parser.add_argument('--to', dest='end', help='last day, YYYY-MM-DD')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        fmt, tables, start, end = parse_export_args(args.format, args.table, args.start, args.end)
+    except ExportError as e:
+        parser.error(str(e))
+
+    connection = sqlite3.connect(args.database)
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in iter_export(connection, fmt, tables, args.user, start, end):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        connection.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+# Optional spaCy food parser for Health and Fitness Tracker
+#
+# With NLP_PARSER_ENABLED, log_food and edit_food send descriptions to a
+# spaCy pipeline in a ProcessPoolExecutor, so model inference never runs on a
+# request thread. It picks out foods, quantities, serving units and portion
+# sizes ("two slices of pizza and a large coke") and prices each food from
+# the nutrition table.
+#
+# Each server process starts its pool in the background on first use and
+# loads the model in every pool worker before taking requests. Descriptions
+# that arrive together are parsed together (nlp.pipe over up to
+# NLP_BATCH_SIZE texts, gathered for at most NLP_BATCH_WAIT seconds), and
+# results are kept in an LRU cache keyed on the normalized description.
+# calories() returns None, and the caller falls back to the trie matcher in
+# nutrition.py, while the pool is starting or unavailable, when
+# NLP_MAX_PENDING descriptions are already waiting, or when a result takes
+# longer than NLP_TIMEOUT; a late result still goes into the cache. A pool
+# whose process dies is shut down and started again, waiting
+# NLP_RESTART_DELAY seconds at first and twice as long after each crash
+# that follows within MAX_RESTART_DELAY seconds.
+#
+# spaCy and the model are only needed with the parser enabled:
+#   pip install spacy && python -m spacy download en_core_web_sm
+
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from nutrition import NUMBER_WORDS, SEPARATORS, UNIT_GRAMS, load_matcher, parse_quantity, servings, singular
+
+logger = logging.getLogger(__name__)
+
+# Words naming a serving; a quantity before them counts servings of the food.
+# Weight and volume units (nutrition.UNIT_GRAMS) are converted to servings
+# with the food's serving weight instead.
+UNITS = {'slice', 'piece', 'glass', 'bowl', 'plate', 'serving', 'portion', 'helping',
+         'can', 'bottle', 'mug', 'scoop', 'handful', 'bar', 'stick'}
+
+MAX_RESTART_DELAY = 300.0  # seconds
+
+# Portion size words and how many servings they stand for
+SIZES = {'small': 0.75, 'little': 0.75, 'medium': 1.0, 'regular': 1.0, 'large': 1.5, 'big': 1.5,
+         'extra': 1.5, 'huge': 2.0, 'double': 2.0}
+
+# Parts of speech that never name a food ("of", "the", "some", "my")
+SKIPPED_POS = {'ADP', 'DET', 'PRON', 'PART', 'CCONJ', 'PUNCT', 'SPACE'}
+
+_MISSING = object()
+
+def normalize(description):
+    return ' '.join(description.lower().split()).strip(' .!?')
+
+def parse_doc(doc, matcher):
+    # Returns [(food, servings, unit, calories per serving)] for a parsed description
+    items = []
+    segment = []
+    for token in doc:
+        if token.lower_ in SEPARATORS or token.is_punct:
+            items.extend(parse_item(segment, matcher))
+            segment = []
+        else:
+            segment.append(token)
+    items.extend(parse_item(segment, matcher))
+    return items
+
+def parse_item(tokens, matcher):
+    quantity = None
+    size = 1.0
+    unit = None
+    words = []
+    for token in tokens:
+        lower = token.lower_
+        if token.like_num or lower in NUMBER_WORDS:
+            value = parse_quantity(lower)
+            if value is not None:
+                # "a couple", "half a dozen"
+                quantity = value if quantity is None else quantity * value
+                continue
+        if lower in SIZES:
+            size *= SIZES[lower]
+            continue
+        lemma = token.lemma_.lower()
+        if unit is None and singular(lower) in UNIT_GRAMS:
+            # "100 g", "250ml"; a size word does not change a weight
+            unit = singular(lower)
+            size = 1.0
+            continue
+        if lemma in UNITS:
+            unit = lemma
+            continue
+        if token.pos_ not in SKIPPED_POS:
+            words.append(lemma)
+
+    quantity = 1 if quantity is None else quantity
+    weight_unit = unit if unit in UNIT_GRAMS else None
+    return [(food, servings(quantity, weight_unit, grams) * (1.0 if weight_unit else size), unit, calories)
+            for food, _, calories, grams in matcher.match(' '.join(words))]
+
+# Pool worker state, set up by _init_worker in each process
+
+_nlp = None
+_matcher = None
+
+def _init_worker(model, nutrition_path):
+    global _nlp, _matcher
+    import spacy
+    _nlp = spacy.load(model)
+    _matcher = load_matcher(nutrition_path)
+
+def _ready():
+    return os.getpid()
+
+def _parse_batch(descriptions):
+    return [parse_doc(doc, _matcher) for doc in _nlp.pipe(descriptions)]
+
+class FoodParser:
+    def __init__(self, model, nutrition_path, workers=1, batch_size=32, batch_wait=0.005,
+                 max_pending=64, timeout=0.25, cache_size=10000, restart_delay=1.0):
+        self.model = model
+        self.nutrition_path = nutrition_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.restart_delay = restart_delay
+        self.pid = os.getpid()
+        self.ready = False
+        self.restarts = 0
+        self._executor = None
+        self._broken = False
+        self._queue = queue.SimpleQueue()  # (normalized description, Future), or None to wake _run
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._cache = OrderedDict()  # normalized description -> calories or None
+        self._cache_lock = threading.Lock()
+        threading.Thread(target=self._run, name='food-parser', daemon=True).start()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get('NLP_MODEL', 'en_core_web_sm'),
+            config.get('NUTRITION_DB'),
+            config.get('NLP_WORKERS', 1),
+            config.get('NLP_BATCH_SIZE', 32),
+            config.get('NLP_BATCH_WAIT', 0.005),
+            config.get('NLP_MAX_PENDING', 64),
+            config.get('NLP_TIMEOUT', 0.25),
+            config.get('NLP_CACHE_SIZE', 10000),
+            config.get('NLP_RESTART_DELAY', 1.0))
+
+    def calories(self, description, wait=True):
+        # Calories from the parser, or None when the caller should use the matcher;
+        # with wait=False only cached results are returned
+        key = normalize(description)
+        with self._cache_lock:
+            calories = self._cache.get(key, _MISSING)
+            if calories is not _MISSING:
+                self._cache.move_to_end(key)
+                return calories
+        if not wait or not self.ready:
+            return None
+
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+        future = concurrent.futures.Future()
+        self._queue.put((key, future))
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            return None
+
+    def _start_pool(self):
+        # Spawned rather than forked: the server process already runs threads
+        executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(self.model, self.nutrition_path))
+        try:
+            # Busy workers make the pool start the next one, so every
+            # process loads the model before the first request needs it
+            for future in [executor.submit(_ready) for _ in range(self.workers)]:
+                future.result()
+        except Exception:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor
+
+    def _run(self):
+        try:
+            executor = self._start_pool()
+        except Exception as e:
+            # Missing spaCy or model: not worth retrying
+            logger.warning('NLP food parser unavailable, using the nutrition table matcher: %s', e)
+            return
+
+        delay = self.restart_delay
+        while True:
+            logger.info('NLP food parser ready (%s, %d processes)', self.model, self.workers)
+            started = time.monotonic()
+            self._executor = executor
+            self._broken = False
+            self.ready = True
+            while not self._broken:
+                waiters = self._next_batch()
+                if waiters:
+                    self._submit_batch(waiters)
+
+            self.ready = False
+            executor.shutdown(wait=False, cancel_futures=True)
+            # A pool that ran for a while restarts promptly; repeated crashes back off
+            delay = self.restart_delay if time.monotonic() - started > MAX_RESTART_DELAY \
+                else min(delay * 2, MAX_RESTART_DELAY)
+            while True:
+                logger.warning('NLP food parser pool crashed, restarting in %.0f s', delay)
+                time.sleep(delay)
+                try:
+                    executor = self._start_pool()
+                    break
+                except Exception as e:
+                    logger.warning('NLP food parser restart failed: %s', e)
+                    delay = min(delay * 2, MAX_RESTART_DELAY)
+            self.restarts += 1
+
+    def _next_batch(self):
+        # Blocks for the first description, then gathers more for up to batch_wait
+        waiters = {}
+        item = self._queue.get()
+        if item is None:
+            return waiters
+        key, future = item
+        waiters[key] = [future]
+        deadline = time.monotonic() + self.batch_wait
+        while len(waiters) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            key, future = item
+            waiters.setdefault(key, []).append(future)
+        return waiters
+
+    def _submit_batch(self, waiters):
+        keys = list(waiters)
+        executor = self._executor
+        try:
+            result = executor.submit(_parse_batch, keys)
+        except Exception as e:
+            self._finish(executor, waiters, keys, None, e)
+            return
+        result.add_done_callback(lambda result: self._finish(executor, waiters, keys, result))
+
+    def _finish(self, executor, waiters, keys, result, error=None):
+        if error is None:
+            try:
+                parsed = result.result()
+            except Exception as e:
+                error = e
+        if error is not None:
+            if isinstance(error, concurrent.futures.process.BrokenProcessPool) and \
+                    executor is self._executor and not self._broken:
+                # _run rebuilds the pool once it wakes up
+                self.ready = False
+                self._broken = True
+                self._queue.put(None)
+            logger.warning('NLP food parser failed on %d descriptions: %s', len(keys), error)
+            parsed = [None] * len(keys)
+
+        with self._cache_lock:
+            for key, items in zip(keys, parsed):
+                calories = round(sum(servings * calories for _, servings, _, calories in items)) if items else None
+                if error is None:
+                    self._cache[key] = calories
+                    self._cache.move_to_end(key)
+                for future in waiters[key]:
+                    future.set_result(calories)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        with self._pending_lock:
+            self._pending -= sum(len(futures) for futures in waiters.values())
+
+_parser_lock = threading.Lock()
+
+def get_food_parser(app):
+    # One parser per app and process, or None when NLP_PARSER_ENABLED is off
+    if not app.config.get('NLP_PARSER_ENABLED'):
+        return None
+    parser = app.extensions.get('food_parser')
+    if parser is None or parser.pid != os.getpid():
+        with _parser_lock:
+            parser = app.extensions.get('food_parser')
+            if parser is None or parser.pid != os.getpid():
+                parser = FoodParser.from_config(app.config)
+                app.extensions['food_parser'] = parser
+    return parser
@@ -1,4 +1,8 @@
 import sqlite3
+import sys
+from daily_totals import rebuild_daily_totals
+from migrations import migrate
+from weight_history import rebuild_weight_summary
 
 def init_db():
     # Connect to database (creates it if it doesn't exist)
@@ -17,5 +21,49 @@ def init_db():
     finally:
         connection.close()
 
+def rebuild_totals():
+    # Recompute the daily_totals and weight_summary rollups from the raw tables
+    connection = sqlite3.connect('fitness.db')
+    
+    try:
+        days = rebuild_daily_totals(connection)
+        users = rebuild_weight_summary(connection)
+        connection.commit()
+        print(f"Rebuilt daily totals for {days} days and weight summaries for {users} users")
+        
+    except Exception as e:
+        connection.rollback()
+        print(f"Error rebuilding daily totals: {str(e)}")
+        
+    finally:
+        connection.close()
+
+def migrate_db():
+    # Bring an existing fitness.db up to the current schema, keeping its data
+    connection = sqlite3.connect('fitness.db')
+    
+    try:
+        applied = migrate(connection)
+        if applied:
+            print(f"Applied migrations: {', '.join(applied)}")
+        else:
+            print("Database schema is up to date")
+        
+    except Exception as e:
+        print(f"Error migrating database: {str(e)}")
+        
+    finally:
+        connection.close()
+
+COMMANDS = {
+    'init': init_db,
+    'migrate': migrate_db,
+    'rebuild-totals': rebuild_totals
+}
+
 if __name__ == '__main__':
-    init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'init'
+    if command not in COMMANDS:
+        print(f"Usage: python init_db.py [{'|'.join(COMMANDS)}]")
+        sys.exit(1)
+    COMMANDS[command]()
@@ -0,0 +1,70 @@
+# JSON responses for Health and Fitness Tracker
+#
+# routes.py uses jsonify() from here in place of flask.jsonify. It encodes
+# with orjson when it is installed (JSON_BACKEND 'auto') or with the
+# standard library ('stdlib'), compact unless JSONIFY_PRETTYPRINT_REGULAR is
+# set. Values neither encoder handles natively, dates included, go through
+# the app's JSONEncoder, so the output matches flask.jsonify.
+#
+# shape_rows() implements ?shape=columns for endpoints that return lists of
+# row objects: each list becomes {"columns": [...], "rows": [[...], ...]},
+# so the key names are sent once instead of once per row.
+#
+# script_json() encodes a value for an inline <script type="application/json">
+# block, escaping the characters that could end the block early.
+
+import json
+from flask import current_app, request
+from markupsafe import Markup
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder is used
+    orjson = None
+
+SHAPES = ('rows', 'columns')
+
+def dumps(data, app):
+    pretty = app.config.get('JSONIFY_PRETTYPRINT_REGULAR', False)
+    if orjson is not None and app.config.get('JSON_BACKEND', 'auto') != 'stdlib':
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if app.config.get('JSON_SORT_KEYS'):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=app.json_encoder().default, option=option)
+
+    return json.dumps(
+        data,
+        cls=app.json_encoder,
+        indent=2 if pretty else None,
+        separators=(', ', ': ') if pretty else (',', ':'),
+        sort_keys=app.config.get('JSON_SORT_KEYS', False)
+    ).encode()
+
+def jsonify(*args, **kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    data = args[0] if len(args) == 1 else (args or kwargs)
+    app = current_app._get_current_object()
+    return app.response_class(dumps(data, app) + b'\n', mimetype=app.config['JSONIFY_MIMETYPE'])
+
+# '</script>' and '<!--' cannot appear in the output; JSON.parse reads the
+# escapes back unchanged
+_SCRIPT_ESCAPES = {ord('<'): '\\u003c', ord('>'): '\\u003e', ord('&'): '\\u0026',
+                   0x2028: '\\u2028', 0x2029: '\\u2029'}
+
+def script_json(data, app):
+    return Markup(dumps(data, app).decode().translate(_SCRIPT_ESCAPES))
+
+def columnar(rows):
+    columns = list(rows[0]) if rows else []
+    return {'columns': columns, 'rows': [[row[column] for column in columns] for row in rows]}
+
+def shape_rows(payload, *keys):
+    # Rewrites the named row lists in place when the request asks for ?shape=columns
+    if request.args.get('shape') == 'columns':
+        for key in keys:
+            if isinstance(payload.get(key), list):
+                payload[key] = columnar(payload[key])
+    return payload
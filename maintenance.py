@@ -0,0 +1,442 @@
+# Background maintenance for fitness.db
+#
+# Housekeeping that never runs on the request path:
+#   archive             moves workouts and foods rows older than
+#                       MAINTENANCE_ARCHIVE_DAYS to workouts_archive and
+#                       foods_archive; daily_totals keeps their totals, and
+#                       exports and rollup rebuilds read both tables
+#   compact_user_info   deletes superseded profile rows older than
+#                       MAINTENANCE_USER_INFO_KEEP_DAYS (the latest row per
+#                       user is always kept)
+#   optimize            PRAGMA optimize, after a full ANALYZE the first time
+#   incremental_vacuum  returns free pages to the filesystem (needs
+#                       auto_vacuum = INCREMENTAL, see --enable-incremental-vacuum)
+#   checkpoint          copies the WAL into the database; PASSIVE in the app,
+#                       TRUNCATE from a one-off command line run
+# Deletes run in batches of MAINTENANCE_BATCH_SIZE rows and the vacuum in
+# steps of MAINTENANCE_VACUUM_PAGES pages, one short write transaction each.
+# Every run returns a report of what each task did and how long it took.
+#
+# With MAINTENANCE_ENABLED the app runs them itself: a thread in each worker
+# waits MAINTENANCE_INTERVAL seconds, then for MAINTENANCE_IDLE_SECONDS
+# without a request to any worker, and takes a lock file so only one worker
+# runs at a time. Requests record their time as the lock file's mtime, so
+# every worker sees the same last activity; a request arriving mid-run stops
+# it between batches. Each run's report is saved as JSON next to the lock
+# file; GET /admin/maintenance shows the latest one, from whichever worker or
+# sidecar ran it, and POST runs the tasks now. The same tasks run from
+# the command line, once or as a sidecar loop:
+#
+#   python maintenance.py                      all tasks once
+#   python maintenance.py archive checkpoint   just these
+#   python maintenance.py --loop --interval 3600
+#   python maintenance.py --enable-incremental-vacuum   (stop the app first)
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from daily_totals import ARCHIVE_TABLES, local_day, local_now
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'MAINTENANCE_ARCHIVE_DAYS': 365,          # None keeps raw rows in place
+    'MAINTENANCE_USER_INFO_KEEP_DAYS': 30,    # None keeps every profile row
+    'MAINTENANCE_BATCH_SIZE': 500,            # rows per write transaction
+    'MAINTENANCE_VACUUM_PAGES': 1000,         # pages freed per write transaction
+    'MAINTENANCE_CHECKPOINT_MODE': 'PASSIVE', # never waits on readers or writers
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+}
+
+ARCHIVE_COLUMNS = {
+    'workouts': ('id', 'user_id', 'type', 'duration', 'calories_burned', 'created_at', 'day'),
+    'foods': ('id', 'user_id', 'description', 'calories', 'created_at', 'day'),
+}
+
+CREATE_ARCHIVE_TABLES = ('''
+    CREATE TABLE IF NOT EXISTS workouts_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        duration INTEGER NOT NULL,
+        calories_burned INTEGER NOT NULL,
+        created_at DATETIME,
+        day DATE NOT NULL
+    )
+''', '''
+    CREATE INDEX IF NOT EXISTS idx_workouts_archive_user_day ON workouts_archive (user_id, day, created_at)
+''', '''
+    CREATE TABLE IF NOT EXISTS foods_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        calories INTEGER NOT NULL,
+        created_at DATETIME,
+        day DATE NOT NULL
+    )
+''', '''
+    CREATE INDEX IF NOT EXISTS idx_foods_archive_user_day ON foods_archive (user_id, day, created_at)
+''')
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+class MaintenanceSkipped(Exception):
+    pass
+
+def create_archive_tables(db):
+    for statement in CREATE_ARCHIVE_TABLES:
+        db.execute(statement)
+
+def connect(database, busy_timeout_ms=5000):
+    # Autocommit, so each task controls its own transactions
+    connection = sqlite3.connect(database, timeout=busy_timeout_ms / 1000,
+                                 isolation_level=None, check_same_thread=False)
+    connection.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+    return connection
+
+def _delete_in_batches(db, table, select_ids, params, batch_size, should_stop, before_delete=None):
+    # Deletes the ids select_ids returns from table, batch_size at a time,
+    # calling before_delete(placeholders, ids) first; (rows, finished)
+    deleted = 0
+    while True:
+        if should_stop():
+            return deleted, False
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            ids = [row[0] for row in db.execute(select_ids, params + (batch_size,))]
+            if ids:
+                marks = ','.join('?' * len(ids))
+                if before_delete:
+                    before_delete(marks, ids)
+                db.execute(f'DELETE FROM {table} WHERE id IN ({marks})', ids)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted, True
+
+def archive_old_rows(db, settings, should_stop):
+    days = settings['MAINTENANCE_ARCHIVE_DAYS']
+    if days is None:
+        raise MaintenanceSkipped('MAINTENANCE_ARCHIVE_DAYS is not set')
+    create_archive_tables(db)
+
+    # Whole days only; created_at is indexed and starts with the local day
+    cutoff = local_day(days)
+    details = {'before': cutoff, 'finished': True}
+    for table, archive in ARCHIVE_TABLES.items():
+        columns = ', '.join(ARCHIVE_COLUMNS[table])
+
+        def copy(marks, ids):
+            db.execute(f'INSERT OR REPLACE INTO {archive} ({columns}) '
+                       f'SELECT {columns} FROM {table} WHERE id IN ({marks})', ids)
+
+        moved, finished = _delete_in_batches(
+            db, table, f'SELECT id FROM {table} WHERE created_at < ? ORDER BY created_at LIMIT ?',
+            (cutoff,), settings['MAINTENANCE_BATCH_SIZE'], should_stop, copy)
+        details[table] = moved
+        if not finished:
+            details['finished'] = False
+            break
+    return details
+
+def compact_user_info(db, settings, should_stop):
+    days = settings['MAINTENANCE_USER_INFO_KEEP_DAYS']
+    if days is None:
+        raise MaintenanceSkipped('MAINTENANCE_USER_INFO_KEEP_DAYS is not set')
+
+    # The highest id per user is the current profile (see user_profile.py)
+    cutoff = local_day(days)
+    deleted, finished = _delete_in_batches(
+        db, 'user_info', '''SELECT id FROM user_info AS old
+               WHERE created_at < ?
+                 AND EXISTS (SELECT 1 FROM user_info WHERE user_id = old.user_id AND id > old.id)
+               ORDER BY created_at LIMIT ?''',
+        (cutoff,), settings['MAINTENANCE_BATCH_SIZE'], should_stop)
+    return {'before': cutoff, 'deleted': deleted, 'finished': finished}
+
+def optimize(db, settings, should_stop):
+    # PRAGMA optimize only refreshes statistics that exist, so the first run
+    # gathers them all
+    analyzed = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone() is None
+    if analyzed:
+        db.execute('ANALYZE')
+    db.execute('PRAGMA analysis_limit = 1000')
+    db.execute('PRAGMA optimize').fetchall()
+    return {'full_analyze': analyzed}
+
+def incremental_vacuum(db, settings, should_stop):
+    mode = db.execute('PRAGMA auto_vacuum').fetchone()[0]
+    if mode != 2:
+        raise MaintenanceSkipped('auto_vacuum is not INCREMENTAL '
+                                 '(run python maintenance.py --enable-incremental-vacuum once)')
+    page_size = db.execute('PRAGMA page_size').fetchone()[0]
+    before = db.execute('PRAGMA freelist_count').fetchone()[0]
+    pages = max(int(settings['MAINTENANCE_VACUUM_PAGES']), 1)
+    after = before
+    # Each pragma step frees one page; executescript() runs it to completion
+    # where execute() stops after the first. Every call is its own write
+    # transaction, so a request only waits for one step.
+    while after and not should_stop():
+        db.executescript(f'PRAGMA incremental_vacuum({pages})')
+        after = db.execute('PRAGMA freelist_count').fetchone()[0]
+    return {'freed_pages': before - after, 'freed_bytes': (before - after) * page_size,
+            'free_pages': after, 'finished': not after}
+
+def checkpoint(db, settings, should_stop):
+    if db.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+        raise MaintenanceSkipped('the database is not in WAL mode')
+    mode = settings['MAINTENANCE_CHECKPOINT_MODE'].upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"MAINTENANCE_CHECKPOINT_MODE must be one of: {', '.join(CHECKPOINT_MODES)}")
+    wal = db.execute('PRAGMA database_list').fetchone()[2] + '-wal'
+    before = os.path.getsize(wal) if os.path.exists(wal) else 0
+    busy, wal_pages, checkpointed = db.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    return {'mode': mode, 'busy': bool(busy), 'wal_pages': wal_pages, 'checkpointed_pages': checkpointed,
+            'wal_bytes_before': before, 'wal_bytes': os.path.getsize(wal) if os.path.exists(wal) else 0}
+
+# Run order: free rows first so the vacuum and checkpoint see their pages
+TASKS = {
+    'archive': archive_old_rows,
+    'compact_user_info': compact_user_info,
+    'optimize': optimize,
+    'incremental_vacuum': incremental_vacuum,
+    'checkpoint': checkpoint
+}
+
+def settings_from_config(config):
+    settings = dict(DEFAULT_CONFIG)
+    settings.update({key: config[key] for key in DEFAULT_CONFIG if key in config})
+    return settings
+
+def run_maintenance(db, settings, tasks=None, should_stop=None):
+    # Runs the named tasks (all by default) in TASKS order and reports on each
+    should_stop = should_stop or (lambda: False)
+    names = [name for name in TASKS if tasks is None or name in tasks]
+    report = {'started_at': local_now(), 'tasks': []}
+    start = time.perf_counter()
+    for name in names:
+        entry = {'task': name}
+        if should_stop():
+            entry.update(status='skipped', reason='interrupted by a request')
+            report['tasks'].append(entry)
+            continue
+
+        task_start = time.perf_counter()
+        try:
+            entry.update(TASKS[name](db, settings, should_stop))
+            entry['status'] = 'ok'
+        except MaintenanceSkipped as e:
+            entry.update(status='skipped', reason=str(e))
+        except (sqlite3.Error, ValueError) as e:
+            logger.exception('Maintenance task %s failed', name)
+            entry.update(status='error', error=str(e))
+        entry['ms'] = round((time.perf_counter() - task_start) * 1000, 2)
+        report['tasks'].append(entry)
+    report['ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return report
+
+def format_report(report):
+    lines = [f"Maintenance run at {report['started_at']}: {report['ms']} ms"]
+    for entry in report['tasks']:
+        details = ', '.join(f'{key}={value}' for key, value in entry.items()
+                            if key not in ('task', 'status', 'ms'))
+        lines.append(f"  {entry['task']:<20} {entry['status']:<8} {entry.get('ms', 0):>10} ms  {details}")
+    return '\n'.join(lines)
+
+def enable_incremental_vacuum(db):
+    # Switching auto_vacuum on an existing file takes a full VACUUM
+    db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    db.execute('VACUUM')
+    return db.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+class MaintenanceScheduler:
+    def __init__(self, database, settings, interval=3600.0, idle_seconds=30.0, lock_path=None):
+        self.database = database
+        self.settings = settings
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.lock_path = lock_path or f'{database}-maintenance.lock'
+        self.report_path = os.path.splitext(self.lock_path)[0] + '.json'
+        self.pid = os.getpid()
+        self.last_touch = 0.0
+        self.next_run = time.monotonic() + interval
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+    def touch(self):
+        # Stamp the lock file at most once a second per worker
+        now = time.time()
+        if now - self.last_touch < 1.0:
+            return
+        self.last_touch = now
+        try:
+            os.utime(self.lock_path, (now, now))
+        except FileNotFoundError:
+            os.close(os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644))
+
+    def last_activity(self):
+        # Latest request seen by any worker; a missing lock file means none yet
+        try:
+            return os.stat(self.lock_path).st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def idle_for(self):
+        return time.time() - self.last_activity()
+
+    def idle(self):
+        return self.idle_for() >= self.idle_seconds
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='maintenance', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            wait = max(self.next_run - time.monotonic(), self.idle_seconds - self.idle_for())
+            if wait > 0:
+                time.sleep(min(wait, 60))
+                continue
+            try:
+                self.run(should_stop=lambda: not self.idle())
+            except Exception:
+                logger.exception('Maintenance run failed')
+            self.next_run = time.monotonic() + self.interval
+
+    def run(self, tasks=None, should_stop=None):
+        # Returns the report, or None when another thread or process is running
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        lock_fd = None
+        try:
+            if fcntl is not None:
+                lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+
+            db = connect(self.database, self.settings['SQLITE_BUSY_TIMEOUT_MS'])
+            try:
+                report = run_maintenance(db, self.settings, tasks, should_stop)
+            finally:
+                db.close()
+            self._save_report(report)
+            logger.info(format_report(report))
+            return report
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)
+            self._run_lock.release()
+
+    def _save_report(self, report):
+        # Written under the run lock and renamed into place, so readers never see half a file
+        tmp = f'{self.report_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(report, f)
+            os.replace(tmp, self.report_path)
+        except OSError:
+            logger.exception('Could not save the maintenance report to %s', self.report_path)
+
+    def last_report(self):
+        try:
+            with open(self.report_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+_scheduler_lock = threading.Lock()
+
+def get_maintenance(app):
+    # One scheduler per app and process; its thread starts with
+    # MAINTENANCE_ENABLED on the first request
+    scheduler = app.extensions.get('maintenance')
+    if scheduler is None or scheduler.pid != os.getpid():
+        with _scheduler_lock:
+            scheduler = app.extensions.get('maintenance')
+            if scheduler is None or scheduler.pid != os.getpid():
+                scheduler = MaintenanceScheduler(
+                    app.config['DATABASE'],
+                    settings_from_config(app.config),
+                    app.config.get('MAINTENANCE_INTERVAL', 3600.0),
+                    app.config.get('MAINTENANCE_IDLE_SECONDS', 30.0),
+                    app.config.get('MAINTENANCE_LOCK')
+                )
+                app.extensions['maintenance'] = scheduler
+    return scheduler
+
+def init_maintenance(app):
+    if not app.config.get('MAINTENANCE_ENABLED'):
+        return
+
+    @app.before_request
+    def record_activity():
+        scheduler = get_maintenance(app)
+        scheduler.touch()
+        scheduler.start()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run fitness.db maintenance tasks')
+    parser.add_argument('tasks', nargs='*', metavar='task',
+                        help=f"tasks to run (default: all of {', '.join(TASKS)})")
+    parser.add_argument('--database', default='fitness.db')
+    parser.add_argument('--archive-days', type=int, default=DEFAULT_CONFIG['MAINTENANCE_ARCHIVE_DAYS'])
+    parser.add_argument('--user-info-keep-days', type=int,
+                        default=DEFAULT_CONFIG['MAINTENANCE_USER_INFO_KEEP_DAYS'])
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_CONFIG['MAINTENANCE_BATCH_SIZE'])
+    parser.add_argument('--checkpoint-mode', choices=CHECKPOINT_MODES,
+                        help='default: TRUNCATE, or PASSIVE with --loop next to a running app')
+    parser.add_argument('--loop', action='store_true', help='keep running every --interval seconds')
+    parser.add_argument('--interval', type=float, default=3600.0)
+    parser.add_argument('--json', action='store_true', help='print reports as JSON')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='switch the file to auto_vacuum = INCREMENTAL with a full VACUUM, then exit')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.tasks if name not in TASKS]
+    if unknown:
+        parser.error(f"Unknown task: {', '.join(unknown)}")
+
+    if args.enable_incremental_vacuum:
+        db = connect(args.database)
+        try:
+            enabled = enable_incremental_vacuum(db)
+        finally:
+            db.close()
+        print('auto_vacuum is INCREMENTAL' if enabled else 'Could not enable incremental vacuum')
+        return
+
+    settings = settings_from_config({
+        'MAINTENANCE_ARCHIVE_DAYS': args.archive_days,
+        'MAINTENANCE_USER_INFO_KEEP_DAYS': args.user_info_keep_days,
+        'MAINTENANCE_BATCH_SIZE': args.batch_size,
+        'MAINTENANCE_CHECKPOINT_MODE': args.checkpoint_mode or ('PASSIVE' if args.loop else 'TRUNCATE')
+    })
+    # Shares the app's lock file, so it never overlaps an in-process run
+    scheduler = MaintenanceScheduler(args.database, settings, args.interval, idle_seconds=0)
+    while True:
+        report = scheduler.run(args.tasks or None)
+        if report is None:
+            print('Another maintenance run holds the lock')
+        else:
+            print(json.dumps(report, indent=2) if args.json else format_report(report), flush=True)
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+# Prometheus metrics for Health and Fitness Tracker
+#
+# Metrics(blueprint) hooks into every request handled by the app and serves
+# GET /metrics in the Prometheus text format: request counts and latency
+# histograms per route, time spent in SQL per request, in-flight requests,
+# connection pool usage, group commits and rows written by the logging
+# routes.
+#
+# Each thread updates its own shard of counters, so recording never takes a
+# lock; a scrape sums the shards. Shards of finished threads are folded into
+# one retired shard whenever a new thread registers or a scrape runs, so
+# short-lived threads don't pile up between scrapes.
+# With METRICS_DIR set (serve.py sets it for multi-worker runs), every
+# process also writes its totals to METRICS_DIR/metrics-<pid>.json every
+# METRICS_FLUSH_INTERVAL seconds and /metrics adds up the files of all
+# workers. Counters of exited workers are kept; their gauges are not.
+
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from flask import current_app, g, request
+from auth import require_admin
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by route, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency until the response is returned, by route.'),
+    'http_requests_in_flight': ('gauge', 'Requests currently being handled.'),
+    'db_request_duration_seconds': ('histogram', 'Time spent in SQL statements per request, by route.'),
+    'db_queries_total': ('counter', 'SQL statements run, by route.'),
+    'rows_written_total': ('counter', 'Rows inserted by the logging routes, by table.'),
+    'db_pool_connections': ('gauge', 'Pooled SQLite connections, by state.'),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.'),
+    'db_pool_timeouts_total': ('counter', 'Checkouts that timed out waiting for a connection.'),
+    'group_commit_transactions_total': ('counter', 'Transactions committed by the group-commit writer.'),
+    'group_commit_writes_total': ('counter', 'Writes committed by the group-commit writer.'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class _Shard:
+    # Counters owned by one thread; only that thread writes to them
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def merge(self, counters, histograms):
+        # dict() and list() copies are atomic under the GIL
+        for key, value in dict(counters).items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in dict(histograms).items():
+            values = list(values)
+            current = self.histograms.get(key)
+            if current is None:
+                self.histograms[key] = values
+            else:
+                for i, value in enumerate(values):
+                    current[i] += value
+
+class Metrics:
+    def __init__(self, blueprint=None):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._reset()
+        if blueprint is not None:
+            self.register(blueprint)
+
+    def _reset(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._pid = os.getpid()
+        self._flusher = None
+
+    def register(self, blueprint):
+        blueprint.before_app_request(self._before_request)
+        blueprint.after_app_request(self._after_request)
+        blueprint.teardown_app_request(self._teardown_request)
+        blueprint.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+    # Recording
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            if self._pid != os.getpid():
+                # Forked worker: start from zero rather than the parent's counts
+                with self._lock:
+                    if self._pid != os.getpid():
+                        self._reset()
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._retire_dead()
+                self._shards.append(shard)
+        return shard
+
+    def _retire_dead(self):
+        # Caller holds self._lock; a dead thread's shard no longer changes
+        live = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                self._retired.merge(shard.counters, shard.histograms)
+        self._shards = live
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(BUCKETS) + 3)
+        values[bisect.bisect_left(BUCKETS, seconds)] += 1
+        values[-2] += seconds
+        values[-1] += 1
+
+    def count_rows(self, table, count=1):
+        self.inc('rows_written_total', (('table', table),), count)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        self.inc('http_requests_in_flight')
+        if self._flusher is None and current_app.config.get('METRICS_DIR'):
+            self._start_flusher(current_app._get_current_object())
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is not None:
+            route = request.endpoint or 'unmatched'
+            self.inc('http_requests_total', (
+                ('route', route), ('method', request.method), ('status', str(response.status_code))))
+            self.observe('http_request_duration_seconds', (('route', route),), time.perf_counter() - started)
+            queries = g.get('sql_queries')
+            if queries is not None and queries.count:
+                self.inc('db_queries_total', (('route', route),), queries.count)
+                self.observe('db_request_duration_seconds', (('route', route),), queries.seconds)
+        return response
+
+    def _teardown_request(self, error):
+        if g.pop('metrics_started', None) is not None:
+            self.inc('http_requests_in_flight', value=-1)
+
+    # Collection
+
+    def process_totals(self, app):
+        # This process's counters and histograms, plus its gauges
+        totals = _Shard()
+        with self._lock:
+            self._retire_dead()
+            live = self._shards
+            totals.merge(self._retired.counters, self._retired.histograms)
+        for shard in live:
+            totals.merge(shard.counters, shard.histograms)
+
+        gauges = {}
+        in_flight = totals.counters.pop(('http_requests_in_flight', ()), 0)
+        gauges[('http_requests_in_flight', ())] = in_flight
+        pool = get_pool(app).stats()
+        for state in ('in_use', 'idle'):
+            gauges[('db_pool_connections', (('state', state),))] = pool[state]
+        totals.counters[('db_pool_checkouts_total', ())] = pool['checkouts']
+        totals.counters[('db_pool_timeouts_total', ())] = pool['timeouts']
+        writer = app.extensions.get('group_commit')
+        if writer is not None and writer.pid == os.getpid():
+            committed = writer.stats()
+            totals.counters[('group_commit_transactions_total', ())] = committed['batches']
+            totals.counters[('group_commit_writes_total', ())] = committed['writes']
+        return totals, gauges
+
+    def _snapshot(self, app):
+        totals, gauges = self.process_totals(app)
+        return {
+            'pid': os.getpid(),
+            'counters': [[name, labels, value] for (name, labels), value in totals.counters.items()],
+            'histograms': [[name, labels, values] for (name, labels), values in totals.histograms.items()],
+            'gauges': [[name, labels, value] for (name, labels), value in gauges.items()]
+        }
+
+    def _flush(self, app, directory):
+        # The flusher thread and scrapes both write; the lock keeps an older
+        # snapshot from replacing a newer one and each write gets its own temp file
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        with self._flush_lock:
+            fd, temp = tempfile.mkstemp(dir=directory, prefix=f'metrics-{os.getpid()}.json.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self._snapshot(app), f)
+                os.replace(temp, path)
+            except BaseException:
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+                raise
+
+    def _start_flusher(self, app):
+        directory = app.config['METRICS_DIR']
+        with self._lock:
+            if self._flusher is not None:
+                return
+            os.makedirs(directory, exist_ok=True)
+            interval = app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+
+            def flush_forever():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self._flush(app, directory)
+                    except Exception:
+                        # A full disk or a removed directory must not end the flusher
+                        logger.exception('Could not write metrics to %s', directory)
+
+            self._flusher = threading.Thread(target=flush_forever, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def collect(self, app):
+        # Totals over every worker sharing METRICS_DIR, or this process alone
+        directory = app.config.get('METRICS_DIR')
+        if not directory:
+            totals, gauges = self.process_totals(app)
+            return totals.counters, totals.histograms, gauges
+
+        self._flush(app, directory)
+        totals = _Shard()
+        gauges = {}
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            totals.merge(
+                {(name, _labels(labels)): value for name, labels, value in snapshot['counters']},
+                {(name, _labels(labels)): values for name, labels, values in snapshot['histograms']})
+            if _alive(snapshot['pid']):
+                for name, labels, value in snapshot['gauges']:
+                    key = (name, _labels(labels))
+                    gauges[key] = gauges.get(key, 0) + value
+        return totals.counters, totals.histograms, gauges
+
+    def _metrics_view(self):
+        require_admin()
+        counters, histograms, gauges = self.collect(current_app)
+        return current_app.response_class(exposition(counters, histograms, gauges), content_type=CONTENT_TYPE)
+
+def _labels(pairs):
+    return tuple(tuple(pair) for pair in pairs)
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def exposition(counters, histograms, gauges):
+    # Prometheus text format 0.0.4
+    samples = {}
+    for (name, labels), value in sorted(list(counters.items()) + list(gauges.items())):
+        samples.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), values in sorted(histograms.items()):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values[:-2]):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {_format_value(cumulative)}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-2])}')
+        lines.append(f'{name}_count{_format_labels(labels)} {_format_value(values[-1])}')
+
+    output = []
+    for name, (kind, description) in METRICS.items():
+        if name in samples:
+            output.append(f'# HELP {name} {description}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(samples[name])
+    return '\n'.join(output) + '\n'
+
+def clear_metrics_dir(directory):
+    # Called once before workers start so counts from an earlier run are dropped
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json*')):
+        os.remove(path)
@@ -0,0 +1,135 @@
+# Schema migrations for existing fitness.db files
+#
+# schema.sql always describes the latest schema and stamps PRAGMA user_version.
+# Databases created by an older schema.sql are brought forward one step at a
+# time; each step runs inside a single transaction.
+
+from daily_totals import CREATE_DAILY_TOTALS, rebuild_daily_totals
+from maintenance import create_archive_tables
+from weight_history import rebuild_weight_summary
+
+def _add_daily_totals(db):
+    # Filled by a later step once rows carry day and user columns
+    db.execute(CREATE_DAILY_TOTALS)
+
+def _add_day_columns(db):
+    # Store the local day next to created_at so day filters can use an index
+    for table in ('workouts', 'foods'):
+        columns = [row[1] for row in db.execute(f'PRAGMA table_info({table})')]
+        if 'day' not in columns:
+            db.execute(f'ALTER TABLE {table} ADD COLUMN day DATE')
+        db.execute(f'UPDATE {table} SET day = date(created_at) WHERE day IS NULL')
+        db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_day ON {table} (day, created_at)')
+        db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table} (created_at)')
+
+def _index_user_info(db):
+    db.execute('CREATE INDEX IF NOT EXISTS idx_user_info_created_at ON user_info (created_at)')
+
+def _add_users(db):
+    # Key every table by user; existing rows belong to the default user
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL DEFAULT '',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.execute("INSERT OR IGNORE INTO users (id, username) VALUES (1, 'default')")
+
+    for table in ('workouts', 'foods', 'user_info', 'weight_history'):
+        columns = [row[1] for row in db.execute(f'PRAGMA table_info({table})')]
+        if 'user_id' not in columns:
+            db.execute(f'ALTER TABLE {table} ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1')
+
+    for table in ('workouts', 'foods'):
+        db.execute(f'DROP INDEX IF EXISTS idx_{table}_day')
+        db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_user_day ON {table} (user_id, day, created_at)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_user_info_user ON user_info (user_id)')
+
+    # The rollup's key changes from day to (user_id, day)
+    db.execute('DROP TABLE IF EXISTS daily_totals')
+    rebuild_daily_totals(db)
+
+def _add_weight_summary(db):
+    db.execute('CREATE INDEX IF NOT EXISTS idx_weight_history_user_date ON weight_history (user_id, date)')
+    rebuild_weight_summary(db)
+
+def _add_archive_tables(db):
+    # Old workouts and foods rows move here (see maintenance.py)
+    create_archive_tables(db)
+
+# workouts and foods as schema.sql declares them; ALTER TABLE cannot add the
+# NOT NULL day column or the user_id reference, so the tables are rebuilt
+REBUILT_TABLES = {
+    'workouts': ('''
+        CREATE TABLE workouts_rebuilt (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL DEFAULT 1 REFERENCES users (id),
+            type TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            calories_burned INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            day DATE NOT NULL DEFAULT (date('now', 'localtime'))
+        )
+    ''', ('id', 'user_id', 'type', 'duration', 'calories_burned', 'created_at')),
+    'foods': ('''
+        CREATE TABLE foods_rebuilt (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL DEFAULT 1 REFERENCES users (id),
+            description TEXT NOT NULL,
+            calories INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            day DATE NOT NULL DEFAULT (date('now', 'localtime'))
+        )
+    ''', ('id', 'user_id', 'description', 'calories', 'created_at')),
+}
+
+def _rebuild_day_not_null(db):
+    # Migrated tables got a nullable day from ALTER TABLE; match schema.sql
+    for table, (create, columns) in REBUILT_TABLES.items():
+        day = [row for row in db.execute(f'PRAGMA table_info({table})') if row[1] == 'day']
+        if day and day[0][3]:
+            continue
+        sequence = db.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+        names = ', '.join(columns)
+        db.execute(create)
+        db.execute(f'''
+            INSERT INTO {table}_rebuilt ({names}, day)
+            SELECT {names}, COALESCE(day, date(created_at), date('now', 'localtime')) FROM {table}
+        ''')
+        db.execute(f'DROP TABLE {table}')
+        db.execute(f'ALTER TABLE {table}_rebuilt RENAME TO {table}')
+        # Keep AUTOINCREMENT from reissuing ids of rows deleted before the copy
+        if sequence is not None:
+            db.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+        db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_user_day ON {table} (user_id, day, created_at)')
+        db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table} (created_at)')
+
+MIGRATIONS = [
+    _add_daily_totals,
+    _add_day_columns,
+    _index_user_info,
+    _add_users,
+    _add_weight_summary,
+    _add_archive_tables,
+    _rebuild_day_not_null,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(db):
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    applied = []
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        step = MIGRATIONS[target - 1]
+        try:
+            db.execute('BEGIN')
+            step(db)
+            db.execute(f'PRAGMA user_version = {target}')
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append(step.__name__.lstrip('_'))
+    return applied
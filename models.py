@@ -1,4 +1,7 @@
 # Database models for Health and Fitness Tracker
+#
+# Not imported by the app, which uses sqlite3 directly (see schema.sql);
+# needs Flask-SQLAlchemy from requirements-optional.txt.
 
 from flask_sqlalchemy import SQLAlchemy
 
@@ -0,0 +1,200 @@
+# Food calorie matching for Health and Fitness Tracker
+#
+# The nutrition table (name, calories per serving) is loaded from a CSV or
+# SQLite file on first use and compiled into a token trie. Matching a
+# description walks the trie from each word, so the cost depends on the
+# description's length and not on how many foods the table holds. The
+# longest food name wins ("chicken salad" over "chicken"), every item in the
+# description is counted ("2 eggs and rice"), and a number or number word
+# before an item multiplies it. A number with a weight or volume unit
+# ("100g rice", "250 ml milk", "2 cups of rice") is converted to servings
+# using the table's optional grams column (SERVING_GRAMS when it has none),
+# and no item counts for more than MAX_SERVINGS servings.
+
+import csv
+import os
+import re
+import sqlite3
+import threading
+
+DEFAULT_CALORIES = 200  # Used when nothing in the description matches
+
+# Fallback table when no nutrition file is available
+COMMON_FOODS = {
+    'Apple': 95,
+    'Banana': 105,
+    'Orange': 62,
+    'Sandwich': 300,
+    'Salad': 100,
+    'Rice': 200,
+    'Chicken': 335,
+    'Fish': 206,
+    'Egg': 78
+}
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11,
+    'twelve': 12, 'half': 0.5, 'couple': 2, 'dozen': 12
+}
+
+SEPARATORS = {',', '&', '+', 'and', 'with', 'plus'}
+
+# Weight and volume units in grams (a millilitre is taken as a gram);
+# names are in singular() form
+UNIT_GRAMS = {
+    'mg': 0.001, 'g': 1, 'gr': 1, 'gram': 1, 'gramme': 1, 'kg': 1000, 'kilo': 1000, 'kilogram': 1000,
+    'oz': 28.35, 'ounce': 28.35, 'lb': 453.6, 'pound': 453.6,
+    'ml': 1, 'milliliter': 1, 'millilitre': 1, 'cl': 10, 'dl': 100,
+    'l': 1000, 'liter': 1000, 'litre': 1000,
+    'tsp': 5, 'teaspoon': 5, 'tbsp': 15, 'tablespoon': 15, 'cup': 240, 'pint': 473
+}
+
+SERVING_GRAMS = 100  # Serving size of table entries without a grams column
+MAX_SERVINGS = 20    # Larger counts are misread amounts ("500 rice")
+
+TOKEN_RE = re.compile(r"\d+(?:[./]\d+)?|[a-z]+(?:'[a-z]+)?|[,&+]")
+
+_END = None  # Trie key holding the calories of a complete food name
+
+def singular(word):
+    # Crude but consistent: patterns and descriptions go through the same rule
+    if len(word) > 3 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith(('oes', 'ches', 'shes', 'xes', 'sses')):
+        return word[:-2]
+    if len(word) > 2 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    return [singular(token) for token in TOKEN_RE.findall(text.lower())]
+
+def servings(quantity, unit=None, serving_grams=None):
+    # Servings of a food for "<quantity> [unit]"
+    if unit is not None:
+        quantity = quantity * UNIT_GRAMS[unit] / (serving_grams or SERVING_GRAMS)
+    return min(quantity, MAX_SERVINGS)
+
+def parse_quantity(token):
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    try:
+        if '/' in token:
+            numerator, denominator = token.split('/')
+            return int(numerator) / int(denominator)
+        return float(token)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+class FoodMatcher:
+    def __init__(self, foods):
+        self.size = 0
+        self._trie = {}
+        for food in foods:
+            self.add(*food)
+
+    def add(self, name, calories, grams=None):
+        tokens = tokenize(name)
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if _END not in node:
+            self.size += 1
+        node[_END] = (float(calories), float(grams) if grams else None)
+
+    def match(self, description):
+        # Returns (food tokens, servings, calories per serving, grams per
+        # serving or None) for each item
+        tokens = tokenize(description)
+        matches = []
+        i = 0
+        last_end = 0
+        while i < len(tokens):
+            node = self._trie
+            longest = None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if _END in node:
+                    longest = (j, node[_END])
+            if longest is None:
+                i += 1
+                continue
+
+            end, (calories, grams) = longest
+            matches.append((' '.join(tokens[i:end]), self._quantity(tokens, last_end, i, grams), calories, grams))
+            last_end = i = end
+        return matches
+
+    def _quantity(self, tokens, start, end, grams):
+        # Nearest quantity before the food, within the same item, scaled by
+        # the unit nearest the food ("200 g of chicken"); an article only
+        # counts when nothing stronger precedes it ("half a cup of rice")
+        unit = None
+        for k in range(end - 1, start - 1, -1):
+            if tokens[k] in SEPARATORS:
+                break
+            if tokens[k] in ('a', 'an'):
+                continue
+            if unit is None and tokens[k] in UNIT_GRAMS:
+                unit = tokens[k]
+                continue
+            quantity = parse_quantity(tokens[k])
+            if quantity is not None:
+                return servings(quantity, unit, grams)
+        return servings(1, unit, grams)
+
+    def calories(self, description, default=DEFAULT_CALORIES):
+        matches = self.match(description)
+        if not matches:
+            return default
+        return round(sum(quantity * calories for _, quantity, calories, _ in matches))
+
+def load_foods(path):
+    # CSV files need name and calories columns; SQLite files a nutrition table.
+    # An optional grams column gives the weight of one serving.
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('name') and row.get('calories'):
+                    yield row['name'], float(row['calories']), float(row['grams']) if row.get('grams') else None
+    else:
+        connection = sqlite3.connect(path)
+        try:
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(nutrition)')]
+            grams = 'grams' if 'grams' in columns else 'NULL'
+            yield from connection.execute(f'SELECT name, calories, {grams} FROM nutrition')
+        finally:
+            connection.close()
+
+_matcher = None
+_matcher_path = None
+_matcher_lock = threading.Lock()
+
+def load_matcher(path=None):
+    # Compile the nutrition table and make it the process-wide matcher
+    global _matcher
+    if path and os.path.exists(path):
+        matcher = FoodMatcher(load_foods(path))
+    else:
+        matcher = FoodMatcher(COMMON_FOODS.items())
+    _matcher = matcher
+    return matcher
+
+def set_matcher_path(path):
+    # The table is compiled by the first get_matcher() call
+    global _matcher, _matcher_path
+    with _matcher_lock:
+        _matcher_path = path
+        _matcher = None
+
+def get_matcher():
+    matcher = _matcher
+    if matcher is None:
+        with _matcher_lock:
+            matcher = _matcher or load_matcher(_matcher_path)
+    return matcher
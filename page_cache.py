@@ -0,0 +1,76 @@
+# Server-rendered dashboard pages for Health and Fitness Tracker
+#
+# GET / renders today's lists, summary and weekly averages into index.html
+# and embeds the /get_data payload as an inline JSON blob, so the first
+# paint needs no /get_data round trip; scripts.js hydrates from the blob.
+# Rendered pages are kept in a per-process LRU keyed by the user's data
+# version ETag (data_version.py). Every write bumps the version and the key
+# includes the local day, so a cached page is never served stale, and
+# repeated loads of an unchanged dashboard skip SQLite and Jinja entirely.
+# Each page also keeps its gzip and brotli bodies once a client has asked
+# for them, so a hit is not compressed again; they are evicted with it.
+
+import os
+import threading
+from collections import OrderedDict
+
+_cache_lock = threading.Lock()
+
+class PageCache:
+    def __init__(self, size=256):
+        self.size = size
+        self.pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()  # etag -> {None: rendered page, encoding: compressed page}
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            variants = self._pages.get(etag)
+            if variants is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(etag)
+            self.hits += 1
+            return variants[None]
+
+    def put(self, etag, page):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._pages[etag] = {None: page}
+            self._pages.move_to_end(etag)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+
+    def get_encoded(self, etag, encoding):
+        with self._lock:
+            variants = self._pages.get(etag)
+            return variants.get(encoding) if variants is not None else None
+
+    def put_encoded(self, etag, encoding, data):
+        # Only alongside a cached page; an evicted page drops its variants
+        with self._lock:
+            variants = self._pages.get(etag)
+            if variants is not None:
+                variants[encoding] = data
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'pages': len(self._pages), 'hits': self.hits, 'misses': self.misses}
+
+def get_page_cache(app):
+    # One cache per app and process; forked workers start empty
+    cache = app.extensions.get('page_cache')
+    if cache is None or cache.pid != os.getpid():
+        with _cache_lock:
+            cache = app.extensions.get('page_cache')
+            if cache is None or cache.pid != os.getpid():
+                cache = PageCache(app.config.get('PAGE_CACHE_SIZE', 256))
+                app.extensions['page_cache'] = cache
+    return cache
@@ -1,86 +1,194 @@
-from flask import Blueprint, render_template, request, jsonify, g
-import sqlite3
-from datetime import datetime, timedelta
+import logging
+import time
+from datetime import date
+from flask import Blueprint, Response, render_template, request, g, current_app, session
+from json_response import jsonify, script_json, shape_rows
+from auth import AuthError, authenticate, create_user, current_user_id, require_admin
+from daily_totals import adjust_daily_totals, adjust_daily_totals_many, local_day, local_now, parse_local_timestamp
+from dashboard import DashboardSnapshot, build_delta, get_latest_user_info
+from db_pool import get_pool
+from compression import choose_encoding, compress
+from write_queue import get_writer
+from data_version import bump_data_version, conditional, get_data_version, make_etag
+from events import HIJACK_KEY, get_broker, get_event_hub
+from maintenance import TASKS as MAINTENANCE_TASKS, get_maintenance
+from page_cache import get_page_cache
+from user_profile import get_current_profile, save_profile
+from nutrition import get_matcher
+from food_parser import get_food_parser
+from metrics import Metrics
+from sql_stats import InstrumentedConnection, RequestQueries, get_sql_stats, server_timing
+from weight_history import add_weight_record, get_weight_summary, load_weight_history, weight_progress
 
 routes = Blueprint('routes', __name__)
-DATABASE = 'fitness.db'
+
+# Request, SQL and pool metrics at /metrics
+metrics = Metrics(routes)
+
+logger = logging.getLogger(__name__)
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        db = get_pool(current_app).checkout()
+        queries = g.get('sql_queries')
+        # Count and time every statement (see sql_stats.py)
+        g.db = InstrumentedConnection(db, queries) if queries is not None else db
     return g.db
 
 @routes.teardown_app_request
 def close_db(error):
     db = g.pop('db', None)
+    if isinstance(db, InstrumentedConnection):
+        db = db.connection
     if db is not None:
-        db.close()
+        get_pool(current_app).checkin(db)
+
+@routes.before_app_request
+def start_timing():
+    g.request_started = time.perf_counter()
+    if current_app.config.get('SQL_STATS_ENABLED', True):
+        g.sql_queries = RequestQueries(current_app.config.get('SQL_SLOW_QUERY_MS', 100))
+
+@routes.after_app_request
+def record_timing(response):
+    queries = g.get('sql_queries')
+    if queries is not None:
+        elapsed = time.perf_counter() - g.request_started
+        response.headers['Server-Timing'] = server_timing(queries, elapsed)
+        get_sql_stats(current_app).record(request.endpoint or 'unmatched', queries, elapsed)
+    return response
+
+def run_write(write):
+    # Runs write(db) in a committed transaction and returns its result: batched
+    # with other requests' writes by the group-commit writer (see
+    # write_queue.py) or on this request's connection
+    writer = get_writer(current_app)
+    if writer is not None:
+        return writer.submit(write, g.get('sql_queries')).result()
+    
+    db = get_db()
+    try:
+        result = write(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+def publish_change(db, user_id, kind, op, row, day):
+    # Call after commit: bump the user's data version and push the delta to /events
+    version = bump_data_version(user_id)
+    delta = build_delta(db, user_id, kind, op, row, day, version)
+    get_broker(current_app).publish(user_id, delta, version)
+    return delta
+
+def change_response(db, user_id, delta):
+    # Mutations answer with the compact delta; full=1 adds the whole dashboard
+    payload = {'success': True, 'version': delta['version'], 'delta': delta}
+    if request.values.get('full', '').lower() in ('1', 'true', 'yes'):
+        key = 'workouts' if delta['type'] == 'workout' else 'foods'
+        snapshot = DashboardSnapshot.build(db, user_id, workouts=key == 'workouts', foods=key == 'foods')
+        payload[key] = getattr(snapshot, key)
+        payload['daily_summary'] = snapshot.daily_summary
+        payload['stats'] = snapshot.stats
+    return jsonify(payload)
 
 @routes.route('/')
 def home():
-    return render_template('index.html')
+    # The dashboard is rendered with the page (see page_cache.py); without a
+    # user to render it for, scripts.js fetches /get_data as before
+    if not current_app.config.get('DASHBOARD_PRERENDER', True) or \
+            ('user_id' not in session and not current_app.config.get('ALLOW_ANONYMOUS', True)):
+        return render_template('index.html', dashboard=None)
+    
+    user_id = current_user_id()
+    # Read before the snapshot: a write that lands in between bumps the
+    # version after committing, so the page is never cached under a newer key
+    version, _ = get_data_version(current_app).current(user_id)
+    etag = make_etag(user_id, version)
+    cache = get_page_cache(current_app)
+    page = cache.get(etag)
+    if page is None:
+        try:
+            snapshot = DashboardSnapshot.build(get_db(), user_id)
+        except Exception:
+            logger.exception('Could not pre-render the dashboard')
+            return render_template('index.html', dashboard=None)
+        
+        dashboard = {
+            'success': True,
+            'version': version,
+            'workouts': snapshot.workouts,
+            'foods': snapshot.foods,
+            'daily_summary': snapshot.daily_summary,
+            'stats': snapshot.stats,
+            'user_info': snapshot.user_info
+        }
+        page = render_template('index.html', dashboard=dashboard,
+                               dashboard_json=script_json(dashboard, current_app)).encode()
+        cache.put(etag, page)
+    
+    # Compressed here rather than by compress_response, so hits reuse the cached body
+    encoding = choose_encoding(page)
+    body = page
+    if encoding is not None:
+        body = cache.get_encoded(etag, encoding)
+        if body is None:
+            body = compress(page, encoding)
+            cache.put_encoded(etag, encoding, body)
+    response = current_app.make_response(body)
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@routes.route('/register', methods=['POST'])
+def register():
+    data = request.get_json(silent=True) or request.form
+    try:
+        user_id = create_user(get_db(), data.get('username'), data.get('password'))
+    except AuthError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    session.clear()
+    session['user_id'] = user_id
+    return jsonify({'success': True, 'user_id': user_id})
+
+@routes.route('/login', methods=['POST'])
+def login():
+    data = request.get_json(silent=True) or request.form
+    try:
+        user_id = authenticate(get_db(), data.get('username'), data.get('password'))
+    except AuthError as e:
+        return jsonify({'success': False, 'error': str(e)}), 401
+
+    session.clear()
+    session['user_id'] = user_id
+    return jsonify({'success': True, 'user_id': user_id})
+
+@routes.route('/logout', methods=['POST'])
+def logout():
+    session.clear()
+    return jsonify({'success': True})
 
 @routes.route('/home_data')
+@conditional
 def home_data():
     try:
-        db = get_db()
-        workouts = get_todays_workouts(db)
-        foods = get_todays_foods(db)
-        daily_summary = calculate_daily_summary(db)
-        weekly_data = get_weekly_data(db)
-        stats = calculate_stats(db)
+        snapshot = DashboardSnapshot.build(get_db(), current_user_id())
         
-        return jsonify({
+        return jsonify(shape_rows({
             'success': True,
-            'workouts': workouts,
-            'foods': foods,
-            'daily_summary': daily_summary,
-            'weekly_data': weekly_data,
-            'stats': stats
-        })
+            'workouts': snapshot.workouts,
+            'foods': snapshot.foods,
+            'daily_summary': snapshot.daily_summary,
+            'weekly_data': snapshot.weekly_data,
+            'stats': snapshot.stats
+        }, 'workouts', 'foods'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def get_todays_workouts(db):
-    cursor = db.cursor()
-    cursor.execute('''
-        SELECT id, type, duration, calories_burned, created_at 
-        FROM workouts 
-        WHERE date(created_at, 'localtime') = date('now', 'localtime')
-        ORDER BY created_at DESC
-    ''')
-    
-    workouts = []
-    for row in cursor.fetchall():
-        workouts.append({
-            'id': row[0],
-            'type': row[1],
-            'duration': row[2],
-            'calories_burned': row[3],
-            'created_at': row[4]
-        })
-    return workouts
-
-def get_todays_foods(db):
-    cursor = db.cursor()
-    cursor.execute('''
-        SELECT id, description, calories, created_at 
-        FROM foods 
-        WHERE date(created_at, 'localtime') = date('now', 'localtime')
-        ORDER BY created_at DESC
-    ''')
-    
-    foods = []
-    for row in cursor.fetchall():
-        foods.append({
-            'id': row[0],
-            'description': row[1],
-            'calories': row[2],
-            'created_at': row[3]
-        })
-    return foods
-
 @routes.route('/log_workout', methods=['POST'])
 def log_workout():
     workout_type = request.form.get('type')
@@ -95,28 +203,31 @@ def log_workout():
     
     calories_burned = calculate_calories_burned(workout_type, duration)
     
-    db = get_db()
-    cursor = db.cursor()
+    user_id = current_user_id()
+    created_at = local_now()
+    
+    def write(db):
+        cursor = db.execute('''
+            INSERT INTO workouts (user_id, type, duration, calories_burned, created_at, day)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, workout_type, duration, calories_burned, created_at, created_at[:10]))
+        adjust_daily_totals(db, user_id, created_at[:10], burned=calories_burned, workouts=1)
+        return cursor.lastrowid
+    
     try:
-        cursor.execute('''
-            INSERT INTO workouts (type, duration, calories_burned, created_at)
-            VALUES (?, ?, ?, datetime('now', 'localtime'))
-        ''', (workout_type, duration, calories_burned))
-        db.commit()
-        
-        # Get updated data
-        workouts = get_todays_workouts(db)
-        daily_summary = calculate_daily_summary(db)
-        stats = calculate_stats(db)
+        workout_id = run_write(write)
+        metrics.count_rows('workouts')
+        db = get_db()
+        delta = publish_change(db, user_id, 'workout', 'upsert', {
+            'id': workout_id,
+            'type': workout_type,
+            'duration': duration,
+            'calories_burned': calories_burned,
+            'created_at': created_at
+        }, created_at[:10])
         
-        return jsonify({
-            'success': True,
-            'workouts': workouts,
-            'daily_summary': daily_summary,
-            'stats': stats
-        })
+        return change_response(db, user_id, delta)
     except Exception as e:
-        db.rollback()
         return jsonify({'error': str(e)}), 500
 
 @routes.route('/log_food', methods=['POST'])
@@ -128,269 +239,247 @@ def log_food():
     
     calories = calculate_food_calories(description)
     
+    user_id = current_user_id()
+    created_at = local_now()
+    
+    def write(db):
+        cursor = db.execute('''
+            INSERT INTO foods (user_id, description, calories, created_at, day)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, description, calories, created_at, created_at[:10]))
+        adjust_daily_totals(db, user_id, created_at[:10], consumed=calories, foods=1)
+        return cursor.lastrowid
+    
+    try:
+        food_id = run_write(write)
+        metrics.count_rows('foods')
+        db = get_db()
+        delta = publish_change(db, user_id, 'food', 'upsert', {
+            'id': food_id,
+            'description': description,
+            'calories': calories,
+            'created_at': created_at
+        }, created_at[:10])
+        
+        return change_response(db, user_id, delta)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@routes.route('/log_batch', methods=['POST'])
+def log_batch():
+    payload = request.get_json(silent=True)
+    entries = payload.get('entries') if isinstance(payload, dict) else payload
+    
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'success': False, 'error': 'Expected a JSON array of entries'}), 400
+    
+    max_items = current_app.config.get('BATCH_MAX_ITEMS', 50000)
+    if len(entries) > max_items:
+        return jsonify({'success': False, 'error': f'Too many entries (limit {max_items})'}), 413
+    
+    # Validate everything before writing anything
+    user_id = current_user_id()
+    foods = []
+    workouts = []
+    changes = {}
+    for index, entry in enumerate(entries):
+        try:
+            row = parse_batch_entry(user_id, entry)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Entry {index}: {e}'}), 400
+        
+        day = row[-1]
+        delta = changes.setdefault(day, [0, 0, 0, 0])
+        if len(row) == 5:
+            foods.append(row)
+            delta[0] += row[2]
+            delta[2] += 1
+        else:
+            workouts.append(row)
+            delta[1] += row[3]
+            delta[3] += 1
+    
     db = get_db()
-    cursor = db.cursor()
     try:
-        cursor.execute('''
-            INSERT INTO foods (description, calories, created_at)
-            VALUES (?, ?, datetime('now', 'localtime'))
-        ''', (description, calories))
+        db.executemany('''
+            INSERT INTO foods (user_id, description, calories, created_at, day)
+            VALUES (?, ?, ?, ?, ?)
+        ''', foods)
+        db.executemany('''
+            INSERT INTO workouts (user_id, type, duration, calories_burned, created_at, day)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', workouts)
+        adjust_daily_totals_many(db, user_id, changes)
         db.commit()
+        metrics.count_rows('foods', len(foods))
+        metrics.count_rows('workouts', len(workouts))
+        
+        # Too many rows for a delta; subscribers refetch instead
+        version = bump_data_version(user_id)
+        get_broker(current_app).publish(user_id, {'type': 'resync', 'version': version}, version)
         
-        # Get updated data
-        foods = get_todays_foods(db)
-        daily_summary = calculate_daily_summary(db)
-        stats = calculate_stats(db)
+        # One dashboard refresh for the whole batch
+        snapshot = DashboardSnapshot.build(db, user_id)
         
         return jsonify({
             'success': True,
-            'foods': foods,
-            'daily_summary': daily_summary,
-            'stats': stats
+            'inserted': {'foods': len(foods), 'workouts': len(workouts)},
+            'workouts': snapshot.workouts,
+            'foods': snapshot.foods,
+            'daily_summary': snapshot.daily_summary,
+            'stats': snapshot.stats
         })
     except Exception as e:
         db.rollback()
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def parse_batch_entry(user_id, entry):
+    # Returns an insert row for foods (5 values) or workouts (6 values)
+    if not isinstance(entry, dict):
+        raise ValueError('must be an object')
+    
+    try:
+        created_at = parse_local_timestamp(entry['created_at']) if entry.get('created_at') else local_now()
+    except ValueError:
+        raise ValueError('invalid created_at')
+    
+    kind = entry.get('kind')
+    if kind == 'food':
+        description = str(entry.get('description') or '').strip()
+        if not description:
+            raise ValueError('missing food description')
+        return (user_id, description, calculate_food_calories(description, parse=False), created_at, created_at[:10])
+    
+    if kind == 'workout':
+        workout_type = entry.get('type')
+        try:
+            duration = int(entry.get('duration'))
+        except (ValueError, TypeError):
+            raise ValueError('invalid duration')
+        if not workout_type or duration <= 0:
+            raise ValueError('invalid workout data')
+        calories_burned = calculate_calories_burned(workout_type, duration)
+        return (user_id, workout_type, duration, calories_burned, created_at, created_at[:10])
+    
+    raise ValueError("kind must be 'food' or 'workout'")
 
 @routes.route('/get_data')
+@conditional
 def get_data():
     try:
-        db = get_db()
-        workouts = get_todays_workouts(db)
-        foods = get_todays_foods(db)
-        daily_summary = calculate_daily_summary(db)
-        stats = calculate_stats(db)
-        
-        cursor = db.cursor()
-        cursor.execute('''
-            SELECT daily_calories_target, current_weight, target_weight
-            FROM user_info
-            ORDER BY created_at DESC
-            LIMIT 1
-        ''')
-        row = cursor.fetchone()
-        
-        user_info = None
-        if row:
-            user_info = {
-                'daily_calories_target': row[0],
-                'current_weight': row[1],
-                'target_weight': row[2]
-            }
-        else:
-            # Return default values if no user info exists
-            user_info = {
-                'daily_calories_target': 2000,
-                'current_weight': None,
-                'target_weight': None
-            }
+        snapshot = DashboardSnapshot.build(get_db(), current_user_id())
         
-        return jsonify({
+        return jsonify(shape_rows({
             'success': True,
-            'workouts': workouts,
-            'foods': foods,
-            'daily_summary': daily_summary,
-            'stats': stats,
-            'user_info': user_info
-        })
+            'workouts': snapshot.workouts,
+            'foods': snapshot.foods,
+            'daily_summary': snapshot.daily_summary,
+            'stats': snapshot.stats,
+            'user_info': snapshot.user_info
+        }, 'workouts', 'foods'))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def calculate_daily_summary(db):
-    cursor = db.cursor()
-    
-    # Get today's calories consumed
-    cursor.execute('''
-        SELECT COALESCE(SUM(calories), 0)
-        FROM foods
-        WHERE date(created_at, 'localtime') = date('now', 'localtime')
-    ''')
-    calories_consumed = cursor.fetchone()[0]
-    
-    # Get today's calories burned
-    cursor.execute('''
-        SELECT COALESCE(SUM(calories_burned), 0)
-        FROM workouts
-        WHERE date(created_at, 'localtime') = date('now', 'localtime')
-    ''')
-    calories_burned = cursor.fetchone()[0]
+@routes.route('/stats')
+@conditional
+def stats():
+    # NumPy is imported on the first /stats request, not at startup
+    from stats import StatsError, compute_stats, load_daily_arrays, parse_stats_args
     
-    # Get daily target
-    cursor.execute('''
-        SELECT daily_calories_target
-        FROM user_info
-        ORDER BY created_at DESC
-        LIMIT 1
-    ''')
-    row = cursor.fetchone()
-    daily_target = row[0] if row else 2000
-    
-    return {
-        'calories_consumed': round(calories_consumed),
-        'calories_burned': round(calories_burned),
-        'net_calories': round(calories_consumed - calories_burned),
-        'daily_target': daily_target
-    }
+    try:
+        start, end, granularity = parse_stats_args(
+            request.args.get('from'),
+            request.args.get('to'),
+            request.args.get('granularity', 'day'),
+            date.fromisoformat(local_day()),
+            current_app.config.get('STATS_MAX_DAYS', 3660)
+        )
+        window = request.args.get('window', type=int)
+        if window is not None and window < 1:
+            raise StatsError('window must be at least 1')
+    except StatsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    user_id = current_user_id()
+    db = get_db()
+    daily_target = get_latest_user_info(db, user_id)['daily_calories_target']
+    days, consumed, burned, foods = load_daily_arrays(db, user_id, start, end)
 
-def calculate_stats(db):
-    cursor = db.cursor()
+    result = compute_stats(days, consumed, burned, foods, granularity, daily_target, window)
+    return jsonify({
+        'success': True,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'granularity': granularity,
+        'daily_target': daily_target,
+        **result
+    })
+
+@routes.route('/export')
+@conditional
+def export():
+    from export import FORMATS as EXPORT_FORMATS, ExportError, iter_export, parse_export_args
     
-    # Get daily calories for the last 7 days
-    cursor.execute('''
-        WITH RECURSIVE dates(date) AS (
-            SELECT date('now', 'localtime', '-6 days')
-            UNION ALL
-            SELECT date(date, '+1 day')
-            FROM dates
-            WHERE date < date('now', 'localtime')
-        ),
-        daily_foods AS (
-            SELECT date(created_at, 'localtime') as day, SUM(calories) as consumed
-            FROM foods
-            WHERE date(created_at, 'localtime') >= date('now', 'localtime', '-6 days')
-            GROUP BY date(created_at, 'localtime')
-        ),
-        daily_workouts AS (
-            SELECT date(created_at, 'localtime') as day, SUM(calories_burned) as burned
-            FROM workouts
-            WHERE date(created_at, 'localtime') >= date('now', 'localtime', '-6 days')
-            GROUP BY date(created_at, 'localtime')
+    try:
+        fmt, tables, start, end = parse_export_args(
+            request.args.get('format', 'ndjson'),
+            request.args.get('table'),
+            request.args.get('from'),
+            request.args.get('to')
         )
-        SELECT 
-            dates.date,
-            COALESCE(daily_foods.consumed, 0) as consumed,
-            COALESCE(daily_workouts.burned, 0) as burned
-        FROM dates
-        LEFT JOIN daily_foods ON dates.date = daily_foods.day
-        LEFT JOIN daily_workouts ON dates.date = daily_workouts.day
-        ORDER BY dates.date
-    ''')
-    
-    daily_data = {}
-    for row in cursor.fetchall():
-        day = row[0]
-        if day not in daily_data:
-            daily_data[day] = {'calories': 0, 'burned': 0}
-        daily_data[day]['calories'] += row[1]
-        daily_data[day]['burned'] += row[2]
-    
-    # Calculate daily arrays for the chart
-    daily_calories = []
-    daily_burned = []
-    total_calories = 0
-    total_burned = 0
-    days_with_data = 0
-    
-    for i in range(7):
-        date = datetime.now().date() - timedelta(days=i)
-        date_str = date.strftime('%Y-%m-%d')
-        if date_str in daily_data:
-            daily_calories.insert(0, daily_data[date_str]['calories'])
-            daily_burned.insert(0, daily_data[date_str]['burned'])
-            if daily_data[date_str]['calories'] > 0:
-                total_calories += daily_data[date_str]['calories']
-                days_with_data += 1
-            total_burned += daily_data[date_str]['burned']
-        else:
-            daily_calories.insert(0, 0)
-            daily_burned.insert(0, 0)
+    except ExportError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    # Calculate averages
-    avg_calories = round(total_calories / max(days_with_data, 1))
-    avg_burned = round(total_burned / 7)
+    # The stream outlives the request context, so it holds its own connection
+    pool = get_pool(current_app)
+    user_id = current_user_id()
     
-    # Get user info
-    cursor.execute('''
-        SELECT daily_calories_target, current_weight, target_weight
-        FROM user_info
-        ORDER BY created_at DESC
-        LIMIT 1
-    ''')
-    row = cursor.fetchone()
-    if row:
-        daily_target = row[0]
-        current_weight = row[1]
-        target_weight = row[2]
-    else:
-        daily_target = 2000
-        current_weight = None
-        target_weight = None
+    def generate():
+        db = pool.checkout()
+        try:
+            yield from iter_export(db, fmt, tables, user_id, start, end)
+        finally:
+            pool.checkin(db)
     
-    return {
-        'daily_calories': daily_calories,
-        'daily_burned': daily_burned,
-        'weekly_average': avg_calories,
-        'avg_calories_consumed': avg_calories,
-        'avg_calories_burned': avg_burned,
-        'daily_target': daily_target,
-        'current_weight': current_weight,
-        'target_weight': target_weight
-    }
+    filename = f"fitness-{'-'.join(tables) if len(tables) == 1 else 'export'}.{fmt}"
+    return Response(generate(), mimetype=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
 
-def get_weekly_data(db):
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=6)
-    
-    cursor = db.cursor()
-    cursor.execute('''
-        WITH RECURSIVE dates(date) AS (
-            SELECT date('now', 'localtime', '-6 days')
-            UNION ALL
-            SELECT date(date, '+1 day')
-            FROM dates
-            WHERE date < date('now', 'localtime')
-        ),
-        daily_foods AS (
-            SELECT date(created_at, 'localtime') as day, SUM(calories) as consumed
-            FROM foods
-            WHERE date(created_at, 'localtime') >= date('now', 'localtime', '-6 days')
-            GROUP BY date(created_at, 'localtime')
-        ),
-        daily_workouts AS (
-            SELECT date(created_at, 'localtime') as day, SUM(calories_burned) as burned
-            FROM workouts
-            WHERE date(created_at, 'localtime') >= date('now', 'localtime', '-6 days')
-            GROUP BY date(created_at, 'localtime')
-        )
-        SELECT 
-            dates.date,
-            COALESCE(daily_foods.consumed, 0) as consumed,
-            COALESCE(daily_workouts.burned, 0) as burned
-        FROM dates
-        LEFT JOIN daily_foods ON dates.date = daily_foods.day
-        LEFT JOIN daily_workouts ON dates.date = daily_workouts.day
-        ORDER BY dates.date
-    ''')
-    
-    result = {}
-    for row in cursor.fetchall():
-        result[row[0]] = {
-            'consumed': row[1],
-            'burned': row[2]
-        }
-    return result
+@routes.route('/events')
+def events():
+    user_id = current_user_id()
+    broker = get_broker(current_app)
+    version = get_data_version(current_app)
+    current_version = lambda: version.current(user_id)[0]
+    # A pre-rendered page passes the version it shows as ?since=
+    last_event_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int)
+
+    hijack = request.environ.get(HIJACK_KEY)
+    if hijack is not None:
+        # serve.py's workers hand the socket to the event hub and free this
+        # thread; the server sends nothing for the response returned here
+        broker.attach(get_event_hub(current_app), hijack(), user_id, current_version, last_event_id)
+        return Response(status=200)
+
+    stream = broker.stream(
+        broker.subscribe(user_id),
+        current_version,
+        current_app.config.get('SSE_HEARTBEAT', 15.0),
+        last_event_id
+    )
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @routes.route('/get_user_info')
+@conditional
 def get_user_info():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute('''
-        SELECT daily_calories_target, current_weight, target_weight, height, age, gender
-        FROM user_info 
-        ORDER BY created_at DESC 
-        LIMIT 1
-    ''')
-    row = cursor.fetchone()
+    profile = get_current_profile(get_db(), current_user_id())
     
-    if row:
-        return jsonify({
-            'daily_calories_target': row[0],
-            'current_weight': row[1],
-            'target_weight': row[2],
-            'height': row[3],
-            'age': row[4],
-            'gender': row[5]
-        })
+    if profile:
+        return jsonify(profile)
     
     return jsonify({
         'daily_calories_target': 2000,
@@ -408,12 +497,11 @@ def update_user_info():
         current_weight = request.form.get('current_weight')
         target_weight = request.form.get('target_weight')
         
-        # Log received data
-        print(f'Received user info update: calories={daily_calories_target}, current={current_weight}, target={target_weight}')
+        logger.debug('User info update: calories=%s, current=%s, target=%s',
+                     daily_calories_target, current_weight, target_weight)
         
         # Validate required fields
         if not daily_calories_target or not current_weight or not target_weight:
-            print('Missing required fields')
             return jsonify({
                 'success': False,
                 'error': 'Missing required fields'
@@ -424,8 +512,7 @@ def update_user_info():
             daily_calories_target = int(daily_calories_target)
             current_weight = float(current_weight)
             target_weight = float(target_weight)
-        except ValueError as e:
-            print(f'Value conversion error: {e}')
+        except ValueError:
             return jsonify({
                 'success': False,
                 'error': 'Invalid field values. Please check your input.'
@@ -433,65 +520,151 @@ def update_user_info():
         
         # Validate ranges
         if daily_calories_target < 1000 or daily_calories_target > 10000:
-            print(f'Invalid calories target: {daily_calories_target}')
             return jsonify({
                 'success': False,
                 'error': 'Daily calories target must be between 1000 and 10000'
             }), 400
             
         if current_weight < 20 or current_weight > 300:
-            print(f'Invalid current weight: {current_weight}')
             return jsonify({
                 'success': False,
                 'error': 'Current weight must be between 20 and 300 kg'
             }), 400
             
         if target_weight < 20 or target_weight > 300:
-            print(f'Invalid target weight: {target_weight}')
             return jsonify({
                 'success': False,
                 'error': 'Target weight must be between 20 and 300 kg'
             }), 400
         
+        user_id = current_user_id()
         db = get_db()
-        cursor = db.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO user_info (daily_calories_target, current_weight, target_weight, created_at)
-                VALUES (?, ?, ?, datetime('now', 'localtime'))
-            ''', (daily_calories_target, current_weight, target_weight))
-            db.commit()
-            
-            # Get updated user info
-            cursor.execute('''
-                SELECT daily_calories_target, current_weight, target_weight
-                FROM user_info 
-                ORDER BY created_at DESC 
-                LIMIT 1
-            ''')
-            row = cursor.fetchone()
-            
+            profile = save_profile(db, user_id, daily_calories_target, current_weight, target_weight)
             user_info = {
-                'daily_calories_target': row[0],
-                'current_weight': row[1],
-                'target_weight': row[2]
+                'daily_calories_target': profile['daily_calories_target'],
+                'current_weight': profile['current_weight'],
+                'target_weight': profile['target_weight']
             }
+            version = bump_data_version(user_id)
+            get_broker(current_app).publish(user_id, {'type': 'profile', 'user_info': user_info, 'version': version}, version)
             
-            print(f'User info updated successfully: {user_info}')
             return jsonify({
                 'success': True,
                 'user_info': user_info
             })
         except Exception as e:
-            print(f'Database error: {e}')
+            logger.exception('Failed to save user info')
             db.rollback()
             return jsonify({'success': False, 'error': str(e)}), 500
             
     except Exception as e:
-        print(f'Server error: {e}')
+        logger.exception('Failed to update user info')
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@routes.route('/record_weight', methods=['POST'])
+def record_weight():
+    data = request.get_json(silent=True) or request.form
+
+    try:
+        weight = float(data.get('weight'))
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid weight'}), 400
+    if weight < 20 or weight > 300:
+        return jsonify({'success': False, 'error': 'Weight must be between 20 and 300 kg'}), 400
+
+    day = data.get('date') or local_day()
+    try:
+        day = date.fromisoformat(day).isoformat()
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid date (expected YYYY-MM-DD)'}), 400
+
+    notes = str(data.get('notes') or '').strip()[:500] or None
+
+    user_id = current_user_id()
+    db = get_db()
+    try:
+        record_id = add_weight_record(db, user_id, weight, day, notes)
+        db.commit()
+
+        progress = current_weight_progress(db, user_id)
+        version = bump_data_version(user_id)
+        get_broker(current_app).publish(user_id, {'type': 'weight', 'progress': progress, 'version': version}, version)
+
+        return jsonify({
+            'success': True,
+            'record': {'id': record_id, 'date': day, 'weight': weight, 'notes': notes},
+            'progress': progress
+        })
+    except Exception as e:
+        db.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@routes.route('/get_weight_history')
+@conditional
+def get_weight_history():
+    user_id = current_user_id()
+    db = get_db()
+    summary = get_weight_summary(db, user_id)
+
+    limit = current_app.config.get('WEIGHT_HISTORY_MAX_POINTS', 500)
+    max_points = request.args.get('max_points', limit, type=int)
+    if max_points < 2:
+        return jsonify({'success': False, 'error': 'max_points must be at least 2'}), 400
+    max_points = min(max_points, limit)
+
+    # The summary bounds the default range, so no scan is needed to find it
+    start = request.args.get('from') or (summary['first_date'] if summary else None)
+    end = request.args.get('to') or (summary['last_date'] if summary else None)
+    try:
+        for value in (start, end):
+            if value:
+                date.fromisoformat(value)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid date (expected YYYY-MM-DD)'}), 400
+
+    records, bucket_days = [], 0
+    if summary and start and end and start <= end:
+        records, bucket_days = load_weight_history(db, user_id, start, end, max_points)
+
+    return jsonify(shape_rows({
+        'success': True,
+        'records': records,
+        'bucket_days': bucket_days,
+        'progress': current_weight_progress(db, user_id, summary)
+    }, 'records'))
+
+def current_weight_progress(db, user_id, summary=None):
+    if summary is None:
+        summary = get_weight_summary(db, user_id)
+    profile = get_current_profile(db, user_id) or {}
+    return weight_progress(summary, profile.get('target_weight'))
+
+@routes.route('/admin/sql_stats', methods=['GET', 'DELETE'])
+def admin_sql_stats():
+    require_admin()
+    stats = get_sql_stats(current_app)
+    if request.method == 'DELETE':
+        stats.reset()
+    return jsonify(stats.snapshot())
+
+@routes.route('/admin/maintenance', methods=['GET', 'POST'])
+def admin_maintenance():
+    require_admin()
+    scheduler = get_maintenance(current_app)
+    if request.method == 'GET':
+        return jsonify({'success': True, 'last_run': scheduler.last_report()})
+    
+    tasks = [t.strip() for t in request.values.get('tasks', '').split(',') if t.strip()] or None
+    unknown = [t for t in tasks or () if t not in MAINTENANCE_TASKS]
+    if unknown:
+        return jsonify({'success': False, 'error': f"Unknown task: {', '.join(unknown)}"}), 400
+    report = scheduler.run(tasks)
+    if report is None:
+        return jsonify({'success': False, 'error': 'A maintenance run is already in progress'}), 409
+    return jsonify({'success': True, 'report': report})
+
 @routes.route('/edit_workout', methods=['POST'])
 def edit_workout():
     try:
@@ -505,32 +678,51 @@ def edit_workout():
                 'error': 'Missing required fields'
             }), 400
         
-        calories_burned = calculate_calories_burned(workout_type, int(duration))
+        # Same rule as log_workout: the burned calories land in daily_totals
+        try:
+            duration = int(duration)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Invalid duration'}), 400
+        if duration <= 0:
+            return jsonify({'success': False, 'error': 'Invalid duration'}), 400
         
-        db = get_db()
-        cursor = db.cursor()
+        calories_burned = calculate_calories_burned(workout_type, duration)
         
-        try:
-            cursor.execute('''
+        user_id = current_user_id()
+        
+        def write(db):
+            old = db.execute('''
+                SELECT calories_burned, day, created_at, id
+                FROM workouts
+                WHERE id = ? AND user_id = ?
+            ''', (workout_id, user_id)).fetchone()
+            if old is None:
+                return None
+            
+            db.execute('''
                 UPDATE workouts
                 SET type = ?, duration = ?, calories_burned = ?
-                WHERE id = ?
-            ''', (workout_type, duration, calories_burned, workout_id))
-            db.commit()
+                WHERE id = ? AND user_id = ?
+            ''', (workout_type, duration, calories_burned, workout_id, user_id))
+            adjust_daily_totals(db, user_id, old[1], burned=calories_burned - old[0])
+            return old
+        
+        try:
+            old = run_write(write)
+            if old is None:
+                return jsonify({'success': False, 'error': 'Workout not found'}), 404
             
-            # Get updated data
-            workouts = get_todays_workouts(db)
-            daily_summary = calculate_daily_summary(db)
-            stats = calculate_stats(db)
+            db = get_db()
+            delta = publish_change(db, user_id, 'workout', 'upsert', {
+                'id': old[3],
+                'type': workout_type,
+                'duration': duration,
+                'calories_burned': calories_burned,
+                'created_at': old[2]
+            }, old[1])
             
-            return jsonify({
-                'success': True,
-                'workouts': workouts,
-                'daily_summary': daily_summary,
-                'stats': stats
-            })
+            return change_response(db, user_id, delta)
         except Exception as e:
-            db.rollback()
             return jsonify({'success': False, 'error': str(e)}), 500
             
     except Exception as e:
@@ -547,26 +739,31 @@ def delete_workout():
                 'error': 'Missing workout ID'
             }), 400
         
-        db = get_db()
-        cursor = db.cursor()
+        user_id = current_user_id()
+        
+        def write(db):
+            old = db.execute('''
+                SELECT calories_burned, day, created_at, id
+                FROM workouts
+                WHERE id = ? AND user_id = ?
+            ''', (workout_id, user_id)).fetchone()
+            if old is None:
+                return None
+            
+            db.execute('DELETE FROM workouts WHERE id = ? AND user_id = ?', (workout_id, user_id))
+            adjust_daily_totals(db, user_id, old[1], burned=-old[0], workouts=-1)
+            return old
         
         try:
-            cursor.execute('DELETE FROM workouts WHERE id = ?', (workout_id,))
-            db.commit()
+            old = run_write(write)
+            if old is None:
+                return jsonify({'success': False, 'error': 'Workout not found'}), 404
             
-            # Get updated data
-            workouts = get_todays_workouts(db)
-            daily_summary = calculate_daily_summary(db)
-            stats = calculate_stats(db)
+            db = get_db()
+            delta = publish_change(db, user_id, 'workout', 'delete', {'id': old[3]}, old[1])
             
-            return jsonify({
-                'success': True,
-                'workouts': workouts,
-                'daily_summary': daily_summary,
-                'stats': stats
-            })
+            return change_response(db, user_id, delta)
         except Exception as e:
-            db.rollback()
             return jsonify({'success': False, 'error': str(e)}), 500
             
     except Exception as e:
@@ -586,30 +783,40 @@ def edit_food():
         
         calories = calculate_food_calories(description)
         
-        db = get_db()
-        cursor = db.cursor()
+        user_id = current_user_id()
         
-        try:
-            cursor.execute('''
+        def write(db):
+            old = db.execute('''
+                SELECT calories, day, created_at, id
+                FROM foods
+                WHERE id = ? AND user_id = ?
+            ''', (food_id, user_id)).fetchone()
+            if old is None:
+                return None
+            
+            db.execute('''
                 UPDATE foods
                 SET description = ?, calories = ?
-                WHERE id = ?
-            ''', (description, calories, food_id))
-            db.commit()
+                WHERE id = ? AND user_id = ?
+            ''', (description, calories, food_id, user_id))
+            adjust_daily_totals(db, user_id, old[1], consumed=calories - old[0])
+            return old
+        
+        try:
+            old = run_write(write)
+            if old is None:
+                return jsonify({'success': False, 'error': 'Food not found'}), 404
             
-            # Get updated data
-            foods = get_todays_foods(db)
-            daily_summary = calculate_daily_summary(db)
-            stats = calculate_stats(db)
+            db = get_db()
+            delta = publish_change(db, user_id, 'food', 'upsert', {
+                'id': old[3],
+                'description': description,
+                'calories': calories,
+                'created_at': old[2]
+            }, old[1])
             
-            return jsonify({
-                'success': True,
-                'foods': foods,
-                'daily_summary': daily_summary,
-                'stats': stats
-            })
+            return change_response(db, user_id, delta)
         except Exception as e:
-            db.rollback()
             return jsonify({'success': False, 'error': str(e)}), 500
             
     except Exception as e:
@@ -626,26 +833,31 @@ def delete_food():
                 'error': 'Missing food ID'
             }), 400
         
-        db = get_db()
-        cursor = db.cursor()
+        user_id = current_user_id()
+        
+        def write(db):
+            old = db.execute('''
+                SELECT calories, day, created_at, id
+                FROM foods
+                WHERE id = ? AND user_id = ?
+            ''', (food_id, user_id)).fetchone()
+            if old is None:
+                return None
+            
+            db.execute('DELETE FROM foods WHERE id = ? AND user_id = ?', (food_id, user_id))
+            adjust_daily_totals(db, user_id, old[1], consumed=-old[0], foods=-1)
+            return old
         
         try:
-            cursor.execute('DELETE FROM foods WHERE id = ?', (food_id,))
-            db.commit()
+            old = run_write(write)
+            if old is None:
+                return jsonify({'success': False, 'error': 'Food not found'}), 404
             
-            # Get updated data
-            foods = get_todays_foods(db)
-            daily_summary = calculate_daily_summary(db)
-            stats = calculate_stats(db)
+            db = get_db()
+            delta = publish_change(db, user_id, 'food', 'delete', {'id': old[3]}, old[1])
             
-            return jsonify({
-                'success': True,
-                'foods': foods,
-                'daily_summary': daily_summary,
-                'stats': stats
-            })
+            return change_response(db, user_id, delta)
         except Exception as e:
-            db.rollback()
             return jsonify({'success': False, 'error': str(e)}), 500
             
     except Exception as e:
@@ -663,21 +875,13 @@ def calculate_calories_burned(workout_type, duration):
     }
     return duration * calories_per_minute.get(workout_type, 5)
 
-def calculate_food_calories(description):
-    # Simplified calorie calculation based on food description
-    common_foods = {
-        'Apple': 95,
-        'Banana': 105,
-        'Orange': 62,
-        'Sandwich': 300,
-        'Salad': 100,
-        'Rice': 200,
-        'Chicken': 335,
-        'Fish': 206,
-        'Egg': 78
-    }
-    
-    for food, calories in common_foods.items():
-        if food.lower() in description.lower():
+def calculate_food_calories(description, parse=True):
+    # The spaCy parser when it is enabled and keeping up (see food_parser.py),
+    # otherwise every food found in the nutrition table (see nutrition.py);
+    # parse=False only uses results the parser already has cached
+    parser = get_food_parser(current_app)
+    if parser is not None:
+        calories = parser.calories(description, wait=parse)
+        if calories is not None:
             return calories
-    return 200  # Default calories if no match found
+    return get_matcher().calories(description)
@@ -1,12 +1,30 @@
+-- Let maintenance.py return free pages to the filesystem (only takes effect
+-- on a new file; see python maintenance.py --enable-incremental-vacuum)
+PRAGMA auto_vacuum = INCREMENTAL;
+
 -- Drop existing tables if they exist
 DROP TABLE IF EXISTS user_info;
 DROP TABLE IF EXISTS workouts;
 DROP TABLE IF EXISTS foods;
 DROP TABLE IF EXISTS weight_history;
+DROP TABLE IF EXISTS weight_summary;
+DROP TABLE IF EXISTS daily_totals;
+DROP TABLE IF EXISTS workouts_archive;
+DROP TABLE IF EXISTS foods_archive;
+DROP TABLE IF EXISTS users;
+
+-- Create users table (id 1 is the default account used without a login)
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL DEFAULT '',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
 
 -- Create user_info table
 CREATE TABLE user_info (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL DEFAULT 1 REFERENCES users (id),
     daily_calories_target INTEGER NOT NULL DEFAULT 2000,
     current_weight REAL NOT NULL DEFAULT 70.0,
     target_weight REAL NOT NULL DEFAULT 70.0,
@@ -16,34 +34,101 @@ CREATE TABLE user_info (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- user_info is append-only history; the highest id per user is the current profile
+CREATE INDEX idx_user_info_user ON user_info (user_id);
+CREATE INDEX idx_user_info_created_at ON user_info (created_at);
+
 -- Create workouts table
 CREATE TABLE workouts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL DEFAULT 1 REFERENCES users (id),
     type TEXT NOT NULL,
     duration INTEGER NOT NULL,
     calories_burned INTEGER NOT NULL,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    day DATE NOT NULL DEFAULT (date('now', 'localtime'))
 );
 
+CREATE INDEX idx_workouts_user_day ON workouts (user_id, day, created_at);
+CREATE INDEX idx_workouts_created_at ON workouts (created_at);
+
 -- Create foods table
 CREATE TABLE foods (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL DEFAULT 1 REFERENCES users (id),
     description TEXT NOT NULL,
     calories INTEGER NOT NULL,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    day DATE NOT NULL DEFAULT (date('now', 'localtime'))
 );
 
+CREATE INDEX idx_foods_user_day ON foods (user_id, day, created_at);
+CREATE INDEX idx_foods_created_at ON foods (created_at);
+
 -- Create weight_history table
 CREATE TABLE weight_history (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL DEFAULT 1 REFERENCES users (id),
     weight REAL NOT NULL,
     date DATE NOT NULL,
     notes TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX idx_weight_history_user_date ON weight_history (user_id, date);
+
+-- Create weight_summary table (first and latest weigh-in per user)
+CREATE TABLE weight_summary (
+    user_id INTEGER PRIMARY KEY,
+    first_date DATE NOT NULL,
+    first_weight REAL NOT NULL,
+    last_date DATE NOT NULL,
+    last_weight REAL NOT NULL,
+    entries INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Create daily_totals rollup table (one row per user and local day)
+CREATE TABLE daily_totals (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    calories_consumed INTEGER NOT NULL DEFAULT 0,
+    calories_burned INTEGER NOT NULL DEFAULT 0,
+    food_count INTEGER NOT NULL DEFAULT 0,
+    workout_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+
+-- Archives for workouts and foods rows older than MAINTENANCE_ARCHIVE_DAYS
+-- (see maintenance.py); daily_totals keeps their totals
+CREATE TABLE workouts_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    calories_burned INTEGER NOT NULL,
+    created_at DATETIME,
+    day DATE NOT NULL
+);
+
+CREATE INDEX idx_workouts_archive_user_day ON workouts_archive (user_id, day, created_at);
+
+CREATE TABLE foods_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    calories INTEGER NOT NULL,
+    created_at DATETIME,
+    day DATE NOT NULL
+);
+
+CREATE INDEX idx_foods_archive_user_day ON foods_archive (user_id, day, created_at);
+
+-- Insert the default user
+INSERT INTO users (id, username) VALUES (1, 'default');
+
 -- Insert default user info
 INSERT INTO user_info (
+    user_id,
     daily_calories_target,
     current_weight,
     target_weight,
@@ -51,6 +136,7 @@ INSERT INTO user_info (
     age,
     gender
 ) VALUES (
+    1,
     2000,
     70.0,
     70.0,
@@ -58,3 +144,6 @@ INSERT INTO user_info (
     30,
     'Not specified'
 );
+
+-- Mark the schema as fully migrated (see migrations.py)
+PRAGMA user_version = 7;
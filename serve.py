@@ -0,0 +1,212 @@
+# Production server for Health and Fitness Tracker
+#
+# Runs the Flask app in a pool of pre-forked worker processes: under gunicorn
+# (gevent workers) when both are installed, otherwise under a small pre-fork
+# server built on werkzeug. Neither parks a thread per /events stream: gevent
+# waits on a greenlet, and the werkzeug workers hand the stream's socket to
+# the event hub (events.py). SIGHUP replaces the workers gracefully,
+# SIGTERM/SIGINT drain them and exit. Before any worker starts, the database
+# is checked for a concurrency-safe setup (WAL journal, busy timeout, current
+# schema), and with several workers /metrics adds up the counts of every
+# worker (ETags and /events share the data version file, see data_version.py).
+#
+#   python serve.py --workers 4 --bind 0.0.0.0:8000
+
+import argparse
+import io
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from app import app
+from db_pool import get_pool
+from events import HIJACK_KEY
+from metrics import clear_metrics_dir
+from nutrition import get_matcher
+from migrations import SCHEMA_VERSION
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # fall back to the werkzeug pre-fork server
+    BaseApplication = None
+
+try:
+    import gevent
+except ImportError:  # gthread workers would hold a thread per /events stream
+    gevent = None
+
+def check_database(app):
+    # Returns a list of problems; an empty list means workers can share the file
+    pool = get_pool(app)
+    db = pool.checkout()
+    try:
+        problems = []
+        mode = db.execute('PRAGMA journal_mode').fetchone()[0]
+        if mode.lower() != 'wal':
+            problems.append(f'journal_mode is {mode}, expected wal '
+                            '(WAL needs a local filesystem with shared memory support)')
+        if db.execute('PRAGMA busy_timeout').fetchone()[0] <= 0:
+            problems.append('busy_timeout is 0, so concurrent writers would fail with "database is locked"')
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            problems.append(f'schema version is {version}, expected {SCHEMA_VERSION} '
+                            '(run python init_db.py for a new database, python init_db.py migrate otherwise)')
+        return problems
+    finally:
+        pool.checkin(db)
+
+def run_gunicorn(app, options):
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+def run_prefork(app, host, port, workers, keepalive, graceful_timeout):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class RequestHandler(WSGIRequestHandler):
+        # HTTP/1.1 keeps connections open; idle ones close after the keep-alive timeout
+        protocol_version = 'HTTP/1.1'
+        timeout = keepalive
+        # Headers and body go out in separate writes; don't let Nagle hold the body
+        disable_nagle_algorithm = True
+
+        def log_request(self, *args):
+            # Access logs are left to the proxy in front
+            pass
+
+        def make_environ(self):
+            environ = super().make_environ()
+            environ[HIJACK_KEY] = self.hijack
+            return environ
+
+        def hijack(self):
+            # /events takes the connection over: whatever the app returns is
+            # discarded, and detaching leaves socketserver nothing to close
+            self.close_connection = True
+            self.wfile = io.BytesIO()
+            return socket.socket(fileno=self.connection.detach())
+
+    # Bound once here; every worker accepts on the inherited socket
+    server = make_server(host, port, app, threaded=True, request_handler=RequestHandler)
+
+    def spawn():
+        pid = os.fork()
+        if pid:
+            return pid
+        # Worker: finish in-flight requests on SIGTERM, then exit
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, lambda *args: threading.Thread(target=server.shutdown).start())
+        server.daemon_threads = False
+        try:
+            server.serve_forever()
+            server.server_close()
+        finally:
+            os._exit(0)
+
+    def stop(pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signals = []
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, lambda signum, frame: signals.append(signum))
+
+    active = {spawn() for _ in range(workers)}
+    retiring = {}  # pid -> time SIGTERM was sent
+    print(f'Serving on http://{host}:{port} with {workers} workers (werkzeug pre-fork)', flush=True)
+
+    while active or retiring:
+        while signals:
+            signum = signals.pop(0)
+            if signum == signal.SIGHUP:
+                old, active = active, {spawn() for _ in range(workers)}
+            else:
+                old, active = active, set()
+            stop(old)
+            retiring.update(dict.fromkeys(old, time.monotonic()))
+
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid in active:
+            # A worker died on its own; keep the pool at full size
+            active.discard(pid)
+            active.add(spawn())
+        retiring.pop(pid, None)
+
+        for pid, since in list(retiring.items()):
+            if time.monotonic() - since > graceful_timeout:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    retiring.pop(pid)
+        time.sleep(0.1)
+    server.server_close()
+
+def main(argv=None):
+    config = app.config
+    parser = argparse.ArgumentParser(description='Run the fitness tracker with multiple worker processes')
+    parser.add_argument('--bind', default=config['SERVER_BIND'], help='host:port')
+    parser.add_argument('--workers', type=int, default=config['SERVER_WORKERS'])
+    parser.add_argument('--worker-connections', type=int, default=config['SERVER_WORKER_CONNECTIONS'],
+                        help='open connections per gevent worker (gunicorn; werkzeug has no limit)')
+    parser.add_argument('--keepalive', type=float, default=config['SERVER_KEEPALIVE'],
+                        help='seconds an idle keep-alive connection stays open')
+    parser.add_argument('--graceful-timeout', type=float, default=config['SERVER_GRACEFUL_TIMEOUT'],
+                        help='seconds workers get to finish requests on reload or shutdown')
+    parser.add_argument('--database', default=config['DATABASE'])
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'werkzeug'], default='auto')
+    args = parser.parse_args(argv)
+
+    if args.server == 'gunicorn' and (BaseApplication is None or gevent is None):
+        parser.error('gunicorn and gevent must both be installed')
+    use_gunicorn = BaseApplication is not None and gevent is not None and args.server != 'werkzeug'
+    host, _, port = args.bind.rpartition(':')
+    if not host or not port.isdigit() or args.workers < 1 or args.worker_connections < 1:
+        parser.error('expected --bind host:port and at least one worker and connection')
+
+    config['DATABASE'] = args.database
+    problems = check_database(app)
+    if problems:
+        for problem in problems:
+            print(f'{args.database}: {problem}', file=sys.stderr)
+        sys.exit(1)
+    # Workers open their own connections after the fork
+    get_pool(app).close()
+    # Compile the nutrition table once so the workers share it copy-on-write
+    get_matcher()
+
+    if args.workers > 1 and not config.get('METRICS_DIR'):
+        config['METRICS_DIR'] = f'{args.database}-metrics'
+    if config.get('METRICS_DIR'):
+        clear_metrics_dir(config['METRICS_DIR'])
+
+    if use_gunicorn:
+        run_gunicorn(app, {
+            'bind': args.bind,
+            'workers': args.workers,
+            'worker_class': 'gevent',
+            'worker_connections': args.worker_connections,
+            'keepalive': args.keepalive,
+            'graceful_timeout': args.graceful_timeout,
+            # Load the app (and the nutrition matcher) once and share it copy-on-write
+            'preload_app': True
+        })
+    else:
+        run_prefork(app, host, int(port), args.workers, args.keepalive, args.graceful_timeout)
+
+if __name__ == '__main__':
+    main()
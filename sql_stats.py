@@ -0,0 +1,154 @@
+# SQL instrumentation for Health and Fitness Tracker
+#
+# get_db() hands routes an InstrumentedConnection, a thin wrapper that counts
+# and times every execute, executemany and commit on the pooled connection.
+# When the request ends the totals go out in a Server-Timing header and are
+# added to per-endpoint aggregates served by /admin/sql_stats. Statements
+# slower than SQL_SLOW_QUERY_MS are logged with their EXPLAIN QUERY PLAN.
+# The overhead is two perf_counter() calls per statement and one short lock
+# per request, so it stays on in production.
+#
+# Times cover execute(), which runs a statement up to its first row; rows
+# fetched afterwards are not included.
+
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class RequestQueries:
+    __slots__ = ('count', 'seconds', 'slow', 'slow_seconds')
+
+    def __init__(self, slow_ms=100):
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = 0
+        self.slow_seconds = slow_ms / 1000
+
+def explain(connection, sql, params):
+    try:
+        rows = connection.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    except sqlite3.Error:
+        return None
+    return '; '.join(row[3] for row in rows)
+
+def log_slow_query(connection, sql, params, elapsed):
+    statement = ' '.join(sql.split())
+    plan = explain(connection, sql, params) if params is not None else None
+    logger.warning('Slow query (%.1f ms): %s | plan: %s', elapsed * 1000, statement, plan or 'n/a')
+
+class InstrumentedCursor:
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+
+    def execute(self, sql, params=()):
+        self._connection._timed(self._cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._connection._timed(self._cursor.executemany, sql, seq_of_params, many=True)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    def __init__(self, connection, queries):
+        self.connection = connection
+        self.queries = queries
+
+    def _timed(self, method, sql, params, many=False):
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            queries = self.queries
+            queries.count += 1
+            queries.seconds += elapsed
+            if elapsed >= queries.slow_seconds:
+                queries.slow += 1
+                if many:
+                    # Explain with the first row's parameters when they are at hand
+                    params = params[0] if isinstance(params, (list, tuple)) and params else None
+                log_slow_query(self.connection, sql, params, elapsed)
+
+    def execute(self, sql, params=()):
+        return self._timed(self.connection.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(self.connection.executemany, sql, seq_of_params, many=True)
+
+    def cursor(self):
+        return InstrumentedCursor(self.connection.cursor(), self)
+
+    def commit(self):
+        # Commits are where WAL writes hit the disk, so they count as statements
+        start = time.perf_counter()
+        try:
+            self.connection.commit()
+        finally:
+            self.queries.count += 1
+            self.queries.seconds += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+class SQLStats:
+    # Per-endpoint totals for this process
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}  # endpoint -> [requests, queries, sql s, total s, max total s, slow]
+        self.since = time.time()
+
+    def record(self, endpoint, queries, total_seconds):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = [0, 0, 0.0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += queries.count
+            entry[2] += queries.seconds
+            entry[3] += total_seconds
+            entry[4] = max(entry[4], total_seconds)
+            entry[5] += queries.slow
+
+    def snapshot(self):
+        with self._lock:
+            entries = {endpoint: list(entry) for endpoint, entry in self._endpoints.items()}
+
+        endpoints = {}
+        # Most time spent in SQL first
+        for endpoint, (requests, queries, sql, total, slowest, slow) in sorted(
+                entries.items(), key=lambda item: -item[1][2]):
+            endpoints[endpoint] = {
+                'requests': requests,
+                'queries': queries,
+                'queries_per_request': round(queries / requests, 2),
+                'sql_ms_per_request': round(sql / requests * 1000, 3),
+                'total_ms_per_request': round(total / requests * 1000, 3),
+                'max_total_ms': round(slowest * 1000, 3),
+                'slow_queries': slow
+            }
+        return {'since': self.since, 'endpoints': endpoints}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.since = time.time()
+
+def get_sql_stats(app):
+    stats = app.extensions.get('sql_stats')
+    if stats is None:
+        stats = app.extensions.setdefault('sql_stats', SQLStats())
+    return stats
+
+def server_timing(queries, total_seconds):
+    return (f'db;dur={queries.seconds * 1000:.3f};desc="{queries.count} queries", '
+            f'app;dur={total_seconds * 1000:.3f}')
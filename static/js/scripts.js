@@ -2,6 +2,16 @@
 let calorieChart = null;
 let weeklyChart = null;
 
+// Last rendered dashboard data, so pushed deltas can be applied in place
+const dashboardState = {
+    workouts: [],
+    foods: [],
+    summary: null,
+    stats: null,
+    version: undefined
+};
+let eventSource = null;
+
 // Constants
 const REFRESH_INTERVAL = 300000; // 5 minutes
 const DEFAULT_VALUES = {
@@ -16,14 +26,24 @@ $(document).ready(function() {
     // Initialize the chart
     initializeChart();
     
-    // Load initial data
-    refreshData();
+    // Load initial data: from the snapshot embedded in the page when the
+    // server rendered one, otherwise from /get_data
+    if (!hydrateFromPage()) {
+        refreshData();
+    }
     
     // Set up event listeners
     setupEventListeners();
     
-    // Set up periodic refresh - every 5 minutes
-    setInterval(refreshData, REFRESH_INTERVAL);
+    // Listen for changes pushed by the server
+    connectEvents();
+    
+    // Set up periodic refresh - every 5 minutes, only while the push channel is down
+    setInterval(function() {
+        if (!eventSource || eventSource.readyState !== EventSource.OPEN) {
+            refreshData();
+        }
+    }, REFRESH_INTERVAL);
     
     console.log('Document ready, initializing...');
 });
@@ -81,11 +101,8 @@ function handleWorkoutSubmit(e) {
             if (response.success) {
                 $('#addWorkoutModal').modal('hide');
                 $('#workoutForm')[0].reset();
-                // Update UI directly with response data
-                updateWorkoutList(response.workouts);
-                updateDailySummary(response.daily_summary);
-                updateStats(response.stats);
-                updateChart(response.stats);
+                // Apply the returned delta instead of re-rendering everything
+                applyDelta(response.delta);
                 showAlert('success', 'Workout logged successfully!');
             } else {
                 showAlert('danger', response.error || 'Failed to log workout');
@@ -120,11 +137,8 @@ function handleFoodSubmit(e) {
             if (response.success) {
                 $('#addFoodModal').modal('hide');
                 $('#foodForm')[0].reset();
-                // Update UI directly with response data
-                updateFoodList(response.foods);
-                updateDailySummary(response.daily_summary);
-                updateStats(response.stats);
-                updateChart(response.stats);
+                // Apply the returned delta instead of re-rendering everything
+                applyDelta(response.delta);
                 showAlert('success', 'Food logged successfully!');
             } else {
                 showAlert('danger', response.error || 'Failed to log food');
@@ -183,6 +197,7 @@ function initializeChart() {
 
 // Update workout list
 function updateWorkoutList(workouts) {
+    dashboardState.workouts = workouts || [];
     const workoutList = $('#workoutList');
     workoutList.empty();
     
@@ -229,6 +244,7 @@ function updateWorkoutList(workouts) {
 
 // Update food list
 function updateFoodList(foods) {
+    dashboardState.foods = foods || [];
     const foodList = $('#foodList');
     foodList.empty();
     
@@ -289,9 +305,8 @@ $('#editWorkoutForm').submit(function(e) {
         success: function(response) {
             if (response.success) {
                 $('#editWorkoutModal').modal('hide');
-                updateWorkoutList(response.workouts);
-                updateDailySummary(response.daily_summary);
-                updateStats(response.stats);
+                // Apply the returned delta instead of re-rendering everything
+                applyDelta(response.delta);
                 showAlert('success', 'Workout updated successfully!');
             } else {
                 showAlert('danger', response.error || 'Failed to update workout');
@@ -317,9 +332,8 @@ $('#editFoodForm').submit(function(e) {
         success: function(response) {
             if (response.success) {
                 $('#editFoodModal').modal('hide');
-                updateFoodList(response.foods);
-                updateDailySummary(response.daily_summary);
-                updateStats(response.stats);
+                // Apply the returned delta instead of re-rendering everything
+                applyDelta(response.delta);
                 showAlert('success', 'Food updated successfully!');
             } else {
                 showAlert('danger', response.error || 'Failed to update food');
@@ -346,9 +360,8 @@ function deleteWorkout() {
             success: function(response) {
                 if (response.success) {
                     $('#editWorkoutModal').modal('hide');
-                    updateWorkoutList(response.workouts);
-                    updateDailySummary(response.daily_summary);
-                    updateStats(response.stats);
+                    // Apply the returned delta instead of re-rendering everything
+                    applyDelta(response.delta);
                     showAlert('success', 'Workout deleted successfully!');
                 } else {
                     showAlert('danger', response.error || 'Failed to delete workout');
@@ -376,9 +389,8 @@ function deleteFood() {
             success: function(response) {
                 if (response.success) {
                     $('#editFoodModal').modal('hide');
-                    updateFoodList(response.foods);
-                    updateDailySummary(response.daily_summary);
-                    updateStats(response.stats);
+                    // Apply the returned delta instead of re-rendering everything
+                    applyDelta(response.delta);
                     showAlert('success', 'Food deleted successfully!');
                 } else {
                     showAlert('danger', response.error || 'Failed to delete food');
@@ -453,7 +465,13 @@ function refreshData() {
     $.ajax({
         url: '/get_data',
         method: 'GET',
-        success: function(response) {
+        // Send back the ETag/Last-Modified validators; unchanged data returns 304
+        ifModified: true,
+        success: function(response, status) {
+            if (status === 'notmodified') {
+                console.log('Data unchanged');
+                return;
+            }
             if (response.success) {
                 console.log('Data refresh successful:', response);
                 if (response.user_info) {
@@ -480,6 +498,25 @@ function refreshData() {
     });
 }
 
+// Apply the dashboard snapshot embedded by the server; false when there is none
+function hydrateFromPage() {
+    const blob = document.getElementById('dashboardData');
+    if (!blob) return false;
+    
+    try {
+        const snapshot = JSON.parse(blob.textContent);
+        dashboardState.version = snapshot.version;
+        updateData(snapshot);
+    } catch (e) {
+        console.error('Invalid embedded dashboard data:', e);
+        return false;
+    }
+    if (window.performance && performance.mark) {
+        performance.mark('dashboard-hydrated');
+    }
+    return true;
+}
+
 // Update all data
 function updateData(response) {
     console.log('Updating data with:', response);
@@ -501,10 +538,105 @@ function updateData(response) {
     }
 }
 
+// Subscribe to server-sent change events
+function connectEvents() {
+    if (!window.EventSource) return;
+    
+    // Changes since the embedded snapshot are replayed as a resync
+    const since = dashboardState.version;
+    eventSource = new EventSource(since !== undefined ? `/events?since=${since}` : '/events');
+    eventSource.addEventListener('delta', function(e) {
+        applyDelta(JSON.parse(e.data));
+    });
+    eventSource.addEventListener('resync', function() {
+        refreshData();
+    });
+}
+
+// Apply a change message for a single row, profile or day
+function applyDelta(delta) {
+    console.log('Applying delta:', delta);
+    if (!delta) return;
+    
+    if (delta.type === 'resync') {
+        refreshData();
+        return;
+    }
+    
+    if (delta.type === 'weight') {
+        updateWeightProgress(delta.progress);
+        return;
+    }
+    
+    if (delta.type === 'profile') {
+        const info = delta.user_info;
+        updateUserInfoDisplay(info);
+        if (dashboardState.summary) {
+            dashboardState.summary.daily_target = info.daily_calories_target;
+            updateDailySummary(dashboardState.summary);
+        }
+        if (dashboardState.stats) {
+            dashboardState.stats.daily_target = info.daily_calories_target;
+            dashboardState.stats.current_weight = info.current_weight;
+            dashboardState.stats.target_weight = info.target_weight;
+            updateStats(dashboardState.stats);
+        }
+        return;
+    }
+    
+    // The lists and the summary only cover today
+    if (delta.day === delta.today) {
+        const key = delta.type === 'workout' ? 'workouts' : 'foods';
+        const rows = dashboardState[key].filter(row => row.id !== delta.row.id);
+        if (delta.op === 'upsert') {
+            rows.push(delta.row);
+            rows.sort((a, b) => (b.created_at || '').localeCompare(a.created_at || ''));
+        }
+        if (key === 'workouts') {
+            updateWorkoutList(rows);
+        } else {
+            updateFoodList(rows);
+        }
+        
+        updateDailySummary({
+            calories_consumed: delta.totals.consumed,
+            calories_burned: delta.totals.burned,
+            net_calories: delta.totals.consumed - delta.totals.burned,
+            daily_target: delta.daily_target
+        });
+    }
+    
+    applyDayTotals(delta.day, delta.today, delta.totals);
+}
+
+// Update one day of the weekly series and recompute the averages
+function applyDayTotals(day, today, totals) {
+    const stats = dashboardState.stats;
+    if (!stats || !stats.daily_calories) return;
+    
+    const length = stats.daily_calories.length;
+    const daysAgo = Math.round((Date.parse(today) - Date.parse(day)) / 86400000);
+    if (daysAgo < 0 || daysAgo >= length) return;
+    
+    const index = length - 1 - daysAgo;
+    stats.daily_calories[index] = totals.consumed;
+    stats.daily_burned[index] = totals.burned;
+    
+    // Same rules as the server: consumed averages over days with entries
+    const consumedDays = stats.daily_calories.filter(calories => calories > 0);
+    const average = Math.round(consumedDays.reduce((a, b) => a + b, 0) / Math.max(consumedDays.length, 1));
+    stats.weekly_average = average;
+    stats.avg_calories_consumed = average;
+    stats.avg_calories_burned = Math.round(stats.daily_burned.reduce((a, b) => a + b, 0) / length);
+    
+    updateStats(stats);
+}
+
 // Update daily summary
 function updateDailySummary(summary) {
     console.log('Updating daily summary:', summary);
     if (!summary) return;
+    dashboardState.summary = summary;
     
     // Update calories
     $('#caloriesConsumed').text(summary.calories_consumed || 0);
@@ -528,6 +660,7 @@ function updateDailySummary(summary) {
 function updateStats(stats) {
     console.log('Updating stats:', stats);
     if (!stats) return;
+    dashboardState.stats = stats;
     
     // Update weekly averages
     $('#weeklyAvgCalories').text(Math.round(stats.weekly_average || 0));
@@ -624,7 +757,9 @@ function loadUserProfile() {
         url: '/get_user_info',
         type: 'GET',
         dataType: 'json',
-        success: function(response) {
+        ifModified: true,
+        success: function(response, status) {
+            if (status === 'notmodified') return;
             console.log('User profile loaded:', response);
             if (response.error) {
                 console.error('Error loading user profile:', response.error);
@@ -702,9 +837,8 @@ function deleteWorkout() {
             success: function(response) {
                 if (response.success) {
                     $('#editWorkoutModal').modal('hide');
-                    updateWorkoutList(response.workouts);
-                    updateDailySummary(response.daily_summary);
-                    updateStats(response.stats);
+                    // Apply the returned delta instead of re-rendering everything
+                    applyDelta(response.delta);
                     showAlert('success', 'Workout deleted successfully!');
                 } else {
                     showAlert('danger', response.error || 'Failed to delete workout');
@@ -732,9 +866,8 @@ function deleteFood() {
             success: function(response) {
                 if (response.success) {
                     $('#editFoodModal').modal('hide');
-                    updateFoodList(response.foods);
-                    updateDailySummary(response.daily_summary);
-                    updateStats(response.stats);
+                    // Apply the returned delta instead of re-rendering everything
+                    applyDelta(response.delta);
                     showAlert('success', 'Food deleted successfully!');
                 } else {
                     showAlert('danger', response.error || 'Failed to delete food');
@@ -811,6 +944,8 @@ function loadWeightHistory() {
     $.ajax({
         url: '/get_weight_history',
         type: 'GET',
+        // The server averages longer histories down to this many points
+        data: { max_points: 365 },
         dataType: 'json',
         success: function(response) {
             console.log('Weight history:', response);
@@ -0,0 +1,110 @@
+# Fingerprinted static assets for Health and Fitness Tracker
+#
+# build_static.py copies every file under static/ to static/dist/ with a
+# content hash in its name (css/styles.3f9a1c2b7d4e.css), writes .gz and
+# .br variants next to the compressible ones, and records the mapping in
+# static/dist/manifest.json. When that manifest exists, init_static():
+#   - makes url_for('static', filename=...) point at the fingerprinted copy,
+#     so templates keep naming the source file
+#   - serves fingerprinted files with a year-long, immutable Cache-Control
+#     and the precompressed variant the client's Accept-Encoding allows
+#   - serves /favicon.ico from memory
+# Without a build, static files are served from static/ as before.
+#
+# Chart.js, jQuery and Bootstrap are loaded from static/vendor/ once
+# `python build_static.py vendor` has downloaded them there, and from their
+# CDNs until then (vendor_url() in templates).
+
+import json
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.http import generate_etag, http_date
+
+# name -> (file under static/vendor/, CDN URL it is downloaded from)
+VENDOR = {
+    'bootstrap.css': ('bootstrap-5.1.3.min.css',
+                      'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css'),
+    'bootstrap.js': ('bootstrap-5.1.3.bundle.min.js',
+                     'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js'),
+    'jquery.js': ('jquery-3.6.0.min.js', 'https://code.jquery.com/jquery-3.6.0.min.js'),
+    'chart.js': ('chart-4.4.0.umd.js', 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js'),
+}
+
+# Precompressed variants, most preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def vendor_url(name):
+    filename, cdn = VENDOR[name]
+    path = f'vendor/{filename}'
+    if path in current_app.extensions['static_manifest'] or \
+            os.path.exists(os.path.join(current_app.static_folder, path)):
+        return url_for('static', filename=path)
+    return cdn
+
+def init_static(app):
+    manifest = load_manifest(app.config['STATIC_MANIFEST'])
+    app.extensions['static_manifest'] = manifest
+    app.add_template_global(vendor_url)
+
+    # /favicon.ico cannot be fingerprinted, so it gets a day of caching
+    favicon_path = os.path.join(app.static_folder, 'favicon.ico')
+    with open(favicon_path, 'rb') as f:
+        favicon_data = f.read()
+    favicon_etag = generate_etag(favicon_data)
+    favicon_modified = http_date(os.path.getmtime(favicon_path))
+
+    @app.route('/favicon.ico')
+    def favicon():
+        response = app.response_class(favicon_data, mimetype='image/vnd.microsoft.icon')
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+        response.headers['Last-Modified'] = favicon_modified
+        response.set_etag(favicon_etag)
+        return response.make_conditional(request)
+
+    if not manifest:
+        return
+
+    dist = os.path.join(app.static_folder, 'dist')
+    max_age = app.config.get('STATIC_MAX_AGE', 31536000)
+    # dist/<path> -> (mimetype of the source, [(encoding, variant file)])
+    fingerprinted = {}
+    for source, path in manifest.items():
+        name = path[len('dist/'):]
+        variants = [(encoding, name + suffix) for encoding, suffix in ENCODINGS
+                    if os.path.exists(os.path.join(dist, name + suffix))]
+        fingerprinted[path] = (mimetypes.guess_type(source)[0], variants)
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def static(filename):
+        entry = fingerprinted.get(filename)
+        if entry is None:
+            return app.send_static_file(filename)
+
+        mimetype, variants = entry
+        name = filename[len('dist/'):]
+        encoding = None
+        for candidate, variant in variants:
+            if request.accept_encodings[candidate]:
+                encoding, name = candidate, variant
+                break
+
+        response = send_from_directory(dist, name, mimetype=mimetype, max_age=max_age, conditional=True)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    app.view_functions['static'] = static
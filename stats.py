@@ -0,0 +1,135 @@
+# Range analytics for Health and Fitness Tracker
+#
+# /stats reads one row per logged day from the daily_totals rollup, scatters
+# them into dense NumPy arrays covering the requested range and computes
+# every figure with array operations: per-period sums via bincount, rolling
+# averages via cumulative sums and streaks from run boundaries. Cost grows
+# with the number of days in the range, not with the number of entries.
+
+import numpy as np
+from datetime import date
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# Default trailing window for the rolling averages, in periods
+ROLLING_WINDOWS = {'day': 7, 'week': 4, 'month': 3}
+
+class StatsError(ValueError):
+    pass
+
+def parse_stats_args(start, end, granularity, today, max_days):
+    # Validate user input; returns (start, end, granularity) with dates as date objects
+    if granularity not in GRANULARITIES:
+        raise StatsError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    try:
+        end = date.fromisoformat(end) if end else today
+        start = date.fromisoformat(start) if start else date.fromordinal(end.toordinal() - 29)
+    except ValueError:
+        raise StatsError('Invalid date (expected YYYY-MM-DD)')
+    if start > end:
+        raise StatsError('from must not be after to')
+    if (end - start).days >= max_days:
+        raise StatsError(f'Range is limited to {max_days} days')
+    return start, end, granularity
+
+def load_daily_arrays(db, user_id, start, end):
+    # Dense per-day arrays for start..end; days without a rollup row are zero
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    consumed = np.zeros(len(days))
+    burned = np.zeros(len(days))
+    foods = np.zeros(len(days), dtype=np.int64)
+
+    rows = db.execute('''
+        SELECT day, calories_consumed, calories_burned, food_count
+        FROM daily_totals
+        WHERE user_id = ? AND day BETWEEN ? AND ?
+    ''', (user_id, start.isoformat(), end.isoformat())).fetchall()
+    if rows:
+        columns = list(zip(*rows))
+        index = (np.array(columns[0], dtype='datetime64[D]') - days[0]).astype(np.int64)
+        consumed[index] = columns[1]
+        burned[index] = columns[2]
+        foods[index] = columns[3]
+    return days, consumed, burned, foods
+
+def period_starts(days, granularity):
+    # First day of the period each day falls in
+    if granularity == 'day':
+        return days
+    if granularity == 'week':
+        # Day 0 of the epoch was a Thursday; weeks start on Monday
+        ordinal = days.astype(np.int64)
+        return (ordinal - (ordinal + 3) % 7).astype('datetime64[D]')
+    return days.astype('datetime64[M]').astype('datetime64[D]')
+
+def rolling_mean(values, window):
+    # Trailing mean; the first window - 1 periods average what is available
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+def runs(mask):
+    # (longest run of True, run of True ending at the last element)
+    if not mask.any():
+        return 0, 0
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    longest = int((ends - starts).max())
+    current = int(ends[-1] - starts[-1]) if mask[-1] else 0
+    return longest, current
+
+def compute_stats(days, consumed, burned, foods, granularity, daily_target, window=None):
+    window = window or ROLLING_WINDOWS[granularity]
+    logged = foods > 0
+    net = consumed - burned
+
+    starts = period_starts(days, granularity)
+    labels, inverse = np.unique(starts, return_inverse=True)
+    periods = len(labels)
+    period_consumed = np.bincount(inverse, consumed, periods)
+    period_burned = np.bincount(inverse, burned, periods)
+    period_days = np.bincount(inverse, minlength=periods)
+    period_logged = np.bincount(inverse, logged, periods).astype(np.int64)
+    period_net = period_consumed - period_burned
+    average_consumed = np.divide(period_consumed, period_logged,
+                                 out=np.zeros(periods), where=period_logged > 0)
+
+    logged_days = int(logged.sum())
+    longest_logging, current_logging = runs(logged)
+    longest_under, current_under = runs(logged & (consumed <= daily_target))
+
+    return {
+        'series': {
+            'labels': np.datetime_as_string(labels).tolist(),
+            'consumed': period_consumed.round().astype(np.int64).tolist(),
+            'burned': period_burned.round().astype(np.int64).tolist(),
+            'net': period_net.round().astype(np.int64).tolist(),
+            'average_consumed': average_consumed.round().astype(np.int64).tolist(),
+            'days': period_days.tolist(),
+            'logged_days': period_logged.tolist()
+        },
+        'rolling_average': {
+            'window': window,
+            'consumed': rolling_mean(period_consumed, window).round(1).tolist(),
+            'net': rolling_mean(period_net, window).round(1).tolist()
+        },
+        'totals': {
+            'consumed': int(round(consumed.sum())),
+            'burned': int(round(burned.sum())),
+            'net': int(round(net.sum())),
+            'days': len(days),
+            'logged_days': logged_days,
+            'avg_consumed': int(round(consumed[logged].mean())) if logged_days else 0,
+            'avg_burned': int(round(burned.mean())),
+            # Calories over (+) or under (-) the target across the logged days
+            'target_balance': int(round((net[logged] - daily_target).sum()))
+        },
+        'streaks': {
+            'current_logging': current_logging,
+            'longest_logging': longest_logging,
+            'current_under_target': current_under,
+            'longest_under_target': longest_under
+        }
+    }
@@ -0,0 +1,28 @@
+# Shared fixtures: a fresh fitness.db per test and an app serving it
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'fitness.db')
+    connection = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        connection.executescript(f.read())
+    connection.close()
+    return path
+
+@pytest.fixture
+def app(database):
+    from app import create_app
+    return create_app({'DATABASE': database, 'SECRET_KEY': 'test'})
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
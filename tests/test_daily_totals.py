@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from daily_totals import rebuild_daily_totals
+
+COLUMNS = 'user_id, day, calories_consumed, calories_burned, food_count, workout_count'
+
+def rollup(database):
+    connection = sqlite3.connect(database)
+    try:
+        return connection.execute(f'SELECT {COLUMNS} FROM daily_totals ORDER BY user_id, day').fetchall()
+    finally:
+        connection.close()
+
+def rebuilt(database):
+    # What the rollup should hold: a full recomputation from the raw rows
+    connection = sqlite3.connect(database)
+    try:
+        rebuild_daily_totals(connection)
+        return connection.execute(f'SELECT {COLUMNS} FROM daily_totals ORDER BY user_id, day').fetchall()
+    finally:
+        connection.rollback()
+        connection.close()
+
+@pytest.fixture(params=[True, False], ids=['group_commit', 'per_request'])
+def app(request, database):
+    from app import create_app
+    return create_app({'DATABASE': database, 'SECRET_KEY': 'test', 'GROUP_COMMIT_ENABLED': request.param})
+
+def test_rollup_follows_log_edit_delete(client, database):
+    food = client.post('/log_food', data={'food_description': 'apple'}).get_json()
+    assert food['success']
+    client.post('/log_food', data={'food_description': '2 eggs and rice'})
+    workout = client.post('/log_workout', data={'type': 'Running', 'duration': 30})
+    assert workout.status_code == 200
+    assert rollup(database) == rebuilt(database)
+
+    foods = sqlite3.connect(database).execute('SELECT id FROM foods ORDER BY id').fetchall()
+    workouts = sqlite3.connect(database).execute('SELECT id FROM workouts').fetchall()
+
+    assert client.post('/edit_food', data={'id': foods[0][0], 'description': 'pizza'}).status_code == 200
+    assert client.post('/edit_workout', data={'id': workouts[0][0], 'type': 'Yoga', 'duration': 45}).status_code == 200
+    assert rollup(database) == rebuilt(database)
+
+    assert client.post('/delete_food', data={'id': foods[1][0]}).status_code == 200
+    assert client.post('/delete_workout', data={'id': workouts[0][0]}).status_code == 200
+    assert rollup(database) == rebuilt(database)
+    (_, _, consumed, burned, food_count, workout_count), = rollup(database)
+    assert (burned, food_count, workout_count) == (0, 1, 0)
+    assert consumed > 0
+
+@pytest.mark.parametrize('duration', ['-10', '0', 'abc'])
+def test_edit_workout_rejects_bad_duration(client, database, duration):
+    client.post('/log_workout', data={'type': 'Running', 'duration': 30})
+    before = rollup(database)
+
+    response = client.post('/edit_workout', data={'id': 1, 'type': 'Running', 'duration': duration})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid duration'
+    assert rollup(database) == before
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+
+from conftest import ROOT
+from migrations import SCHEMA_VERSION, migrate
+
+def baseline(path):
+    # A fitness.db as the first schema.sql created it, with some history
+    connection = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'tests', 'fixtures', 'schema_v0.sql')) as f:
+        connection.executescript(f.read())
+    connection.executemany(
+        'INSERT INTO foods (description, calories, created_at) VALUES (?, ?, ?)',
+        [('apple', 95, '2024-03-01 08:00:00'), ('rice', 200, '2024-03-01 13:00:00'),
+         ('egg', 78, '2024-03-02 07:30:00'), ('pizza', 285, '2024-03-02 19:00:00')])
+    connection.executemany(
+        'INSERT INTO workouts (type, duration, calories_burned, created_at) VALUES (?, ?, ?, ?)',
+        [('Running', 30, 300, '2024-03-01 18:00:00'), ('Yoga', 60, 180, '2024-03-02 06:00:00')])
+    connection.executemany(
+        'INSERT INTO weight_history (weight, date) VALUES (?, ?)',
+        [(81.0, '2024-03-01'), (80.2, '2024-03-08'), (79.5, '2024-03-15')])
+    # The newest row is gone; its id must not be handed out again
+    connection.execute('DELETE FROM foods WHERE id = 4')
+    connection.commit()
+    return connection
+
+def columns(db, table):
+    return {row[1]: row[2:] for row in db.execute(f'PRAGMA table_info({table})')}
+
+def test_migrate_from_baseline_matches_schema(tmp_path):
+    db = baseline(str(tmp_path / 'old.db'))
+    applied = migrate(db)
+
+    assert len(applied) == SCHEMA_VERSION
+    assert db.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+
+    fresh = sqlite3.connect(':memory:')
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        fresh.executescript(f.read())
+    # The rebuilt tables match column for column; ALTER TABLE appends the
+    # columns it adds elsewhere, so only their definitions are compared
+    for table in ('workouts', 'foods'):
+        assert db.execute(f'PRAGMA table_info({table})').fetchall() == \
+            fresh.execute(f'PRAGMA table_info({table})').fetchall(), table
+    for table in ('user_info', 'weight_history', 'daily_totals', 'weight_summary'):
+        assert columns(db, table) == columns(fresh, table), table
+
+    day = {row[1]: row for row in db.execute('PRAGMA table_info(foods)')}['day']
+    assert day[3] == 1  # NOT NULL
+    assert db.execute('SELECT COUNT(*) FROM foods WHERE day IS NULL').fetchone()[0] == 0
+    assert db.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert db.execute('PRAGMA foreign_key_check').fetchall() == []
+
+def test_migrate_keeps_autoincrement_sequence(tmp_path):
+    db = baseline(str(tmp_path / 'old.db'))
+    migrate(db)
+
+    assert db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'foods'").fetchone()[0] == 4
+    cursor = db.execute("INSERT INTO foods (description, calories) VALUES ('banana', 105)")
+    assert cursor.lastrowid == 5
+
+def test_migrate_fills_rollups(tmp_path):
+    db = baseline(str(tmp_path / 'old.db'))
+    migrate(db)
+
+    totals = db.execute('''
+        SELECT user_id, day, calories_consumed, calories_burned, food_count, workout_count
+        FROM daily_totals ORDER BY day
+    ''').fetchall()
+    assert totals == [(1, '2024-03-01', 295, 300, 2, 1), (1, '2024-03-02', 78, 180, 1, 1)]
+
+    summary = db.execute('''
+        SELECT user_id, first_date, first_weight, last_date, last_weight, entries FROM weight_summary
+    ''').fetchall()
+    assert summary == [(1, '2024-03-01', 81.0, '2024-03-15', 79.5, 3)]
+
+def test_migrate_is_idempotent(tmp_path):
+    db = baseline(str(tmp_path / 'old.db'))
+    migrate(db)
+    assert migrate(db) == []
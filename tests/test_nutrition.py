@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from conftest import ROOT
+from nutrition import MAX_SERVINGS, FoodMatcher, load_foods
+
+@pytest.fixture
+def matcher():
+    return FoodMatcher([('Rice', 200, 158), ('Egg', 78, 50), ('Chicken Breast', 165, 100), ('Milk', 103, 244)])
+
+def test_counts_every_item_with_its_quantity(matcher):
+    assert matcher.calories('2 eggs and rice') == 2 * 78 + 200
+
+def test_converts_weights_to_servings(matcher):
+    assert matcher.calories('100g rice') == round(200 * 100 / 158)
+    assert matcher.calories('200 g of chicken breast') == 330
+    assert matcher.calories('250ml milk') == round(103 * 250 / 244)
+
+def test_clamps_implausible_counts(matcher):
+    assert matcher.calories('500 rice') == MAX_SERVINGS * 200
+
+def test_unmatched_description_uses_default(matcher):
+    assert matcher.calories('something unknown', default=123) == 123
+
+def test_bundled_table():
+    matcher = FoodMatcher(load_foods(os.path.join(ROOT, 'data', 'nutrition.csv')))
+    assert matcher.calories('2 eggs and rice') == 356
+    assert matcher.calories('100g rice') == 127
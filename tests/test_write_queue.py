@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool
+from write_queue import GroupCommitWriter
+
+@pytest.fixture
+def pool(database):
+    pool = ConnectionPool(database)
+    yield pool
+    pool.close()
+
+def insert(description):
+    def write(db):
+        return db.execute(
+            "INSERT INTO foods (description, calories, day) VALUES (?, 100, date('now'))",
+            (description,)).lastrowid
+    return write
+
+def failing(db):
+    db.execute("INSERT INTO foods (description, calories, day) VALUES ('doomed', 100, date('now'))")
+    raise ValueError('bad write')
+
+def test_failed_write_does_not_roll_back_its_batch(pool, database):
+    # A long window so all three land in one transaction
+    writer = GroupCommitWriter(pool, window=0.5)
+    writer._last_size = 2
+
+    futures = [writer.submit(insert('first')), writer.submit(failing), writer.submit(insert('last'))]
+
+    assert isinstance(futures[0].result(5), int)
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert isinstance(futures[2].result(5), int)
+    assert writer.stats()['max_batch'] == 3
+
+    connection = sqlite3.connect(database)
+    descriptions = [row[0] for row in connection.execute('SELECT description FROM foods ORDER BY id')]
+    assert descriptions == ['first', 'last']
@@ -0,0 +1,122 @@
+# Current user profile for Health and Fitness Tracker
+#
+# user_info is an append-only history: update_user_info inserts a new row and
+# each user's row with the highest id is their current profile. Those rows
+# are cached in process, tagged with their id as the version, in an LRU
+# bounded by USER_INFO_CACHE_SIZE. update_user_info replaces the user's entry
+# after it commits. Entries also remember the user's shared data version
+# (data_version.py) they were checked at: once another worker bumps it, the
+# cached version is checked against MAX(id) before use, so a page or ETag
+# built for the new data version never carries the old profile. Other
+# writers that don't bump the version (the CLI) are picked up after
+# USER_INFO_CACHE_TTL seconds. Both lookups seek the (user_id) index and
+# never sort, so they stay constant-time as history grows.
+
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from data_version import get_data_version
+
+PROFILE_FIELDS = ('daily_calories_target', 'current_weight', 'target_weight', 'height', 'age', 'gender')
+
+def load_profile(db, user_id, version=None):
+    # Fetch a profile row by id, or the user's latest one when no id is given
+    if version is None:
+        row = db.execute('''
+            SELECT id, daily_calories_target, current_weight, target_weight, height, age, gender
+            FROM user_info
+            WHERE id = (SELECT MAX(id) FROM user_info WHERE user_id = ?)
+        ''', (user_id,)).fetchone()
+    else:
+        row = db.execute('''
+            SELECT id, daily_calories_target, current_weight, target_weight, height, age, gender
+            FROM user_info
+            WHERE id = ? AND user_id = ?
+        ''', (version, user_id)).fetchone()
+
+    if row is None:
+        return None, None
+    return row[0], dict(zip(PROFILE_FIELDS, row[1:]))
+
+class ProfileCache:
+    def __init__(self, ttl=5.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (version, profile, checked_at, data_version)
+
+    def version(self, user_id):
+        entry = self._entries.get(user_id)
+        return entry[0] if entry else None
+
+    def get(self, db, user_id, data_version=None):
+        entry = self._entries.get(user_id)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.ttl and entry[3] == data_version:
+            with self._lock:
+                if user_id in self._entries:
+                    self._entries.move_to_end(user_id)
+            return entry[1]
+
+        # Revalidate against the newest row id before reloading
+        if entry is not None:
+            latest = db.execute(
+                'SELECT MAX(id) FROM user_info WHERE user_id = ?', (user_id,)).fetchone()[0]
+            if latest == entry[0]:
+                self._put(user_id, (entry[0], entry[1], now, data_version))
+                return entry[1]
+
+        version, profile = load_profile(db, user_id)
+        self.store(user_id, version, profile, data_version)
+        return profile
+
+    def store(self, user_id, version, profile, data_version=None):
+        with self._lock:
+            current = self._entries.get(user_id)
+            # A slower reader must not overwrite a newer version
+            if current is not None and None not in (version, current[0]) and version < current[0]:
+                return
+        self._put(user_id, (version, profile, time.monotonic(), data_version))
+
+    def _put(self, user_id, entry):
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+def get_profile_cache(app):
+    cache = app.extensions.get('profile_cache')
+    if cache is None:
+        cache = app.extensions.setdefault('profile_cache', ProfileCache(
+            app.config.get('USER_INFO_CACHE_TTL', 5.0),
+            app.config.get('USER_INFO_CACHE_SIZE', 10000)))
+    return cache
+
+def get_current_profile(db, user_id):
+    if has_app_context():
+        # Read the version before the profile so a concurrent bump forces a recheck
+        data_version = get_data_version(current_app).current(user_id)[0]
+        return get_profile_cache(current_app).get(db, user_id, data_version)
+    return load_profile(db, user_id)[1]
+
+def save_profile(db, user_id, daily_calories_target, current_weight, target_weight):
+    # Append a history row and make it the user's current profile
+    cursor = db.execute('''
+        INSERT INTO user_info (user_id, daily_calories_target, current_weight, target_weight, created_at)
+        VALUES (?, ?, ?, ?, datetime('now', 'localtime'))
+    ''', (user_id, daily_calories_target, current_weight, target_weight))
+    db.commit()
+
+    version, profile = load_profile(db, user_id, cursor.lastrowid)
+    if has_app_context():
+        get_profile_cache(current_app).store(user_id, version, profile)
+    return profile
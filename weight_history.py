@@ -0,0 +1,135 @@
+# Weight history for Health and Fitness Tracker
+#
+# weight_history is append-only and read through a (user_id, date) index.
+# weight_summary keeps each user's first and latest weigh-in and the entry
+# count; /record_weight updates it in the same transaction as the new row, so
+# progress never needs a scan of the history. Chart queries are downsampled in
+# SQL to fixed-width date buckets, so a multi-year history comes back as at
+# most max_points averaged points.
+
+from datetime import date, timedelta
+
+CREATE_WEIGHT_SUMMARY = '''
+    CREATE TABLE IF NOT EXISTS weight_summary (
+        user_id INTEGER PRIMARY KEY,
+        first_date DATE NOT NULL,
+        first_weight REAL NOT NULL,
+        last_date DATE NOT NULL,
+        last_weight REAL NOT NULL,
+        entries INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+'''
+
+# SET expressions see the old row, so each side compares against the stored date;
+# the first weigh-in of a day stays first and the last one recorded becomes current
+UPSERT_WEIGHT_SUMMARY = '''
+    INSERT INTO weight_summary (user_id, first_date, first_weight, last_date, last_weight, entries)
+    VALUES (?, ?, ?, ?, ?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET
+        first_weight = CASE WHEN excluded.first_date < first_date THEN excluded.first_weight ELSE first_weight END,
+        first_date = MIN(first_date, excluded.first_date),
+        last_weight = CASE WHEN excluded.last_date >= last_date THEN excluded.last_weight ELSE last_weight END,
+        last_date = MAX(last_date, excluded.last_date),
+        entries = entries + 1
+'''
+
+def add_weight_record(db, user_id, weight, day, notes=None):
+    # Caller commits
+    cursor = db.execute('''
+        INSERT INTO weight_history (user_id, weight, date, notes, created_at)
+        VALUES (?, ?, ?, ?, datetime('now', 'localtime'))
+    ''', (user_id, weight, day, notes))
+    db.execute(UPSERT_WEIGHT_SUMMARY, (user_id, day, weight, day, weight))
+    return cursor.lastrowid
+
+def get_weight_summary(db, user_id):
+    row = db.execute('''
+        SELECT first_date, first_weight, last_date, last_weight, entries
+        FROM weight_summary
+        WHERE user_id = ?
+    ''', (user_id,)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(('first_date', 'first_weight', 'last_date', 'last_weight', 'entries'), row))
+
+def rebuild_weight_summary(db):
+    # Recompute weight_summary from weight_history; returns the number of users
+    db.execute(CREATE_WEIGHT_SUMMARY)
+    db.execute('DELETE FROM weight_summary')
+    db.execute('''
+        INSERT INTO weight_summary (user_id, first_date, first_weight, last_date, last_weight, entries)
+        SELECT u.user_id, f.date, f.weight, l.date, l.weight, u.entries
+        FROM (SELECT user_id, COUNT(*) AS entries FROM weight_history GROUP BY user_id) AS u
+        JOIN weight_history AS f ON f.id = (
+            SELECT id FROM weight_history WHERE user_id = u.user_id ORDER BY date, id LIMIT 1)
+        JOIN weight_history AS l ON l.id = (
+            SELECT id FROM weight_history WHERE user_id = u.user_id ORDER BY date DESC, id DESC LIMIT 1)
+    ''')
+    return db.execute('SELECT COUNT(*) FROM weight_summary').fetchone()[0]
+
+def weight_progress(summary, target_weight):
+    # Progress from the first weigh-in towards the profile's target weight
+    if summary is None or target_weight is None:
+        return None
+
+    initial = summary['first_weight']
+    current = summary['last_weight']
+    change = current - initial
+    goal = target_weight - initial
+    if goal:
+        percent = max(0.0, min(100.0, change / goal * 100))
+    else:
+        percent = 100.0 if abs(current - target_weight) <= 1 else 0.0
+
+    return {
+        'initial_weight': initial,
+        'current_weight': current,
+        'target_weight': target_weight,
+        'current_change': round(change, 1),
+        'is_weight_loss': goal < 0 if goal else change < 0,
+        'progress_percent': round(percent, 1),
+        'on_track': percent > 0,
+        'first_date': summary['first_date'],
+        'last_date': summary['last_date'],
+        'entries': summary['entries']
+    }
+
+def load_weight_history(db, user_id, start, end, max_points):
+    # Raw records when the range holds at most max_points, else bucketed averages.
+    # Returns (records, bucket_days); bucket_days is 0 for raw records.
+    count = db.execute('''
+        SELECT COUNT(*) FROM weight_history
+        WHERE user_id = ? AND date BETWEEN ? AND ?
+    ''', (user_id, start, end)).fetchone()[0]
+
+    if count <= max_points:
+        cursor = db.execute('''
+            SELECT id, date, weight, notes
+            FROM weight_history
+            WHERE user_id = ? AND date BETWEEN ? AND ?
+            ORDER BY date, id
+        ''', (user_id, start, end))
+        return [{'id': row[0], 'date': row[1], 'weight': row[2], 'notes': row[3]} for row in cursor], 0
+
+    first = date.fromisoformat(start)
+    span = (date.fromisoformat(end) - first).days + 1
+    width = -(-span // max_points)
+    cursor = db.execute('''
+        SELECT CAST(julianday(date) - julianday(?) AS INTEGER) / ? AS bucket,
+               AVG(weight), MIN(weight), MAX(weight), COUNT(*)
+        FROM weight_history
+        WHERE user_id = ? AND date BETWEEN ? AND ?
+        GROUP BY bucket
+        ORDER BY bucket
+    ''', (start, width, user_id, start, end))
+
+    records = []
+    for bucket, average, low, high, samples in cursor:
+        records.append({
+            'date': (first + timedelta(days=bucket * width)).isoformat(),
+            'weight': round(average, 1),
+            'min': low,
+            'max': high,
+            'samples': samples
+        })
+    return records, width
@@ -0,0 +1,151 @@
+# Group commit for Health and Fitness Tracker
+#
+# SQLite takes one writer at a time, so under a burst of log_food/log_workout
+# requests each request's own transaction queues on the database lock and
+# pays for its own commit. With GROUP_COMMIT_ENABLED, routes hand their
+# writes to a single writer thread per process instead. The writer takes
+# whatever is queued, and while writes are arriving together waits up to
+# GROUP_COMMIT_WINDOW seconds for more (at most GROUP_COMMIT_MAX_BATCH), runs
+# them in one transaction and commits once. Each write runs inside its own
+# savepoint, so one that fails is rolled back alone and only its request
+# sees the error. Requests block on a future for their write's result (a row
+# id, the old row), which they get after the commit, so responses are the
+# same as with per-request commits. A write submitted with the request's
+# RequestQueries runs on an InstrumentedConnection, so its statements, and
+# its share of the batch's commit, show up in that request's Server-Timing
+# header, /admin/sql_stats and metrics as they would without batching.
+
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+from db_pool import get_pool
+from sql_stats import InstrumentedConnection
+
+logger = logging.getLogger(__name__)
+
+class GroupCommitWriter:
+    def __init__(self, pool, window=0.002, max_batch=128):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self.pid = os.getpid()
+        self._queue = queue.SimpleQueue()  # (write, Future, RequestQueries or None)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._writes = 0
+        self._largest = 0
+        self._last_size = 0
+        threading.Thread(target=self._run, name='group-commit', daemon=True).start()
+
+    @classmethod
+    def from_config(cls, pool, config):
+        return cls(pool, config.get('GROUP_COMMIT_WINDOW', 0.002), config.get('GROUP_COMMIT_MAX_BATCH', 128))
+
+    def submit(self, write, queries=None):
+        # write(db) runs on the writer's connection; returns a Future for its
+        # result. The request waits on the Future, so the writer thread is the
+        # only one touching queries until it resolves.
+        future = concurrent.futures.Future()
+        self._queue.put((write, future, queries))
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        # A lone writer is not kept waiting: the window only applies while
+        # the previous transaction held more than one write
+        window = self.window if self._last_size > 1 else 0
+        deadline = time.monotonic() + window
+        while len(batch) < self.max_batch:
+            try:
+                # Writes that queued during the last commit join without waiting
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._commit(batch)
+            except Exception as e:
+                logger.exception('Group commit of %d writes failed', len(batch))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, batch):
+        db = self.pool.checkout()
+        try:
+            results = []
+            db.execute('BEGIN IMMEDIATE')
+            for write, _, queries in batch:
+                db.execute('SAVEPOINT write')
+                try:
+                    results.append((write(InstrumentedConnection(db, queries) if queries else db), None))
+                    db.execute('RELEASE write')
+                except Exception as e:
+                    db.execute('ROLLBACK TO write')
+                    db.execute('RELEASE write')
+                    results.append((None, e))
+            start = time.perf_counter()
+            db.commit()
+            # Every request waited for the one commit; each is charged an equal share
+            share = (time.perf_counter() - start) / len(batch)
+            for _, _, queries in batch:
+                if queries:
+                    queries.count += 1
+                    queries.seconds += share
+        except Exception:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        finally:
+            self.pool.checkin(db)
+
+        with self._lock:
+            self._batches += 1
+            self._writes += len(batch)
+            self._largest = max(self._largest, len(batch))
+            self._last_size = len(batch)
+        for (_, future, _), (result, error) in zip(batch, results):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self._batches,
+                'writes': self._writes,
+                'avg_batch': round(self._writes / self._batches, 2) if self._batches else 0,
+                'max_batch': self._largest,
+                'queued': self._queue.qsize()
+            }
+
+_writer_lock = threading.Lock()
+
+def get_writer(app):
+    # One writer per app and process, or None when GROUP_COMMIT_ENABLED is off
+    if not app.config.get('GROUP_COMMIT_ENABLED'):
+        return None
+    writer = app.extensions.get('group_commit')
+    if writer is None or writer.pid != os.getpid():
+        with _writer_lock:
+            writer = app.extensions.get('group_commit')
+            if writer is None or writer.pid != os.getpid():
+                writer = GroupCommitWriter.from_config(get_pool(app), app.config)
+                app.extensions['group_commit'] = writer
+    return writer